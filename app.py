@@ -1,11 +1,27 @@
-from flask import Flask, render_template, request, jsonify, url_for, session
+if __name__ == '__main__':
+    # `python app.py`: serve the app imported as the `app` module, leaving a bare __main__.
+    # Processes spawned for PDF extraction re-run the main script unless it is bare, which
+    # would set this whole module up again in every worker (logging, engines, warm-up).
+    import sys
+    import types
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    from app import app
+    app.run(debug=True, port=5000)
+    sys.exit()
+
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context
 from flask_wtf.csrf import CSRFProtect
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import requests
 import os
-import re
-from rag_engine import RAGEngine
+import threading
+from ingest_jobs import IngestJobManager, JobQueueFull
+from rag_collections import CollectionManager, CollectionNotFound, InvalidCollectionName, DEFAULT_COLLECTION
+from llm_client import LLMClient
+from model_info import ModelInfoCache
+from ttl_cache import TTLCache
+from metrics import Metrics
 from markdown2 import Markdown
 import json
 from werkzeug.utils import secure_filename
@@ -29,11 +45,30 @@ limiter = Limiter(
 
 markdown = Markdown(extras=['fenced-code-blocks', 'tables', 'break-on-newline'])
 
+# Request and per-stage latency histograms and counters, served by /metrics
+metrics = Metrics()
+metrics.describe('request_duration_seconds', 'Time until the response is returned, by route')
+metrics.describe('requests_total', 'Requests by route and status code')
+metrics.describe('stage_duration_seconds', 'Time spent in each stage of chat requests and PDF ingestion')
+
+def record_stages(route, timings):
+    """Add one request's stage timings (seconds) to the latency histograms"""
+    for stage, seconds in timings.items():
+        metrics.observe('stage_duration_seconds', seconds, route=route, stage=stage)
+
 # LM Studio API endpoints
-API_BASE = "http://127.0.0.1:1234/v1"
+API_BASE = os.environ.get('LM_STUDIO_URL', "http://127.0.0.1:1234/v1")
 API_URL = f"{API_BASE}/chat/completions"
 MODEL_INFO_URL = f"{API_BASE}/models"
 
+# Shared keep-alive client for LM Studio with timeouts, retries and a circuit breaker
+llm = LLMClient(
+    pool_size=int(os.environ.get('LLM_POOL_SIZE', 10)),
+    connect_timeout=float(os.environ.get('LLM_CONNECT_TIMEOUT', 3.05)),
+    read_timeout=float(os.environ.get('LLM_READ_TIMEOUT', 120)),
+    max_retries=int(os.environ.get('LLM_MAX_RETRIES', 2))
+)
+
 # Default system prompt
 DEFAULT_SYSTEM_PROMPT = """You are a helpful assistant with access to specific document knowledge. 
 Format your responses using Markdown for better readability:
@@ -54,11 +89,85 @@ DEFAULT_CONFIG = {
     "temperature": 0.7,
     "max_tokens": 500,
     "top_p": 0.95,
-    "context_chunks": 3
+    "context_chunks": 3,
+    # Reuse the answer to an identical question: None (auto) only at temperature 0, where
+    # answers are deterministic; True also reuses sampled answers, False never does
+    "cache_responses": None,
+    "collection": DEFAULT_COLLECTION  # Knowledge base that chat and uploads use
 }
 
-# Initialize RAG engine
-rag = RAGEngine()
+# Chat settings that change the answer, and so are part of the response cache key
+CHAT_SETTINGS = ('system_prompt', 'temperature', 'max_tokens', 'top_p', 'context_chunks')
+
+# Rendered chat responses for repeated questions (RESPONSE_CACHE_SIZE=0 disables it)
+response_cache = TTLCache(
+    maxsize=int(os.environ.get('RESPONSE_CACHE_SIZE', 256)),
+    ttl=float(os.environ.get('RESPONSE_CACHE_TTL', 3600))
+)
+
+# RAG engines are created on first use, so importing the app (tests, worker forks)
+# does not pay for torch, transformers and the model weights
+RAG_STORAGE_DIR = os.environ.get('RAG_STORAGE_DIR', 'vector_store')
+PDF_EXTRACT_WORKERS = int(os.environ.get('PDF_EXTRACT_WORKERS', min(4, os.cpu_count() or 1)))
+
+def create_engine(storage_dir, encoder=None):
+    """Create the RAG engine of one collection; encoder shares the default collection's model"""
+    from rag_engine import RAGEngine
+    return RAGEngine(
+        storage_dir=storage_dir,
+        encoder=encoder,
+        extract_workers=PDF_EXTRACT_WORKERS,
+        # Query embedding micro-batching: batch size, collection window and torch intra-op threads
+        query_batch_size=int(os.environ.get('EMBED_BATCH_SIZE', 32)),
+        query_batch_wait=float(os.environ.get('EMBED_BATCH_WAIT_MS', 5)) / 1000,
+        torch_threads=int(os.environ['TORCH_THREADS']) if os.environ.get('TORCH_THREADS') else None,
+        # 'torch' (fp32), 'torch-int8', 'onnx' or 'onnx-int8'
+        embedding_backend=os.environ.get('EMBEDDING_BACKEND', 'torch'),
+        # 'float32', or compact 'float16' / 'int8' search rows re-scored from the store
+        index_options={'precision': os.environ.get('INDEX_PRECISION', 'float32')},
+        # 'hybrid' (embeddings + BM25 keywords), 'dense' or 'keyword' (no model call per query)
+        search_mode=os.environ.get('SEARCH_MODE', 'hybrid')
+    )
+
+# Named knowledge bases; the default one is RAG_STORAGE_DIR itself. Idle collections are unloaded
+collections = CollectionManager(
+    create_engine,
+    RAG_STORAGE_DIR,
+    max_loaded=int(os.environ.get('MAX_LOADED_COLLECTIONS', 8)),
+    idle_unload=float(os.environ.get('COLLECTION_IDLE_UNLOAD', 900))
+)
+
+def get_rag(collection=None, create=False):
+    """Return the RAG engine of a collection (default: the default collection), loading it on first use"""
+    return collections.get(collection or DEFAULT_COLLECTION, create=create)
+
+def get_ingest_rag(collection=None):
+    """Lease on the engine an ingestion job writes to; the first upload to a collection creates it"""
+    return collections.lease(collection or DEFAULT_COLLECTION, create=True)
+
+def warm_up():
+    """Create the engine and load the embedding model ahead of the first request"""
+    start_time = time.time()
+    get_rag().warm_up()
+    app.logger.info(f"RAG engine warmed up in {time.time() - start_time:.2f}s")
+
+# Optionally warm up in the background so startup is not delayed but the first chat is fast
+if os.environ.get('RAG_WARM_UP', '').lower() in ('1', 'true', 'yes'):
+    threading.Thread(target=warm_up, name='rag-warm-up', daemon=True).start()
+
+def record_ingest_job(job):
+    """Record the stage timings and outcome of a finished ingestion job"""
+    metrics.increment('ingest_jobs_total', status=job.status)
+    timings = dict((job.result or {}).get('timings', {}))
+    if job.started_at and job.status == 'completed':
+        timings['total'] = job.finished_at - job.started_at
+    record_stages('ingest', timings)
+
+# Background PDF ingestion: bounded worker pool and bounded waiting queue
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 2))
+INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', 8))
+ingest_jobs = IngestJobManager(get_ingest_rag, max_workers=INGEST_WORKERS, max_queue=INGEST_QUEUE_SIZE,
+                               on_finish=record_ingest_job)
 
 # File upload settings
 UPLOAD_FOLDER = 'uploads'
@@ -71,9 +180,16 @@ app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def upload_folder(collection):
+    """Upload directory of a collection, so equally named files in different collections never clash"""
+    if collection == DEFAULT_COLLECTION:
+        return app.config['UPLOAD_FOLDER']
+    return os.path.join(app.config['UPLOAD_FOLDER'], collection)
+
 @app.before_request
 def before_request():
-    """Log API request details"""
+    """Start the request timer and log API request details"""
+    request.start_time = time.time()
     if request.path.startswith('/api/'):
         api_logger.info(
             f"Request: {request.method} {request.path} - "
@@ -83,12 +199,19 @@ def before_request():
 
 @app.after_request
 def after_request(response):
-    """Log API response details"""
+    """Record request metrics and log API response details"""
+    # Requests rejected by an earlier before_request hook (e.g. the rate limiter) were never timed
+    start_time = getattr(request, 'start_time', None)
+    duration = time.time() - start_time if start_time else 0.0
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.increment('requests_total', method=request.method, route=route, status=response.status_code)
+    if start_time:
+        metrics.observe('request_duration_seconds', duration, method=request.method, route=route)
     if request.path.startswith('/api/'):
         api_logger.info(
             f"Response: {request.method} {request.path} - "
             f"Status: {response.status_code} - "
-            f"Duration: {time.time() - request.start_time:.2f}s"
+            f"Duration: {duration:.2f}s"
         )
     return response
 
@@ -98,6 +221,14 @@ def ratelimit_handler(e):
     app.logger.warning(f"Rate limit exceeded: {request.remote_addr} - {request.path}")
     return jsonify(error="Rate limit exceeded", message=str(e.description)), 429
 
+@app.errorhandler(CollectionNotFound)
+def collection_not_found_handler(e):
+    return jsonify(error=str(e)), 404
+
+@app.errorhandler(InvalidCollectionName)
+def invalid_collection_handler(e):
+    return jsonify(error=str(e)), 400
+
 @app.errorhandler(Exception)
 def handle_exception(e):
     """Log unhandled exceptions"""
@@ -113,144 +244,164 @@ def home():
     
     return render_template('index.html', config=session)
 
-@app.route('/model-info', methods=['GET'])
-@limiter.limit("10 per minute")
-def get_model_info():
-    """Get information about the currently loaded model"""
-    try:
-        # Get model info from LM Studio
-        print("\n=== Fetching Model Info ===")
-        response = requests.get(MODEL_INFO_URL)
-        response.raise_for_status()
-        data = response.json()
-        
-        print("\nAPI Response from /models:")
-        print(json.dumps(data, indent=2))
-        
-        # Extract model info from response
-        models = data.get('data', [])
-        if not models:
-            raise ValueError("No models found in response")
-            
-        model = models[0]  # Get the first (active) model
-        model_id = model.get('id')
+def fetch_model_info():
+    """Fetch metadata for the currently loaded model from LM Studio.
+
+    Only reads the model list and model details; never starts a completion.
+    """
+    response = llm.get(MODEL_INFO_URL)
+    response.raise_for_status()
+    data = response.json()
+    
+    # Extract model info from response
+    models = data.get('data', [])
+    if not models:
+        raise ValueError("No models found in response")
         
-        if not model_id:
-            raise ValueError("Model ID not found in response")
-            
-        # Try to get more detailed model info
-        detail_url = f"{MODEL_INFO_URL}/{model_id}"
-        print(f"\nFetching detailed model info from: {detail_url}")
+    model = models[0]  # Get the first (active) model
+    model_id = model.get('id')
+    
+    if not model_id:
+        raise ValueError("Model ID not found in response")
         
-        detail_response = requests.get(detail_url)
+    # Try to get more detailed model info
+    model_details = {}
+    try:
+        detail_response = llm.get(f"{MODEL_INFO_URL}/{model_id}")
         if detail_response.ok:
             model_details = detail_response.json()
-            print("\nModel details response:")
-            print(json.dumps(model_details, indent=2))
-            
-            # Try to get context length from model details
-            context_length = None
-            
-            # First try to get it from model details
-            if model_details:
-                context_length = (
-                    model_details.get('context_length') or
-                    model_details.get('max_context_length') or
-                    model_details.get('max_tokens') or
-                    model_details.get('context_window')
-                )
-            
-            # If not found in details, try the original model info
-            if not context_length:
-                context_length = (
-                    model.get('context_length') or
-                    model.get('max_context_length') or
-                    model.get('max_tokens') or
-                    model.get('context_window')
-                )
-            
-            # If still not found, try to detect from model capabilities
-            if not context_length:
-                print("\nTesting model capabilities...")
-                test_response = requests.post(API_URL, json={
-                    "messages": [{"role": "user", "content": "test"}],
-                    "max_tokens": 32000
-                })
-                
-                if test_response.ok:
-                    print("\nTest response:")
-                    print(json.dumps(test_response.json(), indent=2))
-                else:
-                    print("\nTest response error:")
-                    print(test_response.text)
-                    
-                    # Try to extract context length from error message
-                    error_msg = test_response.json().get('error', {}).get('message', '')
-                    print(f"\nError message: {error_msg}")
-                    
-                    import re
-                    limit_match = re.search(r'maximum context length is (\d+)', error_msg)
-                    if limit_match:
-                        context_length = int(limit_match.group(1))
-                        print(f"\nExtracted context length from error: {context_length}")
-            
-            # If we still don't have a context length, use model-specific defaults
-            if not context_length:
-                model_id_lower = model_id.lower()
-                if 'phi-2' in model_id_lower:
-                    context_length = 2048
-                elif 'phi-4' in model_id_lower:
-                    context_length = 16384
-                elif 'llama' in model_id_lower:
-                    context_length = 4096
-                elif 'mistral' in model_id_lower:
-                    context_length = 8192
-                elif 'mixtral' in model_id_lower:
-                    context_length = 32768
-                else:
-                    # Try one more test with a common limit
-                    test_response = requests.post(API_URL, json={
-                        "messages": [{"role": "user", "content": "test"}],
-                        "max_tokens": 16384
-                    })
-                    if test_response.ok:
-                        context_length = 16384
-                    else:
-                        context_length = 2048  # Conservative fallback
-            
-            model_params = {
-                'model_name': model_id,
-                'context_window': context_length,
-                'max_tokens': context_length,
-                'raw_api_response': {
-                    'model_list': data,
-                    'model_details': model_details
-                }
-            }
-            
-            print("\nFinal model parameters:")
-            print(json.dumps(model_params, indent=2))
-            return jsonify(model_params)
-            
+    except requests.RequestException as e:
+        app.logger.warning(f"Failed to get model details for {model_id}: {str(e)}")
+    
+    # Try to get context length from model details, then from the model list entry
+    context_length = None
+    for source in (model_details, model):
+        context_length = context_length or (
+            source.get('context_length') or
+            source.get('max_context_length') or
+            source.get('max_tokens') or
+            source.get('context_window')
+        )
+    
+    # If we still don't have a context length, use model-specific defaults
+    if not context_length:
+        model_id_lower = model_id.lower()
+        if 'phi-2' in model_id_lower:
+            context_length = 2048
+        elif 'phi-4' in model_id_lower:
+            context_length = 16384
+        elif 'llama' in model_id_lower:
+            context_length = 4096
+        elif 'mistral' in model_id_lower:
+            context_length = 8192
+        elif 'mixtral' in model_id_lower:
+            context_length = 32768
         else:
-            raise ValueError(f"Failed to get model details: {detail_response.text}")
-            
+            context_length = 2048  # Conservative fallback
+    
+    app.logger.info(f"Fetched model info: {model_id}, context window {context_length}")
+    return {
+        'model_name': model_id,
+        'context_window': context_length,
+        'max_tokens': context_length,
+        'raw_api_response': {
+            'model_list': data,
+            'model_details': model_details
+        }
+    }
+
+# Model metadata is cached process-wide and refreshed in the background
+DEFAULT_CONTEXT_WINDOW = 2048
+model_info_cache = ModelInfoCache(
+    fetch_model_info,
+    ttl=float(os.environ.get('MODEL_INFO_TTL', 300)),
+    refresh_interval=float(os.environ.get('MODEL_INFO_REFRESH_INTERVAL', 60))
+)
+
+def model_info_or_fallback():
+    """Cached model info, or conservative defaults with the error if LM Studio is unreachable"""
+    try:
+        return model_info_cache.get()
     except Exception as e:
-        error_response = {
+        app.logger.warning(f"Failed to get model info: {str(e)}")
+        return {
             'error': str(e),
             'model_name': 'Unknown Model',
-            'context_window': 2048,  # Default fallback
-            'max_tokens': 2048  # Default fallback
+            'context_window': DEFAULT_CONTEXT_WINDOW,  # Default fallback
+            'max_tokens': DEFAULT_CONTEXT_WINDOW  # Default fallback
         }
-        print("\nError response:")
-        print(json.dumps(error_response, indent=2))
-        return jsonify(error_response)
+
+@app.route('/model-info', methods=['GET'])
+@limiter.limit("10 per minute")
+def get_model_info():
+    """Get information about the currently loaded model"""
+    return jsonify(model_info_or_fallback())
+
+def request_collection(config=None, requested=None):
+    """Collection named by the request, else by the session (or config), else the default"""
+    config = session if config is None else config
+    return requested or config.get('collection') or DEFAULT_COLLECTION
+
+def chat_config(data, config=None):
+    """Session chat settings, scoped to the collection named in the request body if any"""
+    config = dict(session if config is None else config)
+    config['collection'] = request_collection(config, (data or {}).get('collection'))
+    return config
+
+@app.route('/collections', methods=['GET'])
+@limiter.limit("30 per minute")
+def get_collections():
+    """List the collections, the session's current one and the memory used by loaded ones"""
+    return jsonify({
+        'current': request_collection(),
+        'available': collections.names(),
+        **collections.stats()  # Memory use of the loaded ones under 'collections'
+    })
 
 @app.route('/processed-files', methods=['GET'])
 @limiter.limit("10 per minute")
 def get_processed_files():
     """Get list of processed files"""
-    return jsonify(rag.get_processed_files())
+    return jsonify(get_rag(request_collection(requested=request.args.get('collection'))).get_processed_files())
+
+@app.route('/processed-files/<path:filename>', methods=['DELETE'])
+@limiter.limit("30 per minute")
+def delete_processed_file(filename):
+    """Remove a processed file from the knowledge base"""
+    # Leased like ingestion, so the collection is not unloaded while the deletion is committed
+    with collections.lease(request_collection(requested=request.args.get('collection'))) as rag:
+        removed = rag.delete_file(filename)
+    if removed is None:
+        return jsonify({'error': 'File not found'}), 404
+    app.logger.info(f"Deleted processed file {filename} ({removed['chunks']} chunks)")
+    return jsonify(removed)
+
+@app.route('/stats', methods=['GET'])
+@limiter.limit("30 per minute")
+def get_stats():
+    """Get cache statistics"""
+    return jsonify({
+        'query_embedding_cache': get_rag().query_cache.stats(),
+        'embedding_service': get_rag().embedding_service.stats(),
+        'chunk_tokens': get_rag().chunk_stats.stats(),
+        'response_cache': response_cache.stats(),
+        'model_info_cache': model_info_cache.stats(),
+        'collections': collections.stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+@limiter.exempt  # Scraped periodically by Prometheus
+def get_metrics():
+    """Latency histograms, counters and cache gauges in the Prometheus text format"""
+    caches = {
+        'query_embedding': get_rag().query_cache,
+        'response': response_cache
+    }
+    for name, cache in caches.items():
+        stats = cache.stats()
+        metrics.set_gauge('cache_entries', stats['size'], cache=name)
+        metrics.set_gauge('cache_hit_ratio', stats['hit_rate'], cache=name)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/save-config', methods=['POST'])
 @limiter.limit("10 per minute")
@@ -268,6 +419,11 @@ def save_config():
                 session[key] = float(data[key])
             elif key in ['max_tokens', 'context_chunks']:
                 session[key] = int(data[key])
+            elif key == 'cache_responses':
+                # 'auto' (or null) follows the temperature; the settings form sends strings
+                session[key] = None if data[key] in (None, 'auto') else data[key] in (True, 'true')
+            elif key == 'collection':
+                session[key] = collections.check_name(data[key])
             else:
                 session[key] = data[key]
             updated = True
@@ -311,23 +467,36 @@ def upload_file():
             return jsonify({'error': 'File type not allowed'}), 400
         
         filename = secure_filename(file.filename)
-        if not os.path.exists(app.config['UPLOAD_FOLDER']):
-            os.makedirs(app.config['UPLOAD_FOLDER'])
+        collection = collections.check_name(request_collection(requested=request.form.get('collection')))
+        upload_dir = upload_folder(collection)
+        if not os.path.exists(upload_dir):
+            os.makedirs(upload_dir)
         
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        filepath = os.path.join(upload_dir, filename)
+        save_start = time.perf_counter()
         file.save(filepath)
+        timings = {'save': time.perf_counter() - save_start}
         
-        # Process the file with RAG engine
-        rag.add_pdf(filepath)
+        # Process the file with RAG engine in the background (skips unchanged files and chunks)
+        job = ingest_jobs.submit(filepath, collection=collection)
+        timings['total'] = time.time() - start_time
+        record_stages('upload', timings)
         
         app.logger.info(
-            f"File upload processed successfully. "
+            f"File upload queued for processing. "
             f"Filename: {filename}, "
+            f"Collection: {collection}, "
+            f"Job: {job.id}, "
             f"Duration: {time.time() - start_time:.2f}s"
         )
         
-        return jsonify({'message': 'File uploaded successfully'})
+        return jsonify({'message': 'File uploaded successfully', **job.to_dict()}), 202
         
+    except JobQueueFull as e:
+        app.logger.warning(f"Rejected file upload: {str(e)}")
+        return jsonify({'error': 'Server is busy processing other files, please retry later'}), 503, {'Retry-After': '30'}
+    except InvalidCollectionName as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         app.logger.error(
             f"Error processing file upload: {str(e)}", 
@@ -335,11 +504,149 @@ def upload_file():
         )
         return jsonify({'error': str(e)}), 500
 
+# Tokens reserved for the chat template and context header around the prompt text,
+# which also absorbs the difference between our tokenizer and the LLM's
+PROMPT_OVERHEAD_TOKENS = int(os.environ.get('PROMPT_OVERHEAD_TOKENS', 128))
+
+def get_context_window():
+    """Context window of the loaded model from the model info cache, or a conservative default"""
+    try:
+        return int(model_info_cache.get().get('context_window') or DEFAULT_CONTEXT_WINDOW)
+    except Exception as e:
+        app.logger.warning(f"Using default context window: {str(e)}")
+        return DEFAULT_CONTEXT_WINDOW
+
+def build_chat_payload(user_message, config=None, timings=None):
+    """Build the LM Studio request for a message, including RAG context and session settings.
+
+    config defaults to the Flask session. Returns the payload and the context
+    token usage for the request. If timings is given, the retrieval stage
+    timings of RAGEngine.get_packed_context are stored in it.
+    """
+    config = session if config is None else config
+    rag = get_rag(request_collection(config))
+    
+    # Get the system prompt from session or use default
+    system_prompt = config.get('system_prompt', DEFAULT_CONFIG['system_prompt'])
+    
+    # Get LLM settings from session or use defaults
+    temperature = config.get('temperature', DEFAULT_CONFIG['temperature'])
+    max_tokens = config.get('max_tokens', DEFAULT_CONFIG['max_tokens'])
+    top_p = config.get('top_p', DEFAULT_CONFIG['top_p'])
+    
+    # Fill what is left of the context window after the reply, prompt and message
+    context_chunks = config.get('context_chunks', DEFAULT_CONFIG['context_chunks'])
+    prompt_tokens = sum(rag.count_tokens([system_prompt, user_message]))
+    budget = get_context_window() - max_tokens - prompt_tokens - PROMPT_OVERHEAD_TOKENS
+    packed = rag.get_packed_context(user_message, budget, k=context_chunks, timings=timings)
+    
+    # Add context to the system prompt
+    full_system_prompt = system_prompt + "\n\nContext:\n" + packed['context']
+    
+    # Prepare the request to LM Studio API with context
+    messages = [
+        {"role": "system", "content": full_system_prompt},
+        {"role": "user", "content": user_message}
+    ]
+    
+    usage = {
+        'context_tokens': packed['tokens'],
+        'context_budget': max(budget, 0),
+        'context_chunks': packed['chunks'],
+        'prompt_tokens': prompt_tokens + packed['tokens']
+    }
+    app.logger.info(
+        f"Packed {usage['context_chunks']} context chunks: "
+        f"{usage['context_tokens']}/{usage['context_budget']} tokens"
+    )
+    
+    payload = {
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "top_p": top_p
+    }
+    return payload, usage
+
+def response_cache_key(user_message, config=None):
+    """Cache key for a chat response, or None if the session's answers are not cached.
+
+    Combines the whitespace-normalized message, the session's chat settings,
+    the loaded model and the collection with its corpus generation, so uploads,
+    deletions and model switches never serve a stale answer.
+    """
+    config = session if config is None else config
+    cache_responses = config.get('cache_responses', DEFAULT_CONFIG['cache_responses'])
+    if cache_responses is None:
+        # Sampled answers vary between calls, so by default only deterministic ones are reused
+        cache_responses = config.get('temperature', DEFAULT_CONFIG['temperature']) == 0
+    if response_cache.maxsize <= 0 or not cache_responses:
+        return None
+    try:
+        model_name = model_info_cache.get().get('model_name')
+    except Exception:
+        model_name = None
+    settings = tuple(config.get(key, DEFAULT_CONFIG[key]) for key in CHAT_SETTINGS)
+    collection = request_collection(config)
+    return " ".join(user_message.split()), settings, model_name, collection, get_rag(collection).generation
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@limiter.limit("120 per minute")  # Clients poll while a file is processed
+def get_job(job_id):
+    """Get the progress of a background ingestion job"""
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+@limiter.limit("30 per minute")
+def cancel_job(job_id):
+    """Cancel a queued or running ingestion job"""
+    job = ingest_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+SEARCH_MAX_K = int(os.environ.get('SEARCH_MAX_K', 50))
+SEARCH_MAX_QUERIES = int(os.environ.get('SEARCH_MAX_QUERIES', 256))
+
+@app.route('/search', methods=['POST'])
+@limiter.limit("30 per minute")
+def search():
+    """Ranked chunks for a query, or for a batch of queries, without calling the LLM.
+
+    The JSON body has either 'query' (returns {"results": [...]}) or 'queries'
+    (returns {"results": [[...], ...]}, one list per query, scored together by
+    RAGEngine.query_batch), plus optional 'k', 'mode' and 'collection'.
+    """
+    start_time = time.time()
+    data = request.get_json(silent=True) or {}
+    single = 'queries' not in data
+    queries = [data.get('query')] if single else data.get('queries')
+    if not isinstance(queries, list) or not queries or \
+            not all(isinstance(query, str) and query.strip() for query in queries):
+        return jsonify({"error": "'query' or a non-empty list of 'queries' is required"}), 400
+    if len(queries) > SEARCH_MAX_QUERIES:
+        return jsonify({"error": f"At most {SEARCH_MAX_QUERIES} queries per request"}), 400
+    k = data.get('k', DEFAULT_CONFIG['context_chunks'])
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= SEARCH_MAX_K:
+        return jsonify({"error": f"'k' must be an integer from 1 to {SEARCH_MAX_K}"}), 400
+
+    rag = get_rag(request_collection(requested=data.get('collection')))
+    try:
+        results = rag.query_batch(queries, k=k, mode=data.get('mode'))
+    except ValueError as e:  # Unknown search mode
+        return jsonify({"error": str(e)}), 400
+    record_stages('search', {'total': time.time() - start_time})
+    return jsonify({"results": results[0] if single else results})
+
 @app.route('/chat', methods=['POST'])
 @limiter.limit("30 per minute")  # Stricter limit for chat endpoint
 def chat():
     start_time = time.time()
     user_message = request.json.get('message', '')
+    config = chat_config(request.json)
     
     try:
         app.logger.info(f"Processing chat request from {request.remote_addr}")
@@ -348,45 +655,37 @@ def chat():
             app.logger.warning("Empty message received")
             return jsonify({"error": "Message is required"}), 400
         
-        # Get relevant context using RAG
-        context_chunks = session.get('context_chunks', DEFAULT_CONFIG['context_chunks'])
-        context = rag.get_context_for_query(user_message, k=context_chunks)
-        
-        # Get the system prompt from session or use default
-        system_prompt = session.get('system_prompt', DEFAULT_CONFIG['system_prompt'])
-        
-        # Add context to the system prompt
-        full_system_prompt = system_prompt + "\n\nContext:\n" + context
-        
-        # Get LLM settings from session or use defaults
-        temperature = session.get('temperature', DEFAULT_CONFIG['temperature'])
-        max_tokens = session.get('max_tokens', DEFAULT_CONFIG['max_tokens'])
-        top_p = session.get('top_p', DEFAULT_CONFIG['top_p'])
+        cache_key = response_cache_key(user_message, config)
+        cached = response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            app.logger.info(f"Chat request served from cache. Duration: {time.time() - start_time:.2f}s")
+            return jsonify({**cached, "cached": True})
         
-        # Prepare the request to LM Studio API with context
-        messages = [
-            {"role": "system", "content": full_system_prompt},
-            {"role": "user", "content": user_message}
-        ]
+        timings = {}
+        payload, usage = build_chat_payload(user_message, config, timings)
         
-        payload = {
-            "messages": messages,
-            "temperature": temperature,
-            "max_tokens": max_tokens,
-            "top_p": top_p
-        }
-        
-        response = requests.post(API_URL, json=payload)
+        llm_start = time.perf_counter()
+        response = llm.post(API_URL, json=payload)
         response.raise_for_status()
         ai_message = response.json()['choices'][0]['message']['content']
+        timings['llm_first_byte'] = response.elapsed.total_seconds()  # Until the response headers
+        timings['llm_total'] = time.perf_counter() - llm_start
         # Convert markdown to HTML
+        render_start = time.perf_counter()
         html_response = markdown.convert(ai_message)
+        timings['markdown_render'] = time.perf_counter() - render_start
+        timings['total'] = time.time() - start_time
+        record_stages('chat', timings)
+        if cache_key:
+            response_cache.set(cache_key, {"response": html_response, "usage": usage})
         app.logger.info(
             f"Chat request processed successfully. "
             f"Duration: {time.time() - start_time:.2f}s"
         )
-        return jsonify({"response": html_response})
+        return jsonify({"response": html_response, "usage": usage})
         
+    except (CollectionNotFound, InvalidCollectionName):
+        raise  # 404 / 400 from the error handlers
     except requests.RequestException as e:
         app.logger.error(f"API request error: {str(e)}", exc_info=True)
         return jsonify({"error": "Failed to communicate with LLM API"}), 503
@@ -394,5 +693,98 @@ def chat():
         app.logger.error(f"Error processing chat request: {str(e)}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
 
-if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+def sse_event(data, event=None):
+    """Format a server-sent event frame"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+def parse_stream_line(line):
+    """Return the content delta in one line of a streaming completion ('' if none, None at the end)"""
+    if not line or not line.startswith('data:'):
+        return ''
+    data = line[len('data:'):].strip()
+    if data == '[DONE]':
+        return None
+    choices = json.loads(data).get('choices') or [{}]
+    return choices[0].get('delta', {}).get('content') or ''
+
+def iter_completion_tokens(response):
+    """Yield content deltas from an LM Studio streaming completion"""
+    for line in response.iter_lines(decode_unicode=True):
+        token = parse_stream_line(line)
+        if token is None:
+            break
+        if token:
+            yield token
+
+@app.route('/chat/stream', methods=['POST'])
+@limiter.limit("30 per minute")  # Same limit as the blocking chat endpoint
+def chat_stream():
+    """Stream the completion to the client as server-sent events.
+
+    Emits a ``data: {"token": ...}`` frame per content delta, then a final
+    ``done`` event carrying the full Markdown-rendered response and context
+    token usage, or an
+    ``error`` event if LM Studio fails mid-stream. A cached response is sent
+    as the ``done`` event alone.
+    """
+    start_time = time.time()
+    user_message = request.json.get('message', '')
+    config = chat_config(request.json)
+    
+    app.logger.info(f"Processing streaming chat request from {request.remote_addr}")
+    
+    if not user_message:
+        app.logger.warning("Empty message received")
+        return jsonify({"error": "Message is required"}), 400
+    
+    cache_key = response_cache_key(user_message, config)
+    cached = response_cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        app.logger.info(f"Streaming chat request served from cache. Duration: {time.time() - start_time:.2f}s")
+        return Response(sse_event({**cached, "cached": True}, event="done"), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    
+    timings = {}
+    payload, usage = build_chat_payload(user_message, config, timings)
+    payload["stream"] = True
+    
+    def generate():
+        parts = []
+        try:
+            llm_start = time.perf_counter()
+            with llm.post(API_URL, json=payload, stream=True) as response:
+                response.raise_for_status()
+                for token in iter_completion_tokens(response):
+                    if not parts:
+                        timings['llm_first_byte'] = time.perf_counter() - llm_start
+                        app.logger.info(f"Time to first token: {time.time() - start_time:.2f}s")
+                    parts.append(token)
+                    yield sse_event({"token": token})
+            timings['llm_total'] = time.perf_counter() - llm_start
+            
+            # Convert the complete markdown to HTML once streaming is done
+            render_start = time.perf_counter()
+            result = {"response": markdown.convert("".join(parts)), "usage": usage}
+            timings['markdown_render'] = time.perf_counter() - render_start
+            if cache_key:
+                response_cache.set(cache_key, result)
+            yield sse_event(result, event="done")
+            timings['total'] = time.time() - start_time
+            record_stages('chat_stream', timings)
+            app.logger.info(
+                f"Streaming chat request processed successfully. "
+                f"Duration: {time.time() - start_time:.2f}s"
+            )
+        except requests.RequestException as e:
+            app.logger.error(f"API request error: {str(e)}", exc_info=True)
+            yield sse_event({"error": "Failed to communicate with LLM API"}, event="error")
+        except Exception as e:
+            app.logger.error(f"Error processing streaming chat request: {str(e)}", exc_info=True)
+            yield sse_event({"error": "Internal server error"}, event="error")
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -0,0 +1,354 @@
+"""Asynchronous (ASGI) serving mode.
+
+Serves /chat, /chat/stream, /upload and /model-info natively on an event loop,
+with LM Studio calls on an async connection pool and query embedding on a
+dedicated thread pool, so slow completions no longer hold a worker thread each.
+All other routes (UI, config, jobs, stats) are served by the Flask app mounted
+underneath, sharing the same RAG engine, caches and session cookie.
+
+Run with: uvicorn asgi_app:app --port 5000
+
+Requires the optional async dependencies (starlette, httpx, uvicorn,
+python-multipart, a2wsgi). Flask-Limiter does not see the native routes, so
+put the server behind a proxy that enforces rate limits.
+"""
+import os
+import time
+import shutil
+import asyncio
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import requests
+from a2wsgi import WSGIMiddleware
+from flask import session
+from flask_wtf.csrf import validate_csrf
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.utils import secure_filename
+from wtforms.validators import ValidationError
+
+from app import (app as flask_app, llm, collections, ingest_jobs, markdown, metrics, response_cache, API_URL,
+                 MAX_CONTENT_LENGTH, allowed_file, build_chat_payload, chat_config, model_info_or_fallback,
+                 parse_stream_line, record_stages, request_collection, response_cache_key, sse_event,
+                 upload_folder)
+from ingest_jobs import JobQueueFull
+from rag_collections import CollectionNotFound, InvalidCollectionName
+from llm_client import LLMClient, CircuitOpenError
+
+logger = flask_app.logger
+
+
+class AsyncLLMClient:
+    """Async counterpart of LLMClient on an httpx connection pool.
+
+    Uses the sync client's timeouts and retry policy and shares its circuit
+    breaker, so both serving modes agree on whether LM Studio is healthy.
+    """
+
+    def __init__(self, sync_client: LLMClient, pool_size: int = 10,
+                 transport: httpx.AsyncBaseTransport = None):
+        self.sync_client = sync_client
+        connect_timeout, read_timeout = sync_client.timeout
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            transport=transport
+        )
+
+    async def request(self, method: str, url: str, stream: bool = False, **kwargs) -> httpx.Response:
+        """Send a request; with stream=True the caller must close the response"""
+        breaker = self.sync_client.breaker
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open: {url} failed {breaker.failures} times in a row")
+
+        idempotent = method.upper() in ('GET', 'HEAD', 'OPTIONS')
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.send(self.client.build_request(method, url, **kwargs), stream=stream)
+            except httpx.TransportError as e:
+                # As in LLMClient, a POST is only resent if it never reached the server
+                retryable = idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if attempt < self.sync_client.max_retries and retryable:
+                    await asyncio.sleep(self.sync_client.retry_delay(attempt))
+                    attempt += 1
+                    continue
+                breaker.record_failure()
+                raise
+            except BaseException:
+                # Cancellation (the client disconnected) and other errors are no sign that LM Studio
+                # is down: free a half-open trial slot without counting a failure
+                breaker.release_trial()
+                raise
+
+            if response.status_code in LLMClient.RETRY_STATUSES:
+                if attempt < self.sync_client.max_retries:
+                    await response.aclose()
+                    await asyncio.sleep(self.sync_client.retry_delay(attempt))
+                    attempt += 1
+                    continue
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            return response
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('POST', url, **kwargs)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+llm_async = AsyncLLMClient(llm, pool_size=int(os.environ.get('LLM_POOL_SIZE', 10)))
+
+# Context packing blocks on query embedding; keep it off the event loop and the I/O thread pool.
+# The threads mostly wait on the engine's embedding service, which batches their queries together.
+EMBED_WORKERS = int(os.environ.get('EMBED_WORKERS', 16))
+embed_executor = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix='embed')
+
+
+async def run_embedding(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(embed_executor, func, *args)
+
+
+def flask_session(request: Request) -> dict:
+    """Validate the CSRF token and return the caller's Flask session (chat settings)"""
+    with flask_app.test_request_context(headers={'Cookie': request.headers.get('cookie', '')}):
+        if flask_app.config.get('WTF_CSRF_ENABLED', True):
+            validate_csrf(request.headers.get('x-csrftoken'))
+        return dict(session)
+
+
+def csrf_error(e: ValidationError) -> JSONResponse:
+    logger.warning(f"CSRF validation failed: {str(e)}")
+    return JSONResponse({'error': 'CSRF validation failed', 'message': str(e)}, status_code=400)
+
+
+def collection_error(e: Exception) -> JSONResponse:
+    return JSONResponse({'error': str(e)}, status_code=404 if isinstance(e, CollectionNotFound) else 400)
+
+
+async def chat(request: Request):
+    start_time = time.time()
+    try:
+        config = flask_session(request)
+    except ValidationError as e:
+        return csrf_error(e)
+
+    data = await request.json()
+    user_message = data.get('message', '')
+    config = chat_config(data, config)
+    logger.info(f"Processing async chat request from {request.client.host if request.client else None}")
+    if not user_message:
+        logger.warning("Empty message received")
+        return JSONResponse({"error": "Message is required"}, status_code=400)
+
+    try:
+        cache_key = await run_embedding(response_cache_key, user_message, config)
+        cached = response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            logger.info(f"Async chat request served from cache. Duration: {time.time() - start_time:.2f}s")
+            return JSONResponse({**cached, "cached": True})
+
+        timings = {}
+        payload, usage = await run_embedding(build_chat_payload, user_message, config, timings)
+        llm_start = time.perf_counter()
+        # Read the body separately so the time to the response headers can be recorded
+        response = await llm_async.post(API_URL, json=payload, stream=True)
+        try:
+            timings['llm_first_byte'] = time.perf_counter() - llm_start
+            response.raise_for_status()
+            await response.aread()
+        finally:
+            await response.aclose()
+        ai_message = response.json()['choices'][0]['message']['content']
+        timings['llm_total'] = time.perf_counter() - llm_start
+        render_start = time.perf_counter()
+        result = {"response": markdown.convert(ai_message), "usage": usage}
+        timings['markdown_render'] = time.perf_counter() - render_start
+        timings['total'] = time.time() - start_time
+        record_stages('chat', timings)
+        if cache_key:
+            response_cache.set(cache_key, result)
+        logger.info(f"Async chat request processed successfully. Duration: {time.time() - start_time:.2f}s")
+        return JSONResponse(result)
+    except (CollectionNotFound, InvalidCollectionName) as e:
+        return collection_error(e)
+    except (httpx.HTTPError, requests.RequestException) as e:
+        logger.error(f"API request error: {str(e)}", exc_info=True)
+        return JSONResponse({"error": "Failed to communicate with LLM API"}, status_code=503)
+    except Exception as e:
+        logger.error(f"Error processing chat request: {str(e)}", exc_info=True)
+        return JSONResponse({"error": "Internal server error"}, status_code=500)
+
+
+async def chat_stream(request: Request):
+    """Stream the completion as server-sent events, in the same format as the Flask route"""
+    start_time = time.time()
+    try:
+        config = flask_session(request)
+    except ValidationError as e:
+        return csrf_error(e)
+
+    data = await request.json()
+    user_message = data.get('message', '')
+    config = chat_config(data, config)
+    if not user_message:
+        logger.warning("Empty message received")
+        return JSONResponse({"error": "Message is required"}, status_code=400)
+
+    try:
+        cache_key = await run_embedding(response_cache_key, user_message, config)
+        cached = response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            logger.info(f"Async streaming chat request served from cache. Duration: {time.time() - start_time:.2f}s")
+            return StreamingResponse(iter([sse_event({**cached, "cached": True}, event="done")]),
+                                     media_type='text/event-stream',
+                                     headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+        timings = {}
+        payload, usage = await run_embedding(build_chat_payload, user_message, config, timings)
+    except (CollectionNotFound, InvalidCollectionName) as e:
+        return collection_error(e)
+    payload["stream"] = True
+
+    async def generate():
+        parts = []
+        try:
+            llm_start = time.perf_counter()
+            response = await llm_async.post(API_URL, json=payload, stream=True)
+            try:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    token = parse_stream_line(line)
+                    if token is None:
+                        break
+                    if token:
+                        if not parts:
+                            timings['llm_first_byte'] = time.perf_counter() - llm_start
+                            logger.info(f"Time to first token: {time.time() - start_time:.2f}s")
+                        parts.append(token)
+                        yield sse_event({"token": token})
+            finally:
+                await response.aclose()
+            timings['llm_total'] = time.perf_counter() - llm_start
+
+            render_start = time.perf_counter()
+            result = {"response": markdown.convert("".join(parts)), "usage": usage}
+            timings['markdown_render'] = time.perf_counter() - render_start
+            if cache_key:
+                response_cache.set(cache_key, result)
+            yield sse_event(result, event="done")
+            timings['total'] = time.time() - start_time
+            record_stages('chat_stream', timings)
+            logger.info(f"Async streaming chat request processed successfully. Duration: {time.time() - start_time:.2f}s")
+        except (httpx.HTTPError, requests.RequestException) as e:
+            logger.error(f"API request error: {str(e)}", exc_info=True)
+            yield sse_event({"error": "Failed to communicate with LLM API"}, event="error")
+        except Exception as e:
+            logger.error(f"Error processing streaming chat request: {str(e)}", exc_info=True)
+            yield sse_event({"error": "Internal server error"}, event="error")
+
+    return StreamingResponse(generate(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def save_upload(source, filepath: str) -> None:
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, 'wb') as f:
+        shutil.copyfileobj(source, f)
+
+
+def record_request(route, endpoint):
+    """Wrap a native route so it records the same request metrics as Flask's after_request hook"""
+    async def wrapper(request: Request):
+        start_time = time.time()
+        response = await endpoint(request)
+        metrics.increment('requests_total', method=request.method, route=route, status=response.status_code)
+        metrics.observe('request_duration_seconds', time.time() - start_time, method=request.method, route=route)
+        return response
+    return wrapper
+
+
+async def upload(request: Request):
+    start_time = time.time()
+    try:
+        config = flask_session(request)
+    except ValidationError as e:
+        return csrf_error(e)
+
+    if int(request.headers.get('content-length') or 0) > MAX_CONTENT_LENGTH:
+        return JSONResponse({'error': 'File too large'}, status_code=413)
+
+    form = await request.form()
+    file = form.get('file')
+    if not isinstance(file, UploadFile):
+        logger.warning("No file part in request")
+        return JSONResponse({'error': 'No file part'}, status_code=400)
+    if not file.filename:
+        logger.warning("No selected file")
+        return JSONResponse({'error': 'No selected file'}, status_code=400)
+    if not allowed_file(file.filename):
+        logger.warning(f"Invalid file type: {file.filename}")
+        return JSONResponse({'error': 'File type not allowed'}, status_code=400)
+
+    filename = secure_filename(file.filename)
+    try:
+        collection = collections.check_name(request_collection(config, form.get('collection')))
+    except InvalidCollectionName as e:
+        await form.close()
+        return collection_error(e)
+    filepath = os.path.join(upload_folder(collection), filename)
+    try:
+        save_start = time.perf_counter()
+        await run_in_threadpool(save_upload, file.file, filepath)
+        timings = {'save': time.perf_counter() - save_start}
+        job = ingest_jobs.submit(filepath, collection=collection)
+        timings['total'] = time.time() - start_time
+        record_stages('upload', timings)
+    except JobQueueFull as e:
+        logger.warning(f"Rejected file upload: {str(e)}")
+        return JSONResponse({'error': 'Server is busy processing other files, please retry later'},
+                            status_code=503, headers={'Retry-After': '30'})
+    except Exception as e:
+        logger.error(f"Error processing file upload: {str(e)}", exc_info=True)
+        return JSONResponse({'error': str(e)}, status_code=500)
+    finally:
+        await form.close()
+
+    logger.info(f"File upload queued for processing. Filename: {filename}, Collection: {collection}, Job: {job.id}")
+    return JSONResponse({'message': 'File uploaded successfully', **job.to_dict()}, status_code=202)
+
+
+async def model_info(request: Request):
+    """Serve model info from the shared cache; a cold miss fetches on the I/O thread pool"""
+    return JSONResponse(await run_in_threadpool(model_info_or_fallback))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await llm_async.aclose()
+    embed_executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route('/chat', record_request('/chat', chat), methods=['POST']),
+        Route('/chat/stream', record_request('/chat/stream', chat_stream), methods=['POST']),
+        Route('/upload', record_request('/upload', upload), methods=['POST']),
+        Route('/model-info', record_request('/model-info', model_info), methods=['GET']),
+        Mount('/', app=WSGIMiddleware(flask_app))
+    ],
+    lifespan=lifespan
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='127.0.0.1', port=5000)
@@ -0,0 +1,150 @@
+"""Compare concurrent /chat throughput of the Flask and ASGI serving modes
+
+Both apps talk to a local stub LM Studio server that answers every completion
+after a fixed delay. The Flask app runs on a fixed pool of sync worker threads
+(like gunicorn sync workers), the ASGI app on a single uvicorn event loop.
+
+Usage: python benchmarks/bench_async_chat.py --requests 200 --concurrency 50 --llm-latency 0.5
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import common  # noqa: F401  (sets up sys.path)
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """Answers /models immediately and completions after server.latency seconds"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.reply({'data': [{'id': 'stub-model', 'context_length': 4096}], 'id': 'stub-model'})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.latency)
+        self.reply({'choices': [{'message': {'content': 'Stub **answer**'}}]})
+
+    def reply(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_llm(latency: float) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubLLMHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_flask(flask_app, workers: int) -> str:
+    """Serve the WSGI app with a fixed number of request threads"""
+    from werkzeug.serving import BaseWSGIServer
+
+    class PooledWSGIServer(BaseWSGIServer):
+        pool = ThreadPoolExecutor(max_workers=workers)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    server = PooledWSGIServer('127.0.0.1', 0, flask_app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def start_uvicorn(asgi_app) -> str:
+    import socket
+    import uvicorn
+
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    server = uvicorn.Server(uvicorn.Config(asgi_app, log_level='warning', lifespan='off'))
+    threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+async def load_test(base_url: str, n_requests: int, concurrency: int):
+    import httpx
+
+    latencies, failures = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        async def one(i):
+            nonlocal failures
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post('/chat', json={'message': f'question {i % 20}'})
+                latencies.append(time.perf_counter() - start)
+                failures += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n_requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'throughput': n_requests / elapsed,
+        'p50': latencies[len(latencies) // 2],
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'failures': failures
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='Seconds per stub completion')
+    parser.add_argument('--sync-workers', type=int, default=8, help='Flask request threads')
+    args = parser.parse_args()
+
+    stub = start_stub_llm(args.llm_latency)
+    os.environ['LM_STUDIO_URL'] = f"http://127.0.0.1:{stub.server_port}/v1"
+    os.environ['LLM_POOL_SIZE'] = str(args.concurrency)
+
+    # Import after pointing the apps at the stub
+    from app import app as flask_app, limiter
+    import asgi_app
+    flask_app.config['WTF_CSRF_ENABLED'] = False
+    limiter.enabled = False
+    # Per-request logging would dominate the output
+    flask_app.logger.setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    servers = {
+        f'flask ({args.sync_workers} sync threads)': start_flask(flask_app, args.sync_workers),
+        'asgi (uvicorn)': start_uvicorn(asgi_app.app),
+    }
+    print(f"{args.requests} chats, concurrency {args.concurrency}, stub LLM latency {args.llm_latency}s")
+    for name, url in servers.items():
+        asyncio.run(load_test(url, args.concurrency, args.concurrency))  # Warm up
+        result = asyncio.run(load_test(url, args.requests, args.concurrency))
+        print(f"{name:<26}: {result['throughput']:7.1f} req/sec  p50 {result['p50']:6.2f}s  "
+              f"p95 {result['p95']:6.2f}s  failures {result['failures']}")
+
+
+if __name__ == '__main__':
+    main()
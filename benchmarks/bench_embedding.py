@@ -0,0 +1,43 @@
+"""Compare per-chunk and batched embedding throughput on a synthetic corpus
+
+Usage: python benchmarks/bench_embedding.py --chunks 500 --batch-sizes 8 32 64
+"""
+import argparse
+import time
+
+from common import synthetic_corpus
+from rag_engine import RAGEngine
+
+
+def run(engine: RAGEngine, chunks, batch_size: int = None) -> float:
+    start = time.perf_counter()
+    if batch_size is None:
+        for chunk in chunks:
+            engine._get_embedding(chunk)
+    else:
+        engine._get_embeddings(chunks, batch_size=batch_size)
+    return len(chunks) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chunks', type=int, default=300)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[8, 32, 64])
+    parser.add_argument('--model', default='sentence-transformers/all-MiniLM-L6-v2')
+    args = parser.parse_args()
+
+    engine = RAGEngine(model_name=args.model)
+    chunks = synthetic_corpus(args.chunks)
+
+    # Warm up so one-time allocation does not skew the first run
+    engine._get_embeddings(chunks[:8])
+
+    baseline = run(engine, chunks)
+    print(f"per-chunk        : {baseline:8.1f} chunks/sec")
+    for batch_size in args.batch_sizes:
+        throughput = run(engine, chunks, batch_size)
+        print(f"batched (bs={batch_size:<3}) : {throughput:8.1f} chunks/sec  ({throughput / baseline:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
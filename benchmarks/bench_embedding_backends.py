@@ -0,0 +1,47 @@
+"""Compare embedding throughput and fp32 agreement of the embedding backends
+
+Usage: python benchmarks/bench_embedding_backends.py --chunks 500 --backends torch torch-int8 onnx onnx-int8
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common import synthetic_corpus
+from embedding_backends import EMBEDDING_BACKENDS
+from rag_engine import RAGEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chunks', type=int, default=300)
+    parser.add_argument('--queries', type=int, default=100, help='Single-text embeddings for per-query latency')
+    parser.add_argument('--backends', nargs='+', default=list(EMBEDDING_BACKENDS))
+    parser.add_argument('--model', default='sentence-transformers/all-MiniLM-L6-v2')
+    args = parser.parse_args()
+
+    chunks = synthetic_corpus(args.chunks)
+    queries = synthetic_corpus(args.queries, min_words=5, max_words=20, seed=1)
+    reference = None
+    for backend in args.backends:
+        engine = RAGEngine(model_name=args.model, embedding_backend=backend)
+        engine._get_embeddings(chunks[:8])  # Warm up
+
+        start = time.perf_counter()
+        embeddings = engine._get_embeddings(chunks)
+        throughput = len(chunks) / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for query in queries:
+            engine._get_embedding(query)
+        latency = (time.perf_counter() - start) / len(queries) * 1000
+
+        if reference is None:
+            reference = embeddings  # The first backend (torch by default) is the baseline
+        cosines = np.sum(embeddings * reference, axis=1)
+        print(f"{backend:<11}: {throughput:8.1f} chunks/sec  {latency:6.2f} ms/query  "
+              f"cosine vs {args.backends[0]} min {cosines.min():.4f} mean {cosines.mean():.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Ingest cost of growing the embedding matrix with np.vstack vs the capacity-doubling buffer
+
+Simulates a sequence of uploads, each appending a batch of chunk embeddings,
+and reports total append time and peak memory allocated while appending.
+
+Usage: python benchmarks/bench_embedding_buffer.py --uploads 200 --chunks 500 --dim 384
+"""
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+
+import common  # noqa: F401  (sets up the import path)
+from embedding_buffer import EmbeddingBuffer
+
+
+def grow_vstack(batches):
+    embeddings = None
+    for batch in batches:
+        embeddings = batch if embeddings is None else np.vstack([embeddings, batch])
+    return embeddings
+
+
+def grow_buffer(batches):
+    buffer = EmbeddingBuffer()
+    for batch in batches:
+        buffer.append(batch)
+    return buffer.data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--uploads', type=int, default=200)
+    parser.add_argument('--chunks', type=int, default=500, help='Chunks per upload')
+    parser.add_argument('--dim', type=int, default=384)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    batches = [rng.standard_normal((args.chunks, args.dim), dtype=np.float32) for _ in range(args.uploads)]
+    final_mb = args.uploads * args.chunks * args.dim * 4 / 1e6
+    print(f"{args.uploads} uploads x {args.chunks} chunks, dim {args.dim} ({final_mb:.0f} MB final matrix)")
+
+    for name, grow in (('np.vstack', grow_vstack), ('EmbeddingBuffer', grow_buffer)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = grow(batches)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert len(result) == args.uploads * args.chunks
+        print(f"{name:<16}: {elapsed:7.3f}s total  {1000 * elapsed / args.uploads:7.2f} ms/upload  "
+              f"peak {peak / 1e6:7.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
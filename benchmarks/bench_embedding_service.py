@@ -0,0 +1,46 @@
+"""Compare concurrent query embedding with and without cross-request micro-batching
+
+Usage: python benchmarks/bench_embedding_service.py --threads 16 --queries 20 --wait-ms 5
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import synthetic_corpus
+from rag_engine import RAGEngine
+
+
+def run(threads: int, queries, embed) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(embed, queries))
+    return len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16, help='Concurrent request threads')
+    parser.add_argument('--queries', type=int, default=20, help='Queries per thread')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--wait-ms', type=float, default=5)
+    parser.add_argument('--torch-threads', type=int, default=None)
+    parser.add_argument('--model', default='sentence-transformers/all-MiniLM-L6-v2')
+    args = parser.parse_args()
+
+    engine = RAGEngine(model_name=args.model, query_batch_size=args.batch_size,
+                       query_batch_wait=args.wait_ms / 1000, torch_threads=args.torch_threads)
+    queries = synthetic_corpus(args.threads * args.queries, min_words=5, max_words=20, seed=1)
+    engine._get_embeddings(queries[:8])  # Warm up
+
+    direct = run(args.threads, queries, engine._get_embedding)
+    batched = run(args.threads, queries, engine.embedding_service.embed)
+    stats = engine.embedding_service.stats()
+    print(f"{args.threads} threads x {args.queries} queries")
+    print(f"per-request forward pass : {direct:8.1f} queries/sec")
+    print(f"micro-batched            : {batched:8.1f} queries/sec  ({batched / direct:.2f}x)  "
+          f"avg batch {stats['avg_batch_size']}, fill {stats['batch_fill']:.0%}, "
+          f"max queue depth {stats['max_queue_depth']}")
+
+
+if __name__ == '__main__':
+    main()
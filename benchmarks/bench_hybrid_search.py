@@ -0,0 +1,90 @@
+"""Recall@k and latency of dense, BM25 keyword and hybrid (RRF) retrieval on a synthetic corpus
+
+Every chunk belongs to a topic and mentions a unique part number (e.g. PN-004217).
+Chunk embeddings sit around their topic's centroid, the way a sentence encoder
+groups chunks by subject but cannot tell two part numbers apart. Identifier
+queries ask about one part number: dense search only finds its topic, keyword
+search finds the chunk. Topical queries have no identifier; recall is measured
+against the dense results, to check hybrid keeps semantic matches. Latencies
+exclude the query embedding forward pass, which keyword mode skips entirely.
+
+Usage: python benchmarks/bench_hybrid_search.py --rows 100000 --k 5
+"""
+import time
+import argparse
+
+import numpy as np
+
+import common  # noqa: F401  (sets up the import path)
+from common import VOCABULARY
+from keyword_index import BM25Index, reciprocal_rank_fusion
+from vector_index import ExactIndex, normalize_rows
+
+
+def build_corpus(n_rows, dim, topics, rng):
+    centers = normalize_rows(rng.normal(size=(topics, dim)))
+    topic_of = rng.integers(topics, size=n_rows)
+    vectors = normalize_rows(centers[topic_of] + 0.5 * rng.normal(size=(n_rows, dim)) / np.sqrt(dim))
+    words = np.array(VOCABULARY)
+    texts = [
+        f"topic{topic} " + " ".join(rng.choice(words, size=40)) + f" replace part PN-{row:06d} when worn"
+        for row, topic in enumerate(topic_of)
+    ]
+    return centers, topic_of, vectors, texts
+
+
+def search(mode, dense, keyword, text, vector, k):
+    if mode == 'dense':
+        return dense.search(vector, k)[0]
+    if mode == 'keyword':
+        return keyword.search(text, k)[0]
+    fetch = max(2 * k, 20)
+    return reciprocal_rank_fusion([dense.search(vector, fetch)[0], keyword.search(text, fetch)[0]], k)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--topics', type=int, default=256)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers, topic_of, vectors, texts = build_corpus(args.rows, args.dim, args.topics, rng)
+
+    dense = ExactIndex()
+    dense.add(vectors)
+    start = time.perf_counter()
+    keyword = BM25Index()
+    keyword.add(texts)
+    print(f"{args.rows} chunks: BM25 index built in {time.perf_counter() - start:.1f}s, "
+          f"{keyword.memory_bytes() / 1e6:.1f} MB of posting lists")
+
+    targets = rng.choice(args.rows, size=args.queries, replace=False)
+    noise = 0.5 * rng.normal(size=(args.queries, args.dim)) / np.sqrt(args.dim)
+    identifier_queries = [(f"what does part PN-{row:06d} do", vector)
+                          for row, vector in zip(targets, normalize_rows(centers[topic_of[targets]] + noise))]
+    topical_queries = [(f"topic{topic_of[row]} " + " ".join(rng.choice(VOCABULARY, size=3)), vector)
+                       for row, vector in zip(targets, normalize_rows(vectors[targets] + noise))]
+
+    print(f"{'mode':<8} {'identifier recall@k':>20} {'topical recall@k':>17} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in ('dense', 'keyword', 'hybrid'):
+        latencies, found, overlap = [], 0, 0
+        for (text, vector), row in zip(identifier_queries, targets):
+            start = time.perf_counter()
+            ids = search(mode, dense, keyword, text, vector, args.k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found += row in ids
+        for text, vector in topical_queries:
+            start = time.perf_counter()
+            ids = search(mode, dense, keyword, text, vector, args.k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            overlap += len(set(ids) & set(dense.search(vector, args.k)[0]))
+        print(f"{mode:<8} {found / len(targets):>20.3f} {overlap / (len(targets) * args.k):>17.3f} "
+              f"{np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 99):>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Recall@k and latency of the approximate index backends against exact search
+
+Usage: python benchmarks/bench_index.py --rows 200000 --dim 384 --n-probe 4 8 16
+"""
+import argparse
+import time
+
+import numpy as np
+
+import common  # noqa: F401  (sets up the import path)
+from vector_index import ExactIndex, IVFIndex, normalize_rows
+
+
+def clustered_vectors(n, dim, clusters, rng):
+    centers = rng.normal(size=(clusters, dim))
+    return normalize_rows(centers[rng.integers(clusters, size=n)] + 0.5 * rng.normal(size=(n, dim)))
+
+
+def measure(index, queries, k):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        ids, _ = index.search(query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(set(ids))
+    return results, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--n-lists', type=int, default=None)
+    parser.add_argument('--n-probe', type=int, nargs='+', default=[4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = clustered_vectors(args.rows, args.dim, 256, rng)
+    queries = clustered_vectors(args.queries, args.dim, 256, rng)
+
+    exact = ExactIndex()
+    exact.add(vectors)
+    truth, p50, p99 = measure(exact, queries, args.k)
+    print(f"exact             recall@{args.k}=1.000  p50={p50:6.2f}ms  p99={p99:6.2f}ms")
+
+    start = time.perf_counter()
+    ivf = IVFIndex(n_lists=args.n_lists)
+    ivf.add(vectors)
+    print(f"ivf build: {time.perf_counter() - start:.1f}s ({len(ivf._lists)} lists)")
+
+    for n_probe in args.n_probe:
+        ivf.n_probe = n_probe
+        found, p50, p99 = measure(ivf, queries, args.k)
+        recall = np.mean([len(t & f) / len(t) for t, f in zip(truth, found)])
+        print(f"ivf n_probe={n_probe:<4}  recall@{args.k}={recall:.3f}  p50={p50:6.2f}ms  p99={p99:6.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Memory footprint, recall@k and latency of compact index precisions against float32
+
+Usage: python benchmarks/bench_index_precision.py --rows 200000 --dim 384 --k 10
+"""
+import argparse
+
+import numpy as np
+
+import common  # noqa: F401  (sets up the import path)
+from bench_index import clustered_vectors, measure
+from vector_index import ExactIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--rescore-factor', type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = clustered_vectors(args.rows, args.dim, 256, rng)
+    queries = clustered_vectors(args.queries, args.dim, 256, rng)
+
+    baseline = ExactIndex()
+    baseline.add(vectors)
+    truth, _, _ = measure(baseline, queries, args.k)
+
+    # The float32 array stands in for the on-disk store that RAGEngine re-scores from
+    variants = [
+        ('float32', {}),
+        ('float16', {'precision': 'float16'}),
+        ('int8', {'precision': 'int8'}),
+        ('float16 + rescore', {'precision': 'float16', 'rescore_source': lambda ids: vectors[ids]}),
+        ('int8 + rescore', {'precision': 'int8', 'rescore_source': lambda ids: vectors[ids]}),
+    ]
+    for name, options in variants:
+        index = ExactIndex(rescore_factor=args.rescore_factor, **options)
+        index.add(vectors)
+        found, p50, p99 = measure(index, queries, args.k)
+        recall = np.mean([len(t & f) / len(t) for t, f in zip(truth, found)])
+        megabytes = index.memory_bytes() / 2 ** 20
+        print(f"{name:<18} {megabytes:8.1f} MB ({index.memory_bytes() / len(vectors):6.1f} B/row)  "
+              f"recall@{args.k}={recall:.3f}  p50={p50:6.2f}ms  p99={p99:6.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
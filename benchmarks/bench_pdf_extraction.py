@@ -0,0 +1,66 @@
+"""Serial vs process-pool PDF text extraction and chunking on a generated multi-hundred-page PDF
+
+Usage: python benchmarks/bench_pdf_extraction.py --pages 400 --workers 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from pypdf import PdfReader
+
+from common import synthetic_corpus, write_text_pdf
+from pdf_extract import extract_pages
+
+
+def baseline(pdf_path, chunk_size=200):
+    """The original add_pdf extraction: serial pages and repeated string concatenation"""
+    reader = PdfReader(pdf_path)
+    text = ""
+    for page in reader.pages:
+        text += page.extract_text() + " "
+    words = text.split()
+    return [" ".join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size)]
+
+
+def streamed(pdf_path, workers, chunk_size=200):
+    """Sharded extraction, carrying words across pages instead of building one joined string"""
+    _, pages = extract_pages(pdf_path, workers=workers)
+    chunks, words = [], []
+    for text in pages:
+        words.extend(text.split())
+        while len(words) >= chunk_size:
+            chunks.append(" ".join(words[:chunk_size]))
+            del words[:chunk_size]
+    if words:
+        chunks.append(" ".join(words))
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=400)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, 'bench.pdf')
+        write_text_pdf(pdf_path, synthetic_corpus(args.pages, 300, 500))
+
+        start = time.perf_counter()
+        expected = baseline(pdf_path)
+        base_time = time.perf_counter() - start
+        print(f"baseline (serial concat) : {base_time:6.2f}s  {args.pages / base_time:7.1f} pages/sec")
+
+        for workers in args.workers:
+            streamed(pdf_path, workers)  # Start the worker pool, which the server keeps between uploads
+            start = time.perf_counter()
+            chunks = streamed(pdf_path, workers)
+            elapsed = time.perf_counter() - start
+            assert chunks == expected, "Chunking differs from the baseline"
+            print(f"streamed workers={workers:<2}     : {elapsed:6.2f}s  {args.pages / elapsed:7.1f} pages/sec"
+                  f"  ({base_time / elapsed:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
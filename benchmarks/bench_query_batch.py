@@ -0,0 +1,84 @@
+"""Queries/sec of RAGEngine.query_batch versus looping over RAGEngine.query
+
+The engine section runs both over a knowledge base of synthetic chunks, first
+with an empty query embedding cache (so the batch also shares forward passes)
+and then with every query embedding cached (search and result building only).
+The index section compares ExactIndex.search per query with search_batch on
+random unit vectors, where the matrix-matrix product dominates.
+
+Usage: python benchmarks/bench_query_batch.py --chunks 2000 --queries 256 --rows 100000
+"""
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from common import synthetic_corpus
+from rag_engine import RAGEngine
+from vector_index import ExactIndex, normalize_rows
+
+
+def rate(func, n_queries: int, repeats: int = 1) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return n_queries * repeats / (time.perf_counter() - start)
+
+
+def bench_engine(engine: RAGEngine, queries, k: int, modes) -> None:
+    print(f"{'mode':<8} {'cache':<6} {'loop q/s':>10} {'batch q/s':>10} {'speedup':>8}")
+    for mode in modes:
+        for cached in (False, True):
+            loop, batch = 0.0, 0.0
+            for label in ('loop', 'batch'):
+                if not cached:
+                    engine.query_cache.clear()
+                else:
+                    engine.query_batch(queries, k, mode)  # Fill the cache
+                if label == 'loop':
+                    loop = rate(lambda: [engine.query(query, k, mode) for query in queries], len(queries))
+                else:
+                    batch = rate(lambda: engine.query_batch(queries, k, mode), len(queries))
+            print(f"{mode:<8} {'warm' if cached else 'cold':<6} {loop:10.1f} {batch:10.1f} {batch / loop:7.2f}x")
+
+
+def bench_index(rows: int, dim: int, n_queries: int, k: int, precision: str) -> None:
+    rng = np.random.default_rng(0)
+    vectors = normalize_rows(rng.normal(size=(rows, dim)))
+    queries = normalize_rows(rng.normal(size=(n_queries, dim)))
+    index = ExactIndex(precision=precision, rescore_source=lambda ids: vectors[ids])
+    index.add(vectors)
+    loop = rate(lambda: [index.search(query, k) for query in queries], n_queries, repeats=3)
+    batch = rate(lambda: index.search_batch(queries, k), n_queries, repeats=3)
+    print(f"{precision:<8} {loop:10.1f} {batch:10.1f} {batch / loop:7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chunks', type=int, default=2000, help='Chunks in the engine knowledge base')
+    parser.add_argument('--queries', type=int, default=256, help='Queries per batch')
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--modes', default='dense,hybrid,keyword')
+    parser.add_argument('--rows', type=int, default=100000, help='Rows for the index-only comparison (0 skips it)')
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--model', default='sentence-transformers/all-MiniLM-L6-v2')
+    args = parser.parse_args()
+
+    queries = synthetic_corpus(args.queries, min_words=5, max_words=20, seed=1)
+    with tempfile.TemporaryDirectory() as storage_dir:
+        engine = RAGEngine(model_name=args.model, storage_dir=storage_dir)
+        engine.add_texts(synthetic_corpus(args.chunks, min_words=20, max_words=80))
+        engine.warm_up()
+        print(f"Engine: {args.chunks} chunks, {args.queries} queries, k={args.k}")
+        bench_engine(engine, queries, args.k, args.modes.split(','))
+
+    if args.rows:
+        print(f"\nIndex: {args.rows} x {args.dim} rows, {args.queries} queries, k={args.k}")
+        print(f"{'precision':<8} {'loop q/s':>10} {'batch q/s':>10} {'speedup':>8}")
+        for precision in ('float32', 'int8'):
+            bench_index(args.rows, args.dim, args.queries, args.k, precision)
+
+
+if __name__ == '__main__':
+    main()
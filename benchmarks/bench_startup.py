@@ -0,0 +1,58 @@
+"""Measure app cold start: import time, time to first response and time until queries are fast
+
+Each run starts a fresh interpreter so nothing is cached in-process.
+
+Usage: python benchmarks/bench_startup.py --runs 5
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from common import ROOT_DIR
+
+PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+assert client.get('/').status_code == 200
+first_response = time.perf_counter()
+assert client.get('/processed-files').status_code == 200
+files_response = time.perf_counter()
+app.warm_up()
+warm = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'first_response': first_response - start,
+    'processed_files': files_response - start,
+    'model_ready': warm - start,
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, RAG_STORAGE_DIR=os.path.join(workdir, 'store'), PYTHONPATH=ROOT_DIR)
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, '-c', PROBE], cwd=workdir, env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"median of {args.runs} cold starts")
+    for key, label in [('import', 'import app'), ('first_response', 'first response (/)'),
+                       ('processed_files', 'GET /processed-files'), ('model_ready', 'model warmed up')]:
+        print(f"{label:<22}: {statistics.median(r[key] for r in results) * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+"""Shared helpers for the benchmark scripts"""
+import os
+import sys
+import random
+from typing import List
+
+# Allow running the scripts directly from the repository root or this directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from tests.pdf_fixtures import write_text_pdf  # noqa: E402,F401  (shared with the tests)
+
+VOCABULARY = (
+    "system data model query document page error code network server client "
+    "request response cache memory disk index vector search token batch "
+    "config user session upload file report table value result process thread"
+).split()
+
+
+def synthetic_corpus(n_chunks: int, min_words: int = 20, max_words: int = 200, seed: int = 0) -> List[str]:
+    """Generate chunks of random vocabulary words with varied lengths"""
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(min_words, max_words)))
+        for _ in range(n_chunks)
+    ]
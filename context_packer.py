@@ -0,0 +1,98 @@
+import re
+from typing import Callable, List, Optional
+import numpy as np
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def mmr_order(query: Optional[np.ndarray], vectors: np.ndarray, mmr_lambda: float = 0.7,
+              duplicate_threshold: float = 0.95, relevance: Optional[np.ndarray] = None) -> List[int]:
+    """Order candidates by maximal marginal relevance, dropping near-duplicates.
+
+    Each step picks the candidate with the best trade-off between relevance
+    (weight mmr_lambda) and dissimilarity to what was already picked.
+    Relevance is the similarity to the query unless given, e.g. keyword or
+    fused scores scaled to [0, 1]. Candidates whose cosine similarity to a
+    picked chunk exceeds duplicate_threshold are dropped. Vectors must be unit
+    length.
+    """
+    if len(vectors) == 0:
+        return []
+    if relevance is None:
+        relevance = vectors @ np.asarray(query, dtype=np.float32).ravel()
+    pairwise = vectors @ vectors.T
+    redundancy = np.full(len(vectors), -np.inf)
+    available = np.ones(len(vectors), dtype=bool)
+    order = []
+    while available.any():
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * np.maximum(redundancy, 0)
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        order.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, pairwise[best])
+        available &= redundancy <= duplicate_threshold
+    return order
+
+
+class ContextPacker:
+    """Fills a token budget with formatted context chunks.
+
+    count_tokens maps a list of texts to their token counts; any fast
+    tokenizer works, but counts from a different tokenizer than the LLM's
+    are an approximation, so leave some headroom in the budget.
+    """
+
+    def __init__(self, count_tokens: Callable[[List[str]], List[int]], min_trim_tokens: int = 32):
+        self.count_tokens = count_tokens
+        self.min_trim_tokens = min_trim_tokens  # Don't add trimmed fragments shorter than this
+
+    @staticmethod
+    def format_entry(result: dict, number: int, content: str) -> str:
+        source = f"{result['file']}, page {result['page']}" if result.get('page') else result['file']
+        return f"[From {source}] Document {number}:\n{content}"
+
+    def pack(self, results: List[dict], budget: int, max_chunks: int) -> dict:
+        """Add results in order until max_chunks or the budget is reached.
+
+        The first chunk that does not fit is trimmed at a sentence boundary to
+        use the remaining budget, then packing stops.
+        """
+        parts, used = [], 0
+        for result in results:
+            if len(parts) >= max_chunks or used >= budget:
+                break
+            entry = self.format_entry(result, len(parts) + 1, result['content'])
+            tokens = self.count_tokens([entry])[0]
+            if used + tokens <= budget:
+                parts.append(entry)
+                used += tokens
+                continue
+
+            trimmed = self._trim(result, len(parts) + 1, budget - used)
+            if trimmed:
+                parts.append(trimmed[0])
+                used += trimmed[1]
+            break
+
+        return {
+            'context': "\n\n".join(parts),
+            'tokens': used,
+            'chunks': len(parts),
+            'budget': budget
+        }
+
+    def _trim(self, result: dict, number: int, remaining: int):
+        if remaining < self.min_trim_tokens:
+            return None
+        header_tokens = self.count_tokens([self.format_entry(result, number, "")])[0]
+        sentences = _SENTENCE_END.split(result['content'])
+        kept, used = [], header_tokens
+        for sentence, tokens in zip(sentences, self.count_tokens(sentences)):
+            if used + tokens > remaining:
+                break
+            kept.append(sentence)
+            used += tokens
+        if not kept or used < self.min_trim_tokens:
+            return None
+        return self.format_entry(result, number, " ".join(kept)), used
@@ -0,0 +1,133 @@
+import os
+from typing import Dict, List, Optional
+
+# torch is imported inside the backends, so the registry can be checked without loading it.
+# Inputs a BERT-style encoder may take, in forward() order
+MODEL_INPUTS = ('input_ids', 'attention_mask', 'token_type_ids')
+
+
+class TorchBackend:
+    """Full-precision PyTorch forward pass, the reference the other backends are checked against"""
+
+    def __init__(self, model, tokenizer=None, model_name: Optional[str] = None):
+        self.model = model.eval()
+
+    def __call__(self, inputs: Dict[str, "torch.Tensor"]) -> "torch.Tensor":
+        """Return the last hidden state for a padded batch of tokenizer outputs"""
+        return self.model(**inputs).last_hidden_state
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """PyTorch with dynamic int8 quantization of the Linear layers (weights int8, activations quantized per batch)"""
+
+    def __init__(self, model, tokenizer=None, model_name: Optional[str] = None):
+        import torch
+        super().__init__(torch.ao.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8))
+
+
+class ONNXBackend:
+    """ONNX Runtime inference on the model exported to ONNX, optionally with int8 weights.
+
+    The export is done once and cached in export_dir (delete the files to
+    re-export after changing model weights). Needs the optional onnxruntime
+    and onnxscript packages.
+    """
+
+    def __init__(self, model, tokenizer, model_name: str, export_dir: Optional[str] = None,
+                 quantize: bool = False, threads: Optional[int] = None):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("The onnx embedding backends require onnxruntime: pip install onnxruntime onnxscript") from e
+
+        export_dir = export_dir or os.path.join(os.path.expanduser('~'), '.cache', 'wst', 'onnx')
+        path = self.export(model, tokenizer, model_name, export_dir)
+        if quantize:
+            path = self.quantize(path)
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_names: List[str] = [node.name for node in self.session.get_inputs()]
+
+    @staticmethod
+    def export(model, tokenizer, model_name: str, export_dir: str) -> str:
+        """Export the model to ONNX with dynamic batch and sequence axes, unless already exported"""
+        path = os.path.join(export_dir, model_name.replace('/', '--') + '.onnx')
+        if os.path.exists(path):
+            return path
+        import torch
+
+        class LastHiddenState(torch.nn.Module):
+            """Export wrapper with plain tensor inputs and a single tensor output"""
+
+            def forward(self, input_ids, attention_mask, token_type_ids):
+                return model(input_ids=input_ids, attention_mask=attention_mask,
+                             token_type_ids=token_type_ids).last_hidden_state
+
+        os.makedirs(export_dir, exist_ok=True)
+        # Two texts of different lengths so neither axis is specialized to a constant
+        sample = tokenizer(['sample text for export', 'sample'], padding=True, return_tensors='pt')
+        if 'token_type_ids' not in sample:
+            sample['token_type_ids'] = torch.zeros_like(sample['input_ids'])
+        batch = torch.export.Dim('batch')
+        sequence = torch.export.Dim('sequence', max=512)
+        tmp_path = path + '.tmp'
+        torch.onnx.export(
+            LastHiddenState(),
+            tuple(sample[name] for name in MODEL_INPUTS),
+            tmp_path,
+            input_names=list(MODEL_INPUTS),
+            output_names=['last_hidden_state'],
+            dynamic_shapes={name: {0: batch, 1: sequence} for name in MODEL_INPUTS},
+            external_data=False,
+            dynamo=True
+        )
+        os.replace(tmp_path, path)
+        return path
+
+    @staticmethod
+    def quantize(path: str) -> str:
+        """Write a dynamically int8-quantized copy of an exported model, unless it already exists"""
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_path = path[:-len('.onnx')] + '-int8.onnx'
+        if not os.path.exists(quantized_path):
+            tmp_path = quantized_path + '.tmp'
+            quantize_dynamic(path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, quantized_path)
+        return quantized_path
+
+    def __call__(self, inputs: Dict[str, "torch.Tensor"]) -> "torch.Tensor":
+        import torch
+
+        feed = {}
+        for name in self.input_names:
+            tensor = inputs.get(name)
+            if tensor is None:
+                tensor = torch.zeros_like(inputs['input_ids'])
+            feed[name] = tensor.numpy()
+        return torch.from_numpy(self.session.run(['last_hidden_state'], feed)[0])
+
+
+class QuantizedONNXBackend(ONNXBackend):
+    """ONNX Runtime with dynamically int8-quantized weights"""
+
+    def __init__(self, model, tokenizer, model_name: str, **options):
+        super().__init__(model, tokenizer, model_name, quantize=True, **options)
+
+
+EMBEDDING_BACKENDS = {
+    'torch': TorchBackend,
+    'torch-int8': QuantizedTorchBackend,
+    'onnx': ONNXBackend,
+    'onnx-int8': QuantizedONNXBackend,
+}
+
+
+def create_embedding_backend(name: str, model, tokenizer, model_name: str, **options):
+    """Create an embedding backend by name ('torch', 'torch-int8', 'onnx' or 'onnx-int8')"""
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name}")
+    return EMBEDDING_BACKENDS[name](model, tokenizer, model_name, **options)
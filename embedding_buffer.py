@@ -0,0 +1,81 @@
+from typing import Optional
+import numpy as np
+
+
+class EmbeddingBuffer:
+    """Growable array of rows with amortized O(1) append.
+
+    Rows live at the front of a larger allocation whose capacity doubles when
+    it fills up, so an append copies only the new rows instead of the whole
+    matrix, and data is always one contiguous view. Rows can be tombstoned
+    with delete() and dropped with compact(), which renumbers the live rows.
+
+    Views returned by data never change: appends write past their end, and
+    growth and compaction move rows into a new allocation.
+    """
+
+    def __init__(self, dtype=np.float32, capacity: int = 1024):
+        self.dtype = np.dtype(dtype)
+        self.initial_capacity = capacity
+        self._array: Optional[np.ndarray] = None  # Allocated once the row shape is known
+        self._deleted = np.zeros(0, dtype=bool)
+        self._size = 0
+        self.n_deleted = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self._array is None else len(self._array)
+
+    @property
+    def data(self) -> Optional[np.ndarray]:
+        """The rows appended so far (tombstoned ones included), or None when empty"""
+        return self._array[:self._size] if self._size else None
+
+    @property
+    def deleted(self) -> np.ndarray:
+        """Tombstone flag of each row"""
+        return self._deleted[:self._size]
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes allocated, including the unused capacity"""
+        rows = 0 if self._array is None else self._array.nbytes
+        return rows + self._deleted.nbytes
+
+    def append(self, rows: np.ndarray) -> None:
+        rows = np.asarray(rows, dtype=self.dtype)
+        needed = self._size + len(rows)
+        if needed > self.capacity:
+            self._reallocate(max(needed, 2 * self.capacity, self.initial_capacity), rows.shape[1:])
+        self._array[self._size:needed] = rows
+        self._size = needed
+
+    def delete(self, ids) -> None:
+        """Tombstone rows; they stay in data (and keep their ids) until compact()"""
+        self._deleted[ids] = True
+        self.n_deleted = int(self.deleted.sum())
+
+    def compact(self) -> np.ndarray:
+        """Drop tombstoned rows, returning old row id -> new row id (-1 for dropped rows)"""
+        keep = ~self.deleted
+        remap = np.full(self._size, -1, dtype=np.int64)
+        remap[keep] = np.arange(int(keep.sum()))
+        if self.n_deleted:
+            live = self._array[:self._size][keep]
+            self._size = 0
+            self._reallocate(max(2 * len(live), self.initial_capacity), live.shape[1:])
+            self._array[:len(live)] = live
+            self._size = len(live)
+            self.n_deleted = 0
+        return remap
+
+    def _reallocate(self, capacity: int, row_shape: tuple) -> None:
+        array = np.empty((capacity,) + row_shape, dtype=self.dtype)
+        deleted = np.zeros(capacity, dtype=bool)
+        if self._size:
+            array[:self._size] = self._array[:self._size]
+            deleted[:self._size] = self._deleted[:self._size]
+        self._array, self._deleted = array, deleted
@@ -0,0 +1,115 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+import numpy as np
+
+
+class EmbeddingService:
+    """Micro-batches embedding requests from many threads into one forward pass.
+
+    submit() enqueues a text and returns a Future. A single worker thread takes
+    the first waiting request, collects more for up to max_wait seconds or until
+    max_batch_size texts are waiting, embeds them with one call to embed and
+    resolves the futures. Identical texts in a batch are embedded once.
+
+    Running all query embedding on one thread also stops request threads from
+    competing for torch's intra-op threads (sized by RAGEngine's torch_threads).
+    """
+
+    def __init__(self, embed: Callable[[List[str]], np.ndarray], max_batch_size: int = 32,
+                 max_wait: float = 0.005):
+        self.embed_batch = embed
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = 0
+        self.batches = 0
+        self.batched_texts = 0
+        self.max_queue_depth = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    def submit(self, text: str) -> Future:
+        """Queue a text for embedding; the future resolves to its unit-length vector"""
+        self._start_worker()
+        future = Future()
+        self._queue.put((text, future))
+        with self._lock:
+            self.requests += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return future
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        return self.submit(text).result(timeout)
+
+    def _start_worker(self) -> None:
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name='embedding-service', daemon=True)
+                    self._worker.start()
+
+    def _collect(self) -> list:
+        """Block for the first request, then gather more until the batch is full or the window closes"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size and batch[-1] is not None:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            stop = batch[-1] is None
+            requests = [item for item in batch if item is not None]
+            if requests:
+                self._process(requests)
+            if stop:
+                return
+
+    def _process(self, requests: list) -> None:
+        # Skip requests whose caller already gave up
+        requests = [(text, future) for text, future in requests if future.set_running_or_notify_cancel()]
+        if not requests:
+            return
+        texts = list(dict.fromkeys(text for text, _ in requests))
+        try:
+            embeddings = self.embed_batch(texts)
+        except Exception as e:
+            for _, future in requests:
+                future.set_exception(e)
+            return
+
+        rows = {text: i for i, text in enumerate(texts)}
+        for text, future in requests:
+            future.set_result(embeddings[rows[text]])
+        with self._lock:
+            self.batches += 1
+            self.batched_texts += len(requests)
+
+    def stop(self) -> None:
+        """Finish the queued requests and stop the worker"""
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            avg_batch = self.batched_texts / self.batches if self.batches else 0.0
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'requests': self.requests,
+                'batches': self.batches,
+                'avg_batch_size': round(avg_batch, 2),
+                'batch_fill': round(avg_batch / self.max_batch_size, 4),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000
+            }
@@ -0,0 +1,158 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+
+class JobQueueFull(Exception):
+    """Raised when the ingestion queue has no room for another job"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once cancellation has been requested"""
+
+
+class IngestJob:
+    """State and progress of one background PDF ingestion"""
+
+    def __init__(self, filepath: str, collection: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.filepath = filepath
+        self.filename = os.path.basename(filepath)
+        self.collection = collection
+        self.status = 'queued'  # queued -> running -> completed | failed | cancelled
+        self.pages_total = 0
+        self.pages_parsed = 0
+        self.chunks_total = 0
+        self.chunks_embedded = 0
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('completed', 'failed', 'cancelled')
+
+    def update_progress(self, stage: str, done: int, total: int) -> None:
+        """Progress callback passed to RAGEngine.add_pdf; also the cancellation point"""
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+        if stage == 'pages':
+            self.pages_parsed, self.pages_total = done, total
+        elif stage == 'chunks':
+            self.chunks_embedded, self.chunks_total = done, total
+
+    def to_dict(self) -> dict:
+        elapsed = None
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            'job_id': self.id,
+            'filename': self.filename,
+            'collection': self.collection,
+            'status': self.status,
+            'pages_parsed': self.pages_parsed,
+            'pages_total': self.pages_total,
+            'chunks_embedded': self.chunks_embedded,
+            'chunks_total': self.chunks_total,
+            'elapsed_seconds': round(elapsed, 3) if elapsed is not None else None,
+            'pages_per_second': round(self.pages_parsed / elapsed, 2) if elapsed else None,
+            'chunks_per_second': round(self.chunks_embedded / elapsed, 2) if elapsed else None,
+            'result': self.result,
+            'error': self.error
+        }
+
+
+class IngestJobManager:
+    """Runs RAGEngine.add_pdf on a bounded worker pool.
+
+    At most max_workers jobs run at once and at most max_queue jobs may be
+    waiting; submit() raises JobQueueFull beyond that so callers can shed load.
+    Finished jobs are kept for status queries until max_history is exceeded.
+    rag may also be a callable returning a context manager that yields the
+    engine, such as CollectionManager.lease: it is called with the job's
+    collection (if it was submitted with one) when the job runs, and held until
+    the job finishes, so the engine cannot be unloaded mid-job.
+    on_finish, if given, is called with every job as it finishes (in any
+    status), e.g. to record its timings.
+    """
+
+    def __init__(self, rag, max_workers: int = 2, max_queue: int = 8, max_history: int = 100,
+                 on_finish: Optional[Callable[[IngestJob], None]] = None):
+        self.rag = rag
+        self.on_finish = on_finish
+        self.max_queue = max_queue
+        self.max_history = max_history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ingest')
+        self._jobs: Dict[str, IngestJob] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, filepath: str, collection: Optional[str] = None) -> IngestJob:
+        """Queue a PDF for ingestion into a collection and return its job immediately"""
+        with self._lock:
+            queued = sum(1 for job in self._jobs.values() if job.status == 'queued')
+            if queued >= self.max_queue:
+                raise JobQueueFull(f"Ingestion queue is full ({queued} jobs waiting)")
+
+            job = IngestJob(filepath, collection)
+            self._jobs[job.id] = job
+            self._prune()
+            job.future = self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[IngestJob]:
+        """Request cancellation; queued jobs never start, running jobs stop at the next page or batch"""
+        job = self.get(job_id)
+        if job and not job.finished:
+            job.cancel_event.set()
+            if job.future.cancel():
+                self._finish(job, 'cancelled')
+        return job
+
+    def _run(self, job: IngestJob) -> None:
+        if job.cancel_event.is_set():
+            self._finish(job, 'cancelled')
+            return
+
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            if callable(self.rag):
+                with (self.rag(job.collection) if job.collection else self.rag()) as rag:
+                    job.result = rag.add_pdf(job.filepath, progress=job.update_progress)
+            else:
+                job.result = self.rag.add_pdf(job.filepath, progress=job.update_progress)
+            self._finish(job, 'completed')
+        except JobCancelled:
+            self._finish(job, 'cancelled')
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, 'failed')
+
+    def _finish(self, job: IngestJob, status: str) -> None:
+        job.finished_at = time.time()
+        job.status = status
+        if self.on_finish:
+            try:
+                self.on_finish(job)
+            except Exception as e:
+                print(f"Error in ingestion job callback: {str(e)}")
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_history)]:
+            del self._jobs[job_id]
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,169 @@
+import re
+from array import array
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from vector_index import top_k
+
+_TOKEN = re.compile(r'\w+(?:[-./:]\w+)*')
+_PART = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; identifiers such as ERR-4021 or v2.1.3 also yield their parts"""
+    tokens = []
+    for match in _TOKEN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(_PART.findall(token))
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Sequence[np.ndarray], k: int, rrf_k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """Fuse ranked id lists by summing 1 / (rrf_k + rank), returning the top k (ids, scores)"""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking.tolist(), 1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (rrf_k + rank)
+    ids = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+    scores = np.fromiter(fused.values(), dtype=np.float32, count=len(fused))
+    best = top_k(scores, k)
+    return ids[best], scores[best]
+
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring for keyword search over chunks.
+
+    Every term has a posting list of row ids and term frequencies in compact
+    typed arrays that grow in place, so add() only touches the new chunks'
+    terms and a query only scores rows that contain one of its terms. Row ids
+    follow insertion order and line up with VectorIndex and RAGEngine.documents;
+    remove() and compact() tombstone and drop rows the same way.
+
+    Removed rows still count towards document frequencies until compact().
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._terms: Dict[str, int] = {}  # Term -> posting list id
+        self._posting_rows: List[array] = []
+        self._posting_counts: List[array] = []  # Term frequency per posting, capped at 65535
+        self._lengths = array('i')  # Tokens per row
+        self._deleted = bytearray()
+        self._n_deleted = 0
+        self._live_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, texts: Sequence[str]) -> None:
+        for text in texts:
+            row = len(self._lengths)
+            counts = Counter(tokenize(text))
+            for term, count in counts.items():
+                term_id = self._terms.get(term)
+                if term_id is None:
+                    term_id = self._terms[term] = len(self._posting_rows)
+                    self._posting_rows.append(array('i'))
+                    self._posting_counts.append(array('H'))
+                self._posting_rows[term_id].append(row)
+                self._posting_counts[term_id].append(min(count, 65535))
+            length = sum(counts.values())
+            self._lengths.append(length)
+            self._live_length += length
+            self._deleted.append(0)
+
+    def remove(self, ids) -> None:
+        """Tombstone rows so they are never returned again (ids are not reused)"""
+        for row in np.atleast_1d(ids).tolist():
+            if not self._deleted[row]:
+                self._deleted[row] = 1
+                self._n_deleted += 1
+                self._live_length -= self._lengths[row]
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (ids, BM25 scores) of the k best live rows containing a query term, best first"""
+        term_ids = [self._terms[term] for term in dict.fromkeys(tokenize(query)) if term in self._terms]
+        if not term_ids or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        n_rows = len(self._lengths)
+        avg_length = self._live_length / max(n_rows - self._n_deleted, 1) or 1.0
+        lengths = np.frombuffer(self._lengths, dtype=np.intc)
+        scores = np.zeros(n_rows, dtype=np.float32)
+        for term_id in term_ids:
+            rows = np.frombuffer(self._posting_rows[term_id], dtype=np.intc)
+            counts = np.frombuffer(self._posting_counts[term_id], dtype=np.uint16).astype(np.float32)
+            idf = np.log(1 + (n_rows - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[rows] / avg_length)
+            # Rows appear once per posting list, so fancy-index accumulation is safe
+            scores[rows] += idf * counts * (self.k1 + 1) / (counts + norm)
+        if self._n_deleted:
+            scores[np.frombuffer(self._deleted, dtype=bool)] = 0
+
+        candidates = np.flatnonzero(scores)
+        best = candidates[top_k(scores[candidates], k)]
+        return best, scores[best]
+
+    def compact(self) -> np.ndarray:
+        """Drop removed rows and renumber the rest, returning old id -> new id (-1 if removed)"""
+        keep = ~np.frombuffer(self._deleted, dtype=bool)
+        remap = np.full(len(keep), -1, dtype=np.int64)
+        remap[keep] = np.arange(int(keep.sum()))
+        if not self._n_deleted:
+            return remap
+
+        terms, posting_rows, posting_counts = {}, [], []
+        for term, term_id in self._terms.items():
+            rows = remap[np.frombuffer(self._posting_rows[term_id], dtype=np.intc)]
+            live = rows >= 0
+            if not live.any():
+                continue
+            terms[term] = len(posting_rows)
+            posting_rows.append(array('i', rows[live].astype(np.intc).tobytes()))
+            counts = np.frombuffer(self._posting_counts[term_id], dtype=np.uint16)[live]
+            posting_counts.append(array('H', counts.tobytes()))
+        self._terms, self._posting_rows, self._posting_counts = terms, posting_rows, posting_counts
+        self._lengths = array('i', np.frombuffer(self._lengths, dtype=np.intc)[keep].tobytes())
+        self._deleted = bytearray(len(self._lengths))
+        self._n_deleted = 0
+        return remap
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Copy of the terms, posting lists and row lengths as flat arrays, for from_arrays().
+
+        Tombstones are not included: the caller removes those rows again after loading.
+        """
+        offsets = np.zeros(len(self._posting_rows) + 1, dtype=np.int64)
+        np.cumsum([len(rows) for rows in self._posting_rows], out=offsets[1:])
+        return {
+            'terms': np.frombuffer('\n'.join(self._terms).encode('utf-8'), dtype=np.uint8),  # In term id order
+            'offsets': offsets,
+            'rows': np.frombuffer(b''.join(self._posting_rows), dtype=np.intc),
+            'counts': np.frombuffer(b''.join(self._posting_counts), dtype=np.uint16),
+            'lengths': np.frombuffer(self._lengths.tobytes(), dtype=np.intc)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], k1: float = 1.5, b: float = 0.75) -> 'BM25Index':
+        """Rebuild an index from arrays() without tokenizing the texts again"""
+        index = cls(k1, b)
+        terms = bytes(arrays['terms']).decode('utf-8').split('\n') if len(arrays['terms']) else []
+        offsets = arrays['offsets'].tolist()
+        rows = arrays['rows'].astype(np.intc, copy=False)
+        counts = arrays['counts'].astype(np.uint16, copy=False)
+        index._terms = {term: term_id for term_id, term in enumerate(terms)}
+        index._posting_rows = [array('i', rows[start:end].tobytes()) for start, end in zip(offsets, offsets[1:])]
+        index._posting_counts = [array('H', counts[start:end].tobytes()) for start, end in zip(offsets, offsets[1:])]
+        index._lengths = array('i', arrays['lengths'].astype(np.intc).tobytes())
+        index._deleted = bytearray(len(index._lengths))
+        index._live_length = int(arrays['lengths'].sum())
+        return index
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the posting lists and row lengths (not the term dictionary)"""
+        postings = sum(rows.itemsize * len(rows) for rows in self._posting_rows)
+        postings += sum(counts.itemsize * len(counts) for counts in self._posting_counts)
+        return postings + self._lengths.itemsize * len(self._lengths) + len(self._deleted)
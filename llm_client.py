@@ -0,0 +1,156 @@
+import time
+import random
+import threading
+from typing import Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised without contacting the server while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Stops calling a failing server until reset_timeout has passed.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail fast. Once reset_timeout has elapsed a single trial call is let
+    through (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """End a call that says nothing about the server's health (e.g. the caller gave up)"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class LLMClient:
+    """Shared HTTP client for the LM Studio API.
+
+    Reuses keep-alive connections from a bounded pool, applies connect/read
+    timeouts to every call, retries transient failures with jittered
+    exponential backoff and trips a circuit breaker when the server keeps
+    failing, so a hung LM Studio cannot pin every Flask worker.
+
+    Idempotent requests are retried after any connection error or timeout. A
+    POST is retried only when the connection could not be established or the
+    server answered with a retryable status, never once the body may have been
+    sent (read timeouts, aborted connections), so a completion is never
+    generated twice. Every 5xx response counts as a circuit breaker failure.
+    """
+
+    RETRY_STATUSES = {502, 503, 504}
+
+    def __init__(self, pool_size: int = 10, connect_timeout: float = 3.05, read_timeout: float = 120.0,
+                 max_retries: int = 2, backoff: float = 0.5, max_backoff: float = 5.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def retry_delay(self, attempt: int) -> float:
+        # Full jitter keeps concurrent retries from hitting the server in lockstep
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _sleep_before_retry(self, attempt: int) -> None:
+        time.sleep(self.retry_delay(attempt))
+
+    @staticmethod
+    def _never_sent(error: Exception) -> bool:
+        """Whether a request failed while connecting, before any of it reached the server"""
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        # requests wraps urllib3's MaxRetryError, whose reason is e.g. NewConnectionError (refused, DNS)
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, ConnectTimeoutError)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open: {url} failed {self.breaker.failures} times in a row")
+
+        kwargs.setdefault('timeout', self.timeout)
+        idempotent = method.upper() in ('GET', 'HEAD', 'OPTIONS')
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                retryable = idempotent or self._never_sent(e)
+                if attempt < self.max_retries and retryable:
+                    self._sleep_before_retry(attempt)
+                    attempt += 1
+                    continue
+                self.breaker.record_failure()
+                raise
+            except Exception:
+                # Never leave a half-open trial call outstanding
+                self.breaker.record_failure()
+                raise
+
+            if response.status_code in self.RETRY_STATUSES:
+                if attempt < self.max_retries:
+                    response.close()
+                    self._sleep_before_retry(attempt)
+                    attempt += 1
+                    continue
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,123 @@
+import math
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Latency bucket upper bounds in seconds, from sub-millisecond index lookups to long completions
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Fixed-bucket histogram: observe() is one bisect and three additions"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot counts values above every bound
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """(upper bound, observations <= bound) pairs, ending with +Inf"""
+        total, result = 0, []
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics:
+    """Process-wide latency histograms, counters and gauges in the Prometheus text format.
+
+    Metrics are created on first use and identified by name plus labels, e.g.
+    observe('stage_seconds', 0.012, route='chat', stage='query_embed'). One lock
+    guards all updates; recording a sample costs a few microseconds, so the
+    instrumentation can stay on in production. render() returns the exposition
+    served by /metrics, with every name prefixed by prefix.
+    """
+
+    def __init__(self, prefix: str = 'wst', buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels: Dict[str, object]) -> LabelKey:
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    def describe(self, name: str, help_text: str) -> None:
+        """Set the HELP line shown for a metric"""
+        self._help[name] = help_text
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    @staticmethod
+    def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = key + (extra,) if extra else key
+        if not pairs:
+            return ''
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    @staticmethod
+    def _format_value(value: float) -> str:
+        if value == math.inf:
+            return '+Inf'
+        return repr(float(value)) if isinstance(value, float) else str(value)
+
+    def _header(self, lines: List[str], name: str, kind: str) -> str:
+        full_name = f'{self.prefix}_{name}'
+        if name in self._help:
+            lines.append(f'# HELP {full_name} {self._help[name]}')
+        lines.append(f'# TYPE {full_name} {kind}')
+        return full_name
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full_name = self._header(lines, name, 'counter')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{full_name}{self._format_labels(key)} {self._format_value(value)}')
+            for name, series in sorted(self._gauges.items()):
+                full_name = self._header(lines, name, 'gauge')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{full_name}{self._format_labels(key)} {self._format_value(value)}')
+            for name, series in sorted(self._histograms.items()):
+                full_name = self._header(lines, name, 'histogram')
+                for key, histogram in sorted(series.items()):
+                    for bound, count in histogram.cumulative():
+                        bucket_label = ('le', self._format_value(bound))
+                        lines.append(f'{full_name}_bucket{self._format_labels(key, bucket_label)} {count}')
+                    lines.append(f'{full_name}_sum{self._format_labels(key)} {self._format_value(histogram.sum)}')
+                    lines.append(f'{full_name}_count{self._format_labels(key)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,102 @@
+import time
+import threading
+from typing import Callable, Optional
+
+
+class ModelInfoCache:
+    """Process-wide cache of the loaded model's metadata.
+
+    The first get() fetches synchronously; after that a daemon thread
+    refreshes the entry every refresh_interval seconds, so page loads are
+    served from memory. A refresh that reports a different model id replaces
+    the entry immediately, and an entry older than ttl (e.g. after failed
+    refreshes) is refetched on the next get().
+    """
+
+    def __init__(self, fetch: Callable[[], dict], ttl: float = 300.0, refresh_interval: float = 60.0):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.model_changes = 0
+        self.last_error: Optional[str] = None
+        self._info: Optional[dict] = None
+        self._fetched_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def age(self) -> Optional[float]:
+        return None if self._fetched_at is None else time.monotonic() - self._fetched_at
+
+    def get(self) -> dict:
+        """Return the cached model info, fetching it only when missing or expired"""
+        self._start_refresher()
+        with self._lock:
+            if self._info is not None and self.age < self.ttl:
+                self.hits += 1
+                return self._info
+            self.misses += 1
+        return self.refresh()
+
+    def refresh(self) -> dict:
+        """Fetch model info now; concurrent callers share one fetch"""
+        with self._fetch_lock:
+            with self._lock:
+                # Another thread may have refreshed while we waited
+                if self._info is not None and self.age < min(self.ttl, 1.0):
+                    return self._info
+            try:
+                info = self.fetch()
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+            with self._lock:
+                if self._info is not None and self._info.get('model_name') != info.get('model_name'):
+                    self.model_changes += 1
+                self._info = info
+                self._fetched_at = time.monotonic()
+                self.refreshes += 1
+                self.last_error = None
+            return info
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._info = None
+            self._fetched_at = None
+
+    def _start_refresher(self) -> None:
+        if self._refresher is None and self.refresh_interval:
+            with self._lock:
+                if self._refresher is None:
+                    self._refresher = threading.Thread(target=self._refresh_loop, name='model-info-refresh',
+                                                       daemon=True)
+                    self._refresher.start()
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception:
+                pass  # Keep serving the last good entry; last_error records the failure
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        age = self.age
+        return {
+            'model_name': self._info.get('model_name') if self._info else None,
+            'age_seconds': round(age, 1) if age is not None else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'refreshes': self.refreshes,
+            'model_changes': self.model_changes,
+            'last_error': self.last_error
+        }
@@ -0,0 +1,58 @@
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple
+from pypdf import PdfReader
+
+# Long-lived extraction pools by worker count. Workers are spawned rather than forked: the
+# server already runs torch, Flask and embedding-service threads, and forking a process with
+# running threads can deadlock the child on a lock some other thread held.
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers,
+                                                         mp_context=multiprocessing.get_context('spawn'))
+        return pool
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) (runs in a worker process)"""
+    reader = PdfReader(pdf_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def extract_pages(pdf_path: str, workers: int = 1, pages_per_shard: int = 16) -> Tuple[int, Iterator[str]]:
+    """Return the page count and an iterator over page texts in page order.
+
+    With workers > 1, documents of at least two shards are split into page
+    ranges that are extracted in a process pool (started on first use and
+    kept for later documents). Pages are yielded as soon as
+    their shard (and every shard before it) is done, so callers can start
+    chunking before the whole document has been parsed.
+    """
+    reader = PdfReader(pdf_path)
+    page_count = len(reader.pages)
+
+    if workers <= 1 or page_count < 2 * pages_per_shard:
+        return page_count, (page.extract_text() or "" for page in reader.pages)
+
+    def iter_sharded() -> Iterator[str]:
+        pool = _get_pool(workers)
+        futures = [
+            pool.submit(_extract_page_range, pdf_path, start, min(start + pages_per_shard, page_count))
+            for start in range(0, page_count, pages_per_shard)
+        ]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            # Stop outstanding shards if the consumer gives up early
+            for future in futures:
+                future.cancel()
+
+    return page_count, iter_sharded()
@@ -0,0 +1,148 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+DEFAULT_COLLECTION = 'default'
+COLLECTION_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+
+class CollectionNotFound(Exception):
+    """Raised when a collection that does not exist is requested without creating it"""
+
+
+class InvalidCollectionName(ValueError):
+    """Raised for names that are not 1-64 letters, digits, '-' or '_' (and so not safe paths)"""
+
+
+class CollectionManager:
+    """Named knowledge bases, each a RAGEngine with its own storage directory.
+
+    The default collection lives in root_dir itself, so an existing knowledge
+    base becomes the default collection; every other one lives in
+    root_dir/collections/<name>. Engines are created by create_engine(storage_dir,
+    encoder) on first use. The default engine is the encoder of all the others,
+    so the model is loaded once and queries keep sharing one embedding service.
+
+    At most max_loaded collections stay in memory: the least recently used
+    ones, and any unused for idle_unload seconds, are unloaded. Their embeddings
+    are already memory-mapped from disk, so unloading drops the documents and
+    search indexes, and the next request reloads them. Collections that are
+    leased (see lease()), ingesting or compacting are never unloaded.
+    """
+
+    def __init__(self, create_engine: Callable, root_dir: str, max_loaded: int = 8,
+                 idle_unload: Optional[float] = 900):
+        self.create_engine = create_engine
+        self.root_dir = root_dir
+        self.max_loaded = max(max_loaded, 1)
+        self.idle_unload = idle_unload
+        self.loads = 0
+        self.unloads = 0
+        self._engines: 'OrderedDict[str, object]' = OrderedDict()  # Least recently used first
+        self._last_used: Dict[str, float] = {}
+        self._leases: Dict[str, int] = {}  # Open lease() blocks per collection
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def check_name(name: str) -> str:
+        if not isinstance(name, str) or not COLLECTION_NAME.match(name):
+            raise InvalidCollectionName(f"Invalid collection name: {name!r}")
+        return name
+
+    def storage_dir(self, name: str) -> str:
+        if name == DEFAULT_COLLECTION:
+            return self.root_dir
+        return os.path.join(self.root_dir, 'collections', name)
+
+    def exists(self, name: str) -> bool:
+        return name == DEFAULT_COLLECTION or name in self._engines or os.path.isdir(self.storage_dir(name))
+
+    def names(self) -> List[str]:
+        """All collections, loaded or on disk"""
+        names = {DEFAULT_COLLECTION, *self._engines}
+        collections_dir = os.path.join(self.root_dir, 'collections')
+        if os.path.isdir(collections_dir):
+            names.update(name for name in os.listdir(collections_dir) if COLLECTION_NAME.match(name))
+        return sorted(names)
+
+    def get(self, name: str = DEFAULT_COLLECTION, create: bool = False):
+        """Return a collection's engine, loading it (or creating it if create is set) on first use"""
+        name = self.check_name(name)
+        with self._lock:
+            engine = self._engines.get(name)
+            if engine is None:
+                if not create and not self.exists(name):
+                    raise CollectionNotFound(f"Collection not found: {name}")
+                encoder = None if name == DEFAULT_COLLECTION else self.get(DEFAULT_COLLECTION)
+                engine = self.create_engine(self.storage_dir(name), encoder)
+                self._engines[name] = engine
+                self.loads += 1
+            self._engines.move_to_end(name)
+            self._last_used[name] = time.monotonic()
+            self._unload_idle(keep=name)
+            return engine
+
+    @contextmanager
+    def lease(self, name: str = DEFAULT_COLLECTION, create: bool = False) -> Iterator[object]:
+        """get() the engine and keep the collection loaded until the with block exits.
+
+        Writers hold a lease from before they first touch the engine, so it cannot
+        be unloaded in between and a second engine opened on the same store.
+        """
+        with self._lock:
+            engine = self.get(name, create)
+            self._leases[name] = self._leases.get(name, 0) + 1
+        try:
+            yield engine
+        finally:
+            with self._lock:
+                self._leases[name] -= 1
+                if not self._leases[name]:
+                    del self._leases[name]
+                self._last_used[name] = time.monotonic()
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._engines
+
+    def unload(self, name: str) -> bool:
+        """Drop a loaded collection from memory unless it is leased or busy; the default one stays"""
+        with self._lock:
+            engine = self._engines.get(name)
+            if engine is None or name == DEFAULT_COLLECTION or name in self._leases or engine.busy:
+                return False
+            del self._engines[name]
+            del self._last_used[name]
+            self.unloads += 1
+            return True
+
+    def _unload_idle(self, keep: Optional[str] = None) -> None:
+        now = time.monotonic()
+        for name in list(self._engines):
+            if name == keep:
+                continue
+            idle = self.idle_unload is not None and now - self._last_used[name] > self.idle_unload
+            if idle or len(self._engines) > self.max_loaded:
+                self.unload(name)
+
+    def stats(self) -> dict:
+        """Memory use of every loaded collection and load/unload counters"""
+        with self._lock:
+            self._unload_idle()
+            engines = dict(self._engines)
+            now = time.monotonic()
+            idle = {name: round(now - last_used, 1) for name, last_used in self._last_used.items()}
+        collections = {
+            name: {**engine.memory_usage(), 'idle_seconds': idle[name]}
+            for name, engine in engines.items()
+        }
+        return {
+            'loaded': len(collections),
+            'max_loaded': self.max_loaded,
+            'loads': self.loads,
+            'unloads': self.unloads,
+            'collections': collections
+        }
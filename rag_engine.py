@@ -1,61 +1,607 @@
 import os
-from typing import List, Tuple, Dict
+import time
+import hashlib
+import threading
+from array import array
+from contextlib import contextmanager
+from itertools import compress
+from typing import Iterator, List, Tuple, Dict, Optional, Callable
 import numpy as np
-from transformers import AutoTokenizer, AutoModel
-import torch
-from sklearn.metrics.pairwise import cosine_similarity
-from pypdf import PdfReader
+from pdf_extract import extract_pages
+from text_chunker import ChunkLengthStats, chunk_tokens
 from datetime import datetime
+from vector_store import VectorStore
+from vector_index import create_index, normalize_rows
+from embedding_buffer import EmbeddingBuffer
+from keyword_index import BM25Index, reciprocal_rank_fusion
+from ttl_cache import TTLCache
+from context_packer import ContextPacker, mmr_order
+from embedding_service import EmbeddingService
+from embedding_backends import EMBEDDING_BACKENDS, create_embedding_backend
+
+# Progress callback: (stage, done, total) with stage 'pages' or 'chunks'.
+# Raising from the callback aborts ingestion before the knowledge base changes.
+ProgressCallback = Callable[[str, int, int], None]
+
+# 'dense' embedding search, 'keyword' BM25 search (no model call) or 'hybrid' rank fusion of both
+SEARCH_MODES = ('dense', 'keyword', 'hybrid')
 
 class RAGEngine:
-    def __init__(self, model_name: str = 'sentence-transformers/all-MiniLM-L6-v2'):
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModel.from_pretrained(model_name)
+    # Longest input the encoder embeds; longer texts are truncated
+    MAX_SEQUENCE_TOKENS = 512
+    # BM25 postings saved next to the store, so loading does not tokenize every chunk again
+    KEYWORD_INDEX_FILE = 'keyword_index.npz'
+
+    def __init__(self, model_name: str = 'sentence-transformers/all-MiniLM-L6-v2',
+                 embedding_batch_size: int = 32, storage_dir: Optional[str] = None,
+                 storage_dtype: str = 'float32', index_backend: str = 'exact',
+                 index_options: Optional[dict] = None, extract_workers: int = 1,
+                 query_cache_size: int = 1024, query_cache_ttl: Optional[float] = 3600,
+                 query_batch_size: int = 32, query_batch_wait: float = 0.005,
+                 torch_threads: Optional[int] = None, embedding_backend: str = 'torch',
+                 embedding_backend_options: Optional[dict] = None, compact_ratio: float = 0.25,
+                 search_mode: str = 'hybrid', rrf_k: int = 60, chunk_size: int = 256,
+                 chunk_overlap: int = 32, encoder: Optional['RAGEngine'] = None):
+        if embedding_backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {embedding_backend}")
+        self.search_mode = self._check_search_mode(search_mode)
+        self.rrf_k = rrf_k  # Reciprocal rank fusion constant; larger values flatten the rank weights
+        # The model is loaded on first use (see _load_model) so the knowledge base is available immediately
+        self.model_name = model_name
+        self.embedding_backend = embedding_backend  # 'torch' (fp32), or int8 / ONNX Runtime variants
+        self.embedding_backend_options = embedding_backend_options or {}
+        self.torch_threads = torch_threads
+        self._tokenizer = None
+        self._model = None
+        self._backend = None
+        self._model_lock = threading.Lock()
+        # Engine whose model, query cache and embedding service are shared (its model settings apply),
+        # so several knowledge bases load the model once
+        self._encoder = encoder
+        self.embedding_batch_size = embedding_batch_size
+        # PDF chunking in tokens, so chunks are never truncated by the encoder
+        self.chunk_size = self._check_chunk_size(chunk_size)
+        self.chunk_overlap = chunk_overlap
+        self.chunk_stats = ChunkLengthStats(self.MAX_SEQUENCE_TOKENS)  # Token counts of ingested PDF chunks
+        self.extract_workers = extract_workers  # Processes used to extract text from large PDFs
+        if encoder is not None:
+            self.query_cache = encoder.query_cache
+            self.embedding_service = encoder.embedding_service
+        else:
+            self.query_cache = TTLCache(maxsize=query_cache_size, ttl=query_cache_ttl)  # Normalized query -> embedding
+            # Query embeddings from concurrent requests are micro-batched on one worker thread
+            self.embedding_service = EmbeddingService(self._get_embeddings, max_batch_size=query_batch_size,
+                                                      max_wait=query_batch_wait)
         self.documents: List[str] = []
+        self.chunk_hashes: List[str] = []  # Content hash of each chunk, parallel to documents
+        # Compact per-chunk source location, parallel to documents (-1 / 0 when not from a file)
+        self.chunk_file_ids = array('i')
+        self.chunk_pages = array('i')
+        self.chunk_offsets = array('i')
+        self.file_names: List[str] = []  # File id -> filename
+        self._file_ids: Dict[str, int] = {}
         self.embeddings = None
+        self._embedding_buffer = EmbeddingBuffer()  # Backs self.embeddings when there is no store
+        index_options = dict(index_options or {})
+        compact_index = index_options.get('precision', 'float32') != 'float32'
         self.processed_files: Dict[str, dict] = {}  # Track processed files and their metadata
+        self.retired_ranges: List[List[int]] = []  # [start, end) chunk ranges excluded from queries
+        # Bumped whenever the searchable chunks change, for caches keyed on the corpus; persisted
+        # with the store, so a reloaded knowledge base never reuses an earlier version's number
+        self.generation = 0
+        # Retired fraction of all chunks at which they are dropped by a background compaction
+        self.compact_ratio = compact_ratio
+        self._compaction: Optional[threading.Thread] = None
+        self._writers = 0  # add_pdf / add_texts calls in progress
+        self._lock = threading.RLock()  # Guards the knowledge base; embedding runs outside it
+        self._compact_lock = threading.Lock()  # One compaction at a time
+        self._keyword_save_lock = threading.Lock()
+        self._keyword_saved_rows = 0  # Rows in the last saved keyword index
+        self.context_packer = ContextPacker(self.count_tokens)
+
+        # Reload the knowledge base from disk instead of re-embedding uploads
+        self.store = VectorStore(storage_dir, dtype=storage_dtype) if storage_dir else None
+        if self.store:
+            self.embeddings, chunks, metadata = self.store.load()
+            self.documents = [chunk['text'] for chunk in chunks]
+            self.chunk_hashes = [chunk['hash'] for chunk in chunks]
+            for chunk in chunks:
+                self.chunk_file_ids.append(self._file_id(chunk.get('file')))
+                self.chunk_pages.append(chunk.get('page', 0))
+                self.chunk_offsets.append(chunk.get('offset', 0))
+            self.processed_files = metadata.get('processed_files', {})
+            self.retired_ranges = metadata.get('retired_ranges', [])
+            self.generation = metadata.get('generation', 0)
+
+        # Without a store a compact index holds the only copy of the rows (see _vectors)
+        self._buffered = not self.store and not compact_index
+
+        # Similarity search backend ('exact' or approximate 'ivf')
+        if compact_index:
+            if self.store:
+                # Re-score the compact index's best candidates against the full-precision rows
+                index_options.setdefault('rescore_source', lambda ids: self.embeddings[ids])
+        else:
+            # Score the stored (or buffered) unit-length rows in place rather than keeping a copy
+            index_options.setdefault('row_source', lambda: self.embeddings)
+        self.index = create_index(index_backend, **index_options)
+        if self.embeddings is not None:
+            self.index.add(self.embeddings)
+        # Keyword search over the same rows, for identifiers and codes that embeddings blur;
+        # only chunks added since the saved postings are tokenized
+        self.keyword_index = self._load_keyword_index()
+        self._keyword_saved_rows = len(self.keyword_index)
+        self.keyword_index.add(self.documents[len(self.keyword_index):])
+        for start, end in self.retired_ranges:
+            self.index.remove(np.arange(start, end))
+            self.keyword_index.remove(np.arange(start, end))
+
+        # Live chunk hash -> row, so unchanged chunks can reuse their embedding
+        self._hash_rows: Dict[str, int] = {}
+        retired = self._retired_mask()
+        for row, chunk_hash in enumerate(self.chunk_hashes):
+            if not retired[row]:
+                self._hash_rows.setdefault(chunk_hash, row)
+        self._save_keyword_index()
+
+    def _load_keyword_index(self) -> BM25Index:
+        """The saved BM25 postings if they cover a prefix of the store's current rows, else an empty index"""
+        path = os.path.join(self.store.directory, self.KEYWORD_INDEX_FILE) if self.store else None
+        if path and os.path.exists(path):
+            try:
+                with np.load(path) as arrays:
+                    # Rows keep their ids until a compaction starts a new store generation
+                    if int(arrays['generation']) == self.store.generation and \
+                            len(arrays['lengths']) <= len(self.documents):
+                        return BM25Index.from_arrays(arrays)
+            except Exception as e:
+                print(f"Error loading the keyword index, rebuilding it: {str(e)}")
+        return BM25Index()
+
+    def _save_keyword_index(self, force: bool = False) -> None:
+        """Save the BM25 postings next to the store once they have doubled since the last save.
+
+        Doubling keeps the cost amortized O(1) per chunk; compaction renumbers the
+        rows and forces a save. The arrays are copied under the lock and written
+        outside it.
+        """
+        if not self.store or not self._keyword_save_lock.acquire(blocking=force):
+            return
+        try:
+            with self._lock:
+                rows = len(self.keyword_index)
+                if not rows or (not force and rows < 2 * self._keyword_saved_rows):
+                    return
+                arrays = self.keyword_index.arrays()
+                generation = self.store.generation
+            path = os.path.join(self.store.directory, self.KEYWORD_INDEX_FILE)
+            with open(path + '.tmp', 'wb') as f:
+                np.savez(f, generation=generation, **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + '.tmp', path)
+            self._keyword_saved_rows = rows
+        except OSError as e:
+            print(f"Error saving the keyword index: {str(e)}")
+        finally:
+            self._keyword_save_lock.release()
+
+    def _load_model(self) -> None:
+        """Import torch/transformers and load the tokenizer, model and backend, once"""
+        with self._model_lock:
+            if self._backend is not None:
+                return
+            if self._encoder is not None:
+                self._tokenizer, self._model = self._encoder.tokenizer, self._encoder.model
+                self._backend = self._encoder.backend
+                return
+            import torch
+            from transformers import AutoTokenizer, AutoModel
+
+            if self.torch_threads:
+                torch.set_num_threads(self.torch_threads)
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            model = AutoModel.from_pretrained(self.model_name)
+            backend = create_embedding_backend(self.embedding_backend, model, tokenizer, self.model_name,
+                                               **self.embedding_backend_options)
+            self._tokenizer, self._model = tokenizer, model
+            self._backend = backend  # Set last: other threads check it without the lock
+
+    @property
+    def model_loaded(self) -> bool:
+        if self._encoder is not None:
+            return self._encoder.model_loaded
+        return self._backend is not None
+
+    @property
+    def tokenizer(self):
+        if self._backend is None:
+            self._load_model()
+        return self._tokenizer
+
+    @property
+    def model(self):
+        if self._backend is None:
+            self._load_model()
+        return self._model
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._load_model()
+        return self._backend
+
+    def warm_up(self) -> None:
+        """Load the model and run one forward pass so the first request does not pay for it"""
+        self._get_embeddings(["warm up"])
 
     def _get_embedding(self, text: str) -> np.ndarray:
-        # Tokenize and get model output
-        inputs = self.tokenizer(text, padding=True, truncation=True, return_tensors="pt", max_length=512)
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-        
-        # Use mean pooling to get text embedding
-        attention_mask = inputs['attention_mask']
-        token_embeddings = outputs.last_hidden_state
-        input_mask_expanded = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
-        sentence_embedding = torch.sum(token_embeddings * input_mask_expanded, 1) / torch.clamp(input_mask_expanded.sum(1), min=1e-9)
-        
-        return sentence_embedding.numpy()
+        return self._get_embeddings([text])
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Count tokens per text with the fast tokenizer (no special tokens)"""
+        if not texts:
+            return []
+        return [len(ids) for ids in self.tokenizer(texts, add_special_tokens=False)['input_ids']]
+
+    def token_offsets(self, text: str) -> List[Tuple[int, int]]:
+        """Character span of each token in the text (no special tokens)"""
+        return self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)['offset_mapping']
+
+    def _query_cache_key(self, query: str) -> str:
+        key = " ".join(query.split())
+        if getattr(self.tokenizer, 'do_lower_case', False):
+            # Uncased models embed "Foo" and "foo" identically
+            key = key.lower()
+        return key
+
+    def _get_query_embedding(self, query: str) -> np.ndarray:
+        """Embed a query, reusing the cached vector for repeated questions"""
+        key = self._query_cache_key(query)
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            embedding = self.embedding_service.embed(query).reshape(1, -1)
+            self.query_cache.set(key, embedding)
+        return embedding
 
-    def add_pdf(self, pdf_path: str, chunk_size: int = 200) -> None:
-        """Add a PDF document to the knowledge base"""
+    def _get_query_embeddings(self, queries: List[str]) -> np.ndarray:
+        """Embed queries as one (n, dim) matrix; the uncached ones are queued together to share forward passes"""
+        keys = [self._query_cache_key(query) for query in queries]
+        embeddings: Dict[str, np.ndarray] = {}
+        pending = {}
+        for key, query in zip(keys, queries):
+            if key in embeddings or key in pending:
+                continue
+            embedding = self.query_cache.get(key)
+            if embedding is None:
+                pending[key] = self.embedding_service.submit(query)
+            else:
+                embeddings[key] = embedding
+        for key, future in pending.items():
+            embeddings[key] = future.result().reshape(1, -1)
+            self.query_cache.set(key, embeddings[key])
+        return np.concatenate([embeddings[key] for key in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+
+    def _get_embeddings(self, texts: List[str], batch_size: Optional[int] = None,
+                        progress: Optional[ProgressCallback] = None) -> np.ndarray:
+        """Embed texts in length-sorted batches, returned unit-length and in input order"""
+        batch_size = batch_size or self.embedding_batch_size
+        embeddings = np.empty((len(texts), self.model.config.hidden_size), dtype=np.float32)
+        if not texts:
+            return embeddings
+
+        import torch
+
+        # Tokenize once, then sort by token count so each batch pads to a similar length
+        encodings = self.tokenizer(texts, truncation=True, max_length=self.MAX_SEQUENCE_TOKENS)
+        order = np.argsort([len(ids) for ids in encodings['input_ids']], kind='stable')
+
+        with torch.inference_mode():
+            for start in range(0, len(texts), batch_size):
+                batch_indices = order[start:start + batch_size]
+                inputs = self.tokenizer.pad(
+                    [{key: encodings[key][i] for key in encodings.keys()} for i in batch_indices],
+                    return_tensors="pt"
+                )
+                token_embeddings = self.backend(inputs)
+
+                # Use mean pooling to get text embedding
+                attention_mask = inputs['attention_mask']
+                input_mask_expanded = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
+                sentence_embeddings = torch.sum(token_embeddings * input_mask_expanded, 1) / torch.clamp(input_mask_expanded.sum(1), min=1e-9)
+
+                # Normalize once here so similarity search is a plain dot product
+                sentence_embeddings = torch.nn.functional.normalize(sentence_embeddings, p=2, dim=1)
+                embeddings[batch_indices] = sentence_embeddings.numpy()
+                if progress:
+                    progress('chunks', min(start + batch_size, len(texts)), len(texts))
+
+        return embeddings
+
+    @staticmethod
+    def _hash_text(text: str) -> str:
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _retired_mask(self) -> np.ndarray:
+        mask = np.zeros(len(self.documents), dtype=bool)
+        for start, end in self.retired_ranges:
+            mask[start:end] = True
+        return mask
+
+    def _retire(self, start: int, end: int) -> None:
+        """Exclude a chunk range from queries and embedding reuse"""
+        if start >= end:
+            return
+        self.retired_ranges.append([start, end])
+        self.generation += 1
+        self.index.remove(np.arange(start, end))
+        self.keyword_index.remove(np.arange(start, end))
+        lost = {self.chunk_hashes[row] for row in range(start, end)
+                if self._hash_rows.get(self.chunk_hashes[row]) == row}
+        for chunk_hash in lost:
+            del self._hash_rows[chunk_hash]
+        if lost:
+            # A live chunk with the same text elsewhere keeps its embedding reusable
+            retired = self._retired_mask()
+            for row, chunk_hash in enumerate(self.chunk_hashes):
+                if chunk_hash in lost and not retired[row]:
+                    self._hash_rows.setdefault(chunk_hash, row)
+
+    def _schedule_compaction(self) -> None:
+        """Start a background compaction once enough chunks are retired (call with the lock held)"""
+        retired = sum(end - start for start, end in self.retired_ranges)
+        if not retired or retired < self.compact_ratio * len(self.documents):
+            return
+        if self._compaction is None or not self._compaction.is_alive():
+            self._compaction = threading.Thread(target=self._compact_in_background, name='rag-compaction',
+                                                daemon=True)
+            self._compaction.start()
+
+    def _compact_in_background(self) -> None:
         try:
-            reader = PdfReader(pdf_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + " "
+            self.compact()
+        except Exception as e:
+            print(f"Error compacting the knowledge base: {str(e)}")
+
+    # Compaction attempts that copy the store outside the lock before holding writers off
+    COMPACT_ATTEMPTS = 3
+
+    def compact(self) -> int:
+        """Drop retired chunks from the embeddings, documents and index, renumbering the rest.
+
+        The store's live rows are copied without holding the lock, so queries and
+        uploads continue meanwhile; the rows appended during the copy, the
+        manifest switch and the remapping of file start indices then happen in
+        one critical section, so queries and file metadata never see a
+        half-compacted knowledge base. If chunks are retired during the copy it
+        is redone, and after COMPACT_ATTEMPTS the copy holds the lock too.
+        Returns the number of chunks dropped.
+        """
+        with self._compact_lock:
+            for _ in range(self.COMPACT_ATTEMPTS - 1):
+                dropped = self._compact()
+                if dropped is not None:
+                    break
+            else:
+                with self._lock:
+                    dropped = self._compact()
+        if dropped:
+            self._save_keyword_index(force=True)
+        return dropped
+
+    def _compact(self) -> Optional[int]:
+        """One compaction attempt; None if chunks were retired while the store was copied"""
+        with self._lock:
+            keep = ~self._retired_mask()
+            if keep.all():
+                return 0
+            retired = len(self.retired_ranges)
+        copy = self.store.begin_compaction(keep) if self.store else None
+
+        with self._lock:
+            if len(self.retired_ranges) != retired:
+                if copy:
+                    self.store.abort_compaction(copy)
+                return None
+            # Chunks appended during the copy are live and follow the copied ones
+            keep = ~self._retired_mask()
+            dropped = len(keep) - int(np.count_nonzero(keep))
+            # New row of old row i is the number of live rows before it (also right for empty files)
+            live_before = np.concatenate([[0], np.cumsum(keep)])
+            processed_files = {
+                filename: {**metadata, 'start_index': int(live_before[metadata['start_index']])}
+                for filename, metadata in self.processed_files.items()
+            }
+
+            # Switch the store first, so a failure leaves the engine unchanged
+            if self.store:
+                self.store.finish_compaction(copy, {**self._metadata(), 'processed_files': processed_files,
+                                                    'retired_ranges': []})
+                self.embeddings = self.store.open_embeddings()
+            elif self._buffered:
+                self._embedding_buffer.delete(np.flatnonzero(~keep))
+                self._embedding_buffer.compact()
+                self.embeddings = self._embedding_buffer.data
+            self.index.compact()
+            self.keyword_index.compact()
+
+            self.documents = list(compress(self.documents, keep))
+            self.chunk_hashes = list(compress(self.chunk_hashes, keep))
+            self.chunk_file_ids = array('i', compress(self.chunk_file_ids, keep))
+            self.chunk_pages = array('i', compress(self.chunk_pages, keep))
+            self.chunk_offsets = array('i', compress(self.chunk_offsets, keep))
+            self.processed_files = processed_files
+            self.retired_ranges = []
+            self._hash_rows = {chunk_hash: int(live_before[row]) for chunk_hash, row in self._hash_rows.items()}
+            return dropped
+
+    def _file_id(self, filename: Optional[str]) -> int:
+        if filename is None:
+            return -1
+        if filename not in self._file_ids:
+            self._file_ids[filename] = len(self.file_names)
+            self.file_names.append(filename)
+        return self._file_ids[filename]
+
+    def _metadata(self) -> dict:
+        return {
+            'processed_files': self.processed_files,
+            'retired_ranges': self.retired_ranges,
+            'generation': self.generation
+        }
+
+    @classmethod
+    def _check_chunk_size(cls, chunk_size: int) -> int:
+        # Leave room for the [CLS] and [SEP] tokens; chunk_tokens needs the overlap (at most a
+        # quarter of the size) below half the size, which holds from 2 tokens up
+        if not 2 <= chunk_size <= cls.MAX_SEQUENCE_TOKENS - 2:
+            raise ValueError(f"chunk_size must be between 2 and {cls.MAX_SEQUENCE_TOKENS - 2} tokens")
+        return chunk_size
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        with self._lock:
+            self._writers += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._writers -= 1
+
+    @property
+    def busy(self) -> bool:
+        """Whether documents are being added or a compaction is running"""
+        return self._writers > 0 or (self._compaction is not None and self._compaction.is_alive())
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate bytes held by this knowledge base.
+
+        embeddings counts the in-memory matrix; with a store the rows are
+        memory-mapped instead and reported as mapped (paged in on demand).
+        """
+        with self._lock:
+            mapped = isinstance(self.embeddings, np.memmap)
+            embeddings = self.embeddings.nbytes if self.embeddings is not None else 0
+            return {
+                'chunks': len(self.documents),
+                'embeddings': 0 if mapped else self._embedding_buffer.nbytes,
+                'mapped': embeddings if mapped else 0,
+                'index': self.index.memory_bytes(),
+                'keyword_index': self.keyword_index.memory_bytes(),
+                'text': sum(len(document) for document in self.documents)
+            }
+
+    def add_pdf(self, pdf_path: str, chunk_size: Optional[int] = None,
+                progress: Optional[ProgressCallback] = None) -> dict:
+        """Add a PDF document to the knowledge base.
+
+        The text is split into chunks of up to chunk_size tokens (default: the
+        engine's chunk_size) that end at paragraph or sentence boundaries where
+        possible. The result reports the chunks' token length statistics.
+
+        Identical files (by content hash) are skipped. When a file with the same
+        name was processed before, only chunks whose text changed are embedded,
+        and the previous version's chunks are retired. The result's timings hold
+        the seconds spent hashing, parsing (extraction and chunking), embedding
+        and storing.
+        """
+        with self._writing():
+            return self._add_pdf(pdf_path, chunk_size, progress)
+
+    def _add_pdf(self, pdf_path: str, chunk_size: Optional[int], progress: Optional[ProgressCallback]) -> dict:
+        try:
+            timings = {}
+            start = time.perf_counter()
+            filename = os.path.basename(pdf_path)
+            file_hash = self._hash_file(pdf_path)
+            timings['hash'] = time.perf_counter() - start
+            with self._lock:
+                # Content already stored under this name is unchanged, and under another name a
+                # duplicate; new content for a known name replaces its previous version below
+                # even if another file holds the same content
+                previous = self.processed_files.get(filename)
+                if previous is not None:
+                    matches = [filename] if previous.get('file_hash') == file_hash else []
+                else:
+                    matches = [name for name, metadata in self.processed_files.items()
+                               if metadata.get('file_hash') == file_hash]
+                if matches:
+                    metadata = self.processed_files[matches[0]]
+                    return {
+                        'filename': filename,
+                        'status': 'unchanged' if matches[0] == filename else 'duplicate',
+                        'duplicate_of': matches[0],
+                        'chunks': metadata['chunks'],
+                        'pages': metadata['pages'],
+                        'embedded': 0,
+                        'reused': 0,
+                        'retired': 0
+                    }
+
+            start = time.perf_counter()
+            page_count, page_texts = extract_pages(pdf_path, workers=self.extract_workers)
             
-            # Simple text chunking by words
-            words = text.split()
-            chunks = [" ".join(words[i:i + chunk_size]) 
-                     for i in range(0, len(words), chunk_size)]
+            def tracked_pages():
+                for page_number, page_text in enumerate(page_texts, 1):
+                    yield page_text
+                    if progress:
+                        progress('pages', page_number, page_count)
             
-            # Store file metadata
-            filename = os.path.basename(pdf_path)
-            self.processed_files[filename] = {
-                'chunks': len(chunks),
-                'pages': len(reader.pages),
-                'processed_at': datetime.now().isoformat(),
-                'start_index': len(self.documents)
-            }
+            # Token-aware chunking, streamed page by page; small chunk sizes get a proportionally small overlap
+            chunk_size = self._check_chunk_size(chunk_size or self.chunk_size)
+            overlap = min(self.chunk_overlap, chunk_size // 4)
+            chunks = list(chunk_tokens(tracked_pages(), self.token_offsets, chunk_size, overlap))
+            positions = [(chunk.page, chunk.offset) for chunk in chunks]
+            file_stats = ChunkLengthStats(self.MAX_SEQUENCE_TOKENS)
+            file_stats.add(chunk.tokens for chunk in chunks)
+            chunks = [chunk.text for chunk in chunks]
+            timings['parse'] = time.perf_counter() - start
             
-            self.add_texts(chunks)
+            previous_versions = []
+
+            def store_file_metadata(start_index: int) -> None:
+                # Runs under the lock right after the append, so compaction cannot renumber
+                # the new chunks before start_index is recorded
+                previous = self.processed_files.get(filename)
+                previous_versions.append(previous)
+                self.processed_files[filename] = {
+                    'chunks': len(chunks),
+                    'pages': page_count,
+                    'processed_at': datetime.now().isoformat(),
+                    'start_index': start_index,
+                    'file_hash': file_hash,
+                    'chunk_tokens': file_stats.stats()
+                }
+                self.chunk_stats.counts += file_stats.counts
+
+                # Retire the previous version after its unchanged chunks were reused
+                if previous:
+                    self._retire(previous['start_index'], previous['start_index'] + previous['chunks'])
+                    self._schedule_compaction()
+                if self.store:
+                    self.store.commit(self._metadata())
+
+            _, counts = self._add_chunks(chunks, progress, filename, positions, on_append=store_file_metadata,
+                                         timings=timings)
+            previous = previous_versions[0]
             return {
                 'filename': filename,
+                'status': 'updated' if previous else 'added',
                 'chunks': len(chunks),
-                'pages': len(reader.pages)
+                'pages': page_count,
+                'embedded': counts['embedded'],
+                'reused': counts['reused'],
+                'retired': previous['chunks'] if previous else 0,
+                'chunk_tokens': file_stats.stats(),
+                'timings': {stage: round(seconds, 4) for stage, seconds in timings.items()}
             }
         except Exception as e:
             print(f"Error processing PDF {pdf_path}: {str(e)}")
@@ -63,65 +609,214 @@ class RAGEngine:
 
     def get_processed_files(self) -> List[Dict]:
         """Get list of processed files and their metadata"""
-        return [
-            {
-                'filename': filename,
-                **metadata
-            }
-            for filename, metadata in self.processed_files.items()
-        ]
+        with self._lock:
+            return [
+                {
+                    'filename': filename,
+                    **metadata
+                }
+                for filename, metadata in self.processed_files.items()
+            ]
 
-    def add_texts(self, texts: List[str]) -> None:
-        """Add text documents to the knowledge base"""
-        if not texts:
-            return
+    def delete_file(self, filename: str) -> Optional[Dict]:
+        """Remove a processed file from the knowledge base.
 
-        # Create embeddings for new documents
-        new_embeddings = []
-        for text in texts:
-            embedding = self._get_embedding(text)
-            new_embeddings.append(embedding)
-        
-        new_embeddings = np.vstack(new_embeddings)
+        Its chunks are excluded from queries immediately and dropped from memory
+        and disk by a background compaction. Returns the removed file's
+        metadata, or None if no such file was processed.
+        """
+        with self._lock:
+            metadata = self.processed_files.pop(filename, None)
+            if metadata is None:
+                return None
+            self._retire(metadata['start_index'], metadata['start_index'] + metadata['chunks'])
+            if self.store:
+                self.store.commit(self._metadata())
+            self._schedule_compaction()
+        return {'filename': filename, **metadata}
+
+    def add_texts(self, texts: List[str], progress: Optional[ProgressCallback] = None) -> Dict[str, int]:
+        """Add text documents to the knowledge base.
+
+        Chunks whose text is already stored reuse the existing embedding.
+        Returns how many chunks were embedded and how many were reused.
+        """
+        with self._writing():
+            return self._add_chunks(texts, progress)[1]
+
+    def _add_chunks(self, texts: List[str], progress: Optional[ProgressCallback] = None,
+                    filename: Optional[str] = None,
+                    positions: Optional[List[Tuple[int, int]]] = None,
+                    on_append: Optional[Callable[[int], None]] = None,
+                    timings: Optional[Dict[str, float]] = None) -> Tuple[int, Dict[str, int]]:
+        """Embed and append chunks, returning the index of the first new chunk and the counts.
+
+        on_append is called with that index while the lock is still held. If
+        timings is given, the seconds spent embedding and storing are stored in it.
+        """
+        timings = {} if timings is None else timings
+        hashes = [self._hash_text(text) for text in texts]
+        with self._lock:
+            if not texts:
+                if on_append:
+                    on_append(len(self.documents))
+                return len(self.documents), {'embedded': 0, 'reused': 0}
+            reused = {}
+            for i, chunk_hash in enumerate(hashes):
+                row = self._hash_rows.get(chunk_hash)
+                if row is not None:
+                    reused[i] = self._vectors([row])[0]
+        to_embed = [i for i in range(len(texts)) if i not in reused]
+
+        # Create embeddings for new documents in batches, without holding the lock
+        embed_start = time.perf_counter()
+        new_embeddings = np.empty((len(texts), self.model.config.hidden_size), dtype=np.float32)
+        new_embeddings[to_embed] = self._get_embeddings([texts[i] for i in to_embed], progress=progress)
+        for i, embedding in reused.items():
+            new_embeddings[i] = embedding
+        timings['embed'] = time.perf_counter() - embed_start
         
+        with self._lock:
+            store_start = time.perf_counter()
+            start = len(self.documents)
+            # Point reused hashes at the new rows, which outlive the previous version they came from
+            for offset, chunk_hash in enumerate(hashes):
+                self._hash_rows[chunk_hash] = start + offset
+            self._append(new_embeddings, texts, hashes, filename, positions or [(0, 0)] * len(texts))
+            if on_append:
+                on_append(start)
+            timings['store'] = time.perf_counter() - store_start
+        self._save_keyword_index()
+        return start, {'embedded': len(to_embed), 'reused': len(reused)}
+
+    def _append(self, new_embeddings: np.ndarray, texts: List[str], hashes: List[str],
+                filename: Optional[str], positions: List[Tuple[int, int]]) -> None:
+        self.generation += 1
         # Update embeddings
-        if self.embeddings is None:
-            self.embeddings = new_embeddings
-        else:
-            self.embeddings = np.vstack([self.embeddings, new_embeddings])
+        if self.store:
+            # Append to disk and remap the whole matrix instead of copying it in memory
+            self.store.append(new_embeddings, [
+                {'text': text, 'hash': chunk_hash, 'file': filename, 'page': page, 'offset': offset}
+                for text, chunk_hash, (page, offset) in zip(texts, hashes, positions)
+            ])
+            self.store.commit(self._metadata())
+            self.embeddings = self.store.open_embeddings()
+        elif self._buffered:
+            # Grow the in-memory matrix in place rather than copying it on every upload
+            self._embedding_buffer.append(new_embeddings)
+            self.embeddings = self._embedding_buffer.data
         
+        self.index.add(new_embeddings)
+        self.keyword_index.add(texts)
         self.documents.extend(texts)
+        self.chunk_hashes.extend(hashes)
+        file_id = self._file_id(filename)
+        self.chunk_file_ids.extend([file_id] * len(texts))
+        self.chunk_pages.extend(page for page, _ in positions)
+        self.chunk_offsets.extend(offset for _, offset in positions)
+
+    @staticmethod
+    def _check_search_mode(mode: str) -> str:
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        return mode
 
-    def query(self, query: str, k: int = 3) -> List[Tuple[str, float]]:
-        """Query the knowledge base and return relevant documents"""
-        if not self.documents or self.embeddings is None:
+    def query(self, query: str, k: int = 3, mode: Optional[str] = None) -> List[Dict]:
+        """Query the knowledge base and return relevant documents.
+
+        mode overrides the engine's search_mode ('dense', 'keyword' or 'hybrid').
+        Keyword search needs no query embedding, so it never runs the model.
+        """
+        mode = self._check_search_mode(mode or self.search_mode)
+        if not self.documents:
             return []
 
-        # Create query embedding
-        query_embedding = self._get_embedding(query)
-        
-        # Calculate similarities
-        similarities = cosine_similarity(query_embedding, self.embeddings)[0]
-        
-        # Get top k documents
-        top_k_indices = np.argsort(similarities)[-k:][::-1]
-        
-        # Return relevant documents and their similarities
+        # Create query embedding (cached and already unit length)
+        query_embedding = None if mode == 'keyword' else self._get_query_embedding(query)
+
+        with self._lock:
+            indices, scores = self._search(query, query_embedding, k, mode)
+            similarities = scores if mode == 'dense' else None
+            if mode == 'hybrid' and len(indices):
+                similarities = self._vectors(indices) @ query_embedding.ravel()
+            return self._results(indices, scores, similarities)
+
+    def query_batch(self, queries: List[str], k: int = 3, mode: Optional[str] = None) -> List[List[Dict]]:
+        """query() for many queries at once, returning one result list per query.
+
+        The queries are embedded in shared forward passes and scored against the
+        index with one matrix-matrix product and a row-wise top k, instead of a
+        matrix-vector product per query. BM25 still runs once per query.
+        """
+        mode = self._check_search_mode(mode or self.search_mode)
+        if not queries:
+            return []
+        if not self.documents:
+            return [[] for _ in queries]
+
+        query_embeddings = None if mode == 'keyword' else self._get_query_embeddings(queries)
+
+        with self._lock:
+            if mode == 'keyword':
+                hits = [self.keyword_index.search(query, k) for query in queries]
+            elif mode == 'dense':
+                hits = self.index.search_batch(query_embeddings, k)
+            else:
+                fetch = max(2 * k, 20)
+                dense_hits = self.index.search_batch(query_embeddings, fetch)
+                hits = []
+                for query, (dense_ids, _) in zip(queries, dense_hits):
+                    keyword_ids, _ = self.keyword_index.search(query, fetch)
+                    hits.append(reciprocal_rank_fusion([dense_ids, keyword_ids], k, self.rrf_k))
+
+            similarities = [scores if mode == 'dense' else None for _, scores in hits]
+            if mode == 'hybrid':
+                # One gather from the embedding store for every query's fused hits
+                vectors = self._vectors(np.concatenate([ids for ids, _ in hits]))
+                ends = np.cumsum([len(ids) for ids, _ in hits])
+                similarities = [block @ query_embedding for block, query_embedding
+                                in zip(np.split(vectors, ends[:-1]), query_embeddings)]
+            return [self._results(indices, scores, similarity)
+                    for (indices, scores), similarity in zip(hits, similarities)]
+
+    def _search(self, query: str, query_embedding: Optional[np.ndarray], k: int,
+                mode: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Row ids and ranking scores of the k best chunks, best first (call with the lock held)"""
+        if mode == 'keyword':
+            return self.keyword_index.search(query, k)
+        if mode == 'dense':
+            return self.index.search(query_embedding, k)
+        # Fuse ranks rather than scores: cosine similarities and BM25 scores are on different scales
+        fetch = max(2 * k, 20)
+        dense_ids, _ = self.index.search(query_embedding, fetch)
+        keyword_ids, _ = self.keyword_index.search(query, fetch)
+        return reciprocal_rank_fusion([dense_ids, keyword_ids], k, self.rrf_k)
+
+    def _vectors(self, ids) -> np.ndarray:
+        """Unit-length float32 embeddings of the given rows (call with the lock held)"""
+        if self.embeddings is None:  # No store and a compact index: decode its rows
+            return normalize_rows(self.index.vectors(np.asarray(ids, dtype=np.int64)))
+        return normalize_rows(self.embeddings[ids])
+
+    def _results(self, indices: np.ndarray, scores: np.ndarray,
+                 similarities: Optional[np.ndarray] = None) -> List[Dict]:
+        """Build result dicts for search hits (call with the lock held).
+
+        score ranks the hits (cosine similarity, BM25 or fused RRF score, by
+        search mode); similarity is the cosine similarity, None in keyword mode.
+        """
         results = []
-        for idx in top_k_indices:
-            # Find which file this chunk belongs to
-            file_info = None
-            for filename, metadata in self.processed_files.items():
-                if metadata['start_index'] <= idx < metadata['start_index'] + metadata['chunks']:
-                    file_info = filename
-                    break
-            
+        for i, (idx, score) in enumerate(zip(indices, scores)):
+            # Look up which file and page this chunk came from
+            file_id = self.chunk_file_ids[idx]
             results.append({
                 'content': self.documents[idx],
-                'similarity': float(similarities[idx]),
-                'file': file_info
+                'similarity': float(similarities[i]) if similarities is not None else None,
+                'score': float(score),
+                'file': self.file_names[file_id] if file_id >= 0 else None,
+                'page': self.chunk_pages[idx] or None,
+                'offset': self.chunk_offsets[idx]
             })
-        
         return results
 
     def get_context_for_query(self, query: str, k: int = 3) -> str:
@@ -131,8 +826,46 @@ class RAGEngine:
             return ""
         
         # Combine relevant documents into context
-        context_parts = []
-        for i, result in enumerate(results):
-            context_parts.append(f"[From {result['file']}] Document {i+1}:\n{result['content']}")
-        
-        return "\n\n".join(context_parts)
+        return "\n\n".join(ContextPacker.format_entry(result, i + 1, result['content'])
+                           for i, result in enumerate(results))
+
+    def get_packed_context(self, query: str, budget: int, k: int = 3, fetch_k: Optional[int] = None,
+                           mmr_lambda: float = 0.7, duplicate_threshold: float = 0.95,
+                           mode: Optional[str] = None, timings: Optional[Dict[str, float]] = None) -> Dict:
+        """Get up to k diverse chunks for a query that fit in a token budget.
+
+        Fetches fetch_k candidates, reorders them by MMR (dropping near-duplicates)
+        and packs them until the budget is used, trimming the last chunk at a
+        sentence boundary. Returns the context text with its token count.
+
+        If timings is given, the seconds spent in each stage are stored in it:
+        query_embed, similarity_search, chunk_lookup and context_build.
+        """
+        timings = {} if timings is None else timings
+        mode = self._check_search_mode(mode or self.search_mode)
+        empty = {'context': "", 'tokens': 0, 'chunks': 0, 'budget': budget}
+        if not self.documents or budget <= 0 or k <= 0:
+            return empty
+
+        start = time.perf_counter()
+        query_embedding = None if mode == 'keyword' else self._get_query_embedding(query)
+        timings['query_embed'] = time.perf_counter() - start
+        with self._lock:
+            start = time.perf_counter()
+            indices, scores = self._search(query, query_embedding, fetch_k or max(2 * k, 10), mode)
+            timings['similarity_search'] = time.perf_counter() - start
+            if not len(indices):
+                return empty
+            start = time.perf_counter()
+            vectors = self._vectors(indices)
+            similarities = None if query_embedding is None else vectors @ query_embedding.ravel()
+            results = self._results(indices, scores, similarities)
+            timings['chunk_lookup'] = time.perf_counter() - start
+
+        # Rank by the search scores; in keyword and hybrid mode they are rescaled to [0, 1] for MMR
+        start = time.perf_counter()
+        relevance = None if mode == 'dense' else scores / scores.max()
+        order = mmr_order(query_embedding, vectors, mmr_lambda, duplicate_threshold, relevance)
+        packed = self.context_packer.pack([results[i] for i in order], budget, max_chunks=k)
+        timings['context_build'] = time.perf_counter() - start
+        return packed
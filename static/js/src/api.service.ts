@@ -1,4 +1,12 @@
-import { ModelInfo, ProcessedFile, ChatResponse, Config, ApiError } from './types';
+import {
+  ModelInfo,
+  ProcessedFile,
+  ChatResponse,
+  ChatStreamEvent,
+  Config,
+  IngestJob,
+  ApiError,
+} from './types';
 
 export class ApiService {
   private static instance: ApiService;
@@ -50,7 +58,15 @@ export class ApiService {
     return this.handleResponse<ProcessedFile[]>(response);
   }
 
-  public async uploadPdf(file: File): Promise<{ message: string }> {
+  public async deleteProcessedFile(filename: string): Promise<ProcessedFile> {
+    const response = await fetch(`/processed-files/${encodeURIComponent(filename)}`, {
+      method: 'DELETE',
+      headers: this.getHeaders(),
+    });
+    return this.handleResponse<ProcessedFile>(response);
+  }
+
+  public async uploadPdf(file: File): Promise<IngestJob> {
     const formData = new FormData();
     formData.append('file', file);
 
@@ -61,7 +77,22 @@ export class ApiService {
       },
       body: formData,
     });
-    return this.handleResponse<{ message: string }>(response);
+    return this.handleResponse<IngestJob>(response);
+  }
+
+  public async getJob(jobId: string): Promise<IngestJob> {
+    const response = await fetch(`/jobs/${jobId}`, {
+      headers: this.getHeaders(),
+    });
+    return this.handleResponse<IngestJob>(response);
+  }
+
+  public async cancelJob(jobId: string): Promise<IngestJob> {
+    const response = await fetch(`/jobs/${jobId}`, {
+      method: 'DELETE',
+      headers: this.getHeaders(),
+    });
+    return this.handleResponse<IngestJob>(response);
   }
 
   public async sendMessage(message: string): Promise<ChatResponse> {
@@ -73,6 +104,61 @@ export class ApiService {
     return this.handleResponse<ChatResponse>(response);
   }
 
+  public async streamMessage(
+    message: string,
+    onToken: (token: string) => void
+  ): Promise<ChatResponse> {
+    const response = await fetch('/chat/stream', {
+      method: 'POST',
+      headers: this.getHeaders(),
+      body: JSON.stringify({ message }),
+    });
+    if (!response.ok || !response.body) {
+      return this.handleResponse<ChatResponse>(response);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Server-sent events are separated by a blank line
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const event = this.parseStreamEvent(buffer.slice(0, boundary));
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+
+        if (event.event === 'token' && event.token) {
+          onToken(event.token);
+        } else if (event.event === 'done') {
+          return { response: event.response || '', usage: event.usage, cached: event.cached };
+        } else if (event.event === 'error') {
+          return { response: '', error: event.error || 'An error occurred' };
+        }
+      }
+    }
+
+    return { response: '', error: 'Stream ended unexpectedly' };
+  }
+
+  private parseStreamEvent(frame: string): ChatStreamEvent {
+    let event: ChatStreamEvent['event'] = 'token';
+    let data = '';
+    frame.split('\n').forEach((line) => {
+      if (line.startsWith('event:')) {
+        event = line.slice('event:'.length).trim() as ChatStreamEvent['event'];
+      } else if (line.startsWith('data:')) {
+        data += line.slice('data:'.length).trim();
+      }
+    });
+    return { event, ...(data ? JSON.parse(data) : {}) };
+  }
+
   public async saveConfig(config: Config): Promise<{ status: string }> {
     const response = await fetch('/save-config', {
       method: 'POST',
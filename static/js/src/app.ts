@@ -1,6 +1,6 @@
 import { ApiService } from './api.service.js';
 import { UiService } from './ui.service.js';
-import { Config } from './types.js';
+import { CacheResponses, Config } from './types.js';
 
 export class App {
   private static instance: App;
@@ -190,7 +190,21 @@ export class App {
     this.uiService.setLoading('upload', true);
 
     try {
-      await this.apiService.uploadPdf(file);
+      let job = await this.apiService.uploadPdf(file);
+
+      // Processing happens in the background; poll until the job finishes
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        job = await this.apiService.getJob(job.job_id);
+        console.log(
+          `Processing ${job.filename}: ${job.pages_parsed}/${job.pages_total} pages, ` +
+            `${job.chunks_embedded}/${job.chunks_total} chunks`
+        );
+      }
+
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Processing failed');
+      }
       await this.loadProcessedFiles();
     } catch (error) {
       console.error('Error uploading file:', error);
@@ -209,12 +223,23 @@ export class App {
     this.uiService.showTypingIndicator();
     this.uiService.setLoading('send', true);
 
+    let messageDiv = null as HTMLElement | null;
+
     try {
-      const response = await this.apiService.sendMessage(message);
+      const response = await this.apiService.streamMessage(message, (token) => {
+        if (!messageDiv) {
+          this.uiService.removeTypingIndicator();
+          messageDiv = this.uiService.startStreamingMessage();
+        }
+        this.uiService.appendStreamingToken(messageDiv, token);
+      });
       this.uiService.removeTypingIndicator();
 
       if (response.error) {
+        messageDiv?.remove();
         this.uiService.showError(response.error);
+      } else if (messageDiv) {
+        this.uiService.finishStreamingMessage(messageDiv, response.response);
       } else {
         this.uiService.addMessage(response.response, false);
       }
@@ -243,6 +268,8 @@ export class App {
         (document.getElementById('contextChunks') as HTMLInputElement).value
       ),
       system_prompt: (document.getElementById('systemPrompt') as HTMLTextAreaElement).value,
+      cache_responses: (document.getElementById('cacheResponses') as HTMLSelectElement).value as CacheResponses,
+      collection: (document.getElementById('collection') as HTMLInputElement).value.trim() || 'default',
     };
 
     try {
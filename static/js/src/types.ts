@@ -12,22 +12,61 @@ export interface ProcessedFile {
   processed_at: string;
 }
 
+export interface IngestJob {
+  job_id: string;
+  filename: string;
+  collection: string | null;
+  status: 'queued' | 'running' | 'completed' | 'failed' | 'cancelled';
+  pages_parsed: number;
+  pages_total: number;
+  chunks_embedded: number;
+  chunks_total: number;
+  elapsed_seconds: number | null;
+  pages_per_second: number | null;
+  chunks_per_second: number | null;
+  result: any;
+  error: string | null;
+}
+
 export interface ChatMessage {
   content: string;
   isUser: boolean;
 }
 
+export interface ContextUsage {
+  context_tokens: number;
+  context_budget: number;
+  context_chunks: number;
+  prompt_tokens: number;
+}
+
 export interface ChatResponse {
   response: string;
+  usage?: ContextUsage;
+  cached?: boolean;
   error?: string;
 }
 
+export interface ChatStreamEvent {
+  event: 'token' | 'done' | 'error';
+  token?: string;
+  response?: string;
+  usage?: ContextUsage;
+  cached?: boolean;
+  error?: string;
+}
+
+// 'auto' reuses answers only at temperature 0
+export type CacheResponses = 'auto' | 'true' | 'false' | boolean | null;
+
 export interface Config {
   temperature: number;
   max_tokens: number;
   top_p: number;
   context_chunks: number;
   system_prompt: string;
+  cache_responses?: CacheResponses;
+  collection?: string;
 }
 
 export interface ApiError {
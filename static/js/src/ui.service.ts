@@ -89,6 +89,31 @@ export class UiService {
     this.scrollToBottom();
   }
 
+  public startStreamingMessage(): HTMLElement {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = 'message assistant';
+    this.messagesContainer.appendChild(messageDiv);
+    this.scrollToBottom();
+    return messageDiv;
+  }
+
+  public appendStreamingToken(messageDiv: HTMLElement, token: string): void {
+    // Show raw text while streaming; the rendered HTML replaces it when done
+    messageDiv.textContent += token;
+    this.scrollToBottom();
+  }
+
+  public finishStreamingMessage(messageDiv: HTMLElement, content: string): void {
+    messageDiv.innerHTML = content;
+
+    // Highlight code blocks
+    messageDiv.querySelectorAll('pre code').forEach((block) => {
+      hljs.highlightElement(block as HTMLElement);
+    });
+
+    this.scrollToBottom();
+  }
+
   public showError(message: string): void {
     const errorDiv = document.createElement('div');
     errorDiv.className = 'message error';
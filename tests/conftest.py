@@ -1,8 +1,16 @@
 import pytest
 import os
+import shutil
 import tempfile
-from app import app as flask_app
+
+# Keep the persistent knowledge base out of the working tree during tests
+os.environ.setdefault('RAG_STORAGE_DIR', tempfile.mkdtemp())
+# Fail fast instead of backing off when LM Studio is not mocked
+os.environ.setdefault('LLM_MAX_RETRIES', '0')
+
+from app import app as flask_app, llm, model_info_cache, response_cache
 from rag_engine import RAGEngine
+from pdf_fixtures import write_text_pdf
 
 @pytest.fixture
 def app():
@@ -11,14 +19,14 @@ def app():
         'WTF_CSRF_ENABLED': False,  # Disable CSRF tokens in tests
         'UPLOAD_FOLDER': tempfile.mkdtemp()  # Use temporary directory for uploads
     })
+    llm.breaker.record_success()  # Start every test with a closed circuit
+    model_info_cache.invalidate()
+    response_cache.clear()  # Every test talks to its own mocked LM Studio
     
     yield flask_app
     
-    # Cleanup after tests
-    if os.path.exists(flask_app.config['UPLOAD_FOLDER']):
-        for file in os.listdir(flask_app.config['UPLOAD_FOLDER']):
-            os.remove(os.path.join(flask_app.config['UPLOAD_FOLDER'], file))
-        os.rmdir(flask_app.config['UPLOAD_FOLDER'])
+    # Cleanup after tests (named collections upload into subdirectories)
+    shutil.rmtree(flask_app.config['UPLOAD_FOLDER'], ignore_errors=True)
 
 @pytest.fixture
 def client(app):
@@ -31,3 +39,8 @@ def runner(app):
 @pytest.fixture
 def rag():
     return RAGEngine()
+
+@pytest.fixture
+def write_pdf():
+    """write_pdf(path, pages) writes a small text PDF with one page per string"""
+    return write_text_pdf
@@ -0,0 +1,29 @@
+"""Minimal PDF writer for tests and benchmarks (no PDF library needed)"""
+from typing import List
+
+
+def write_text_pdf(path: str, pages: List[str], words_per_line: int = 12) -> None:
+    """Write a minimal PDF with one page of Helvetica text per entry in pages"""
+    font_id = 3 + 2 * len(pages)
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects = ["<</Type/Catalog/Pages 2 0 R>>", f"<</Type/Pages/Kids[{kids}]/Count {len(pages)}>>"]
+    for i, text in enumerate(pages):
+        words = text.replace("(", "").replace(")", "").split()
+        lines = [" ".join(words[j:j + words_per_line]) for j in range(0, len(words), words_per_line)]
+        stream = "BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+        objects.append(f"<</Type/Page/MediaBox[0 0 612 842]/Parent 2 0 R"
+                       f"/Resources<</Font<</F1 {font_id} 0 R>>>>/Contents {4 + 2 * i} 0 R>>")
+        objects.append(f"<</Length {len(stream)}>>\nstream\n{stream}\nendstream")
+    objects.append("<</Type/Font/Subtype/Type1/BaseFont/Helvetica>>")
+
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    data += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    data += f"trailer<</Size {len(objects) + 1}/Root 1 0 R>>\nstartxref\n{xref}\n%%EOF".encode()
+    with open(path, "wb") as f:
+        f.write(data)
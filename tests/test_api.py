@@ -2,8 +2,24 @@ import pytest
 import json
 import os
 from werkzeug.datastructures import FileStorage
+import time
+import sys
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def wait_for_job(client, job_id, timeout=10):
+    """Poll a background ingestion job until it finishes"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = json.loads(client.get(f'/jobs/{job_id}').data)
+        if job['status'] in ('completed', 'failed', 'cancelled'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish")
+
 def test_home_page(client):
     """Test that the home page loads successfully"""
     response = client.get('/')
@@ -27,6 +43,25 @@ def test_model_info(client, requests_mock):
     assert 'model_name' in data
     assert 'context_window' in data
 
+def test_model_info_is_cached(client, requests_mock):
+    """Test that repeated page loads reuse cached model info and never probe a completion"""
+    requests_mock.get('http://127.0.0.1:1234/v1/models', json={'data': [{'id': 'mistral-7b'}]})
+    requests_mock.get('http://127.0.0.1:1234/v1/models/mistral-7b', json={'id': 'mistral-7b'})
+    completions = requests_mock.post('http://127.0.0.1:1234/v1/chat/completions', json={})
+    before = json.loads(client.get('/stats').data)['model_info_cache']
+    
+    for _ in range(3):
+        data = json.loads(client.get('/model-info').data)
+        assert data['model_name'] == 'mistral-7b'
+        assert data['context_window'] == 8192
+    assert requests_mock.call_count == 2
+    assert not completions.called
+    
+    stats = json.loads(client.get('/stats').data)['model_info_cache']
+    assert stats['hits'] - before['hits'] == 2
+    assert stats['misses'] - before['misses'] == 1
+    assert stats['age_seconds'] is not None
+
 def test_upload_no_file(client):
     """Test file upload with no file"""
     response = client.post('/upload')
@@ -74,9 +109,14 @@ startxref
     response = client.post('/upload', data={
         'file': (BytesIO(pdf_content), 'test.pdf')
     })
-    assert response.status_code == 200
+    assert response.status_code == 202
     data = json.loads(response.data)
     assert data['message'] == 'File uploaded successfully'
+    assert 'job_id' in data
+    
+    job = wait_for_job(client, data['job_id'])
+    assert job['status'] == 'completed'
+    assert job['pages_parsed'] == 1
 
 def test_chat_empty_message(client):
     """Test chat endpoint with empty message"""
@@ -105,6 +145,111 @@ def test_chat_valid_message(client, requests_mock):
     assert response.status_code == 200
     data = json.loads(response.data)
     assert 'response' in data
+    assert data['usage']['context_tokens'] <= data['usage']['context_budget']
+
+def test_chat_response_is_cached(client, requests_mock):
+    """Test that a repeated question is answered from the cache until the corpus changes"""
+    from app import get_rag
+    completion = requests_mock.post('http://127.0.0.1:1234/v1/chat/completions',
+                                    json={'choices': [{'message': {'content': 'Cached answer'}}]})
+    client.post('/save-config', json={'temperature': 0})
+    
+    first = json.loads(client.post('/chat', json={'message': 'What is the cache?'}).data)
+    second = json.loads(client.post('/chat', json={'message': '  What is the   cache? '}).data)
+    assert completion.call_count == 1
+    assert 'cached' not in first
+    assert second['cached'] is True
+    assert second['response'] == first['response']
+    assert json.loads(client.get('/stats').data)['response_cache']['hits'] == 1
+    
+    get_rag().add_texts(['a new chunk that changes the corpus'])
+    assert 'cached' not in json.loads(client.post('/chat', json={'message': 'What is the cache?'}).data)
+    assert completion.call_count == 2
+
+def test_chat_response_cache_opt_out(client, requests_mock):
+    """Test that sessions with cache_responses off always reach the LLM"""
+    completion = requests_mock.post('http://127.0.0.1:1234/v1/chat/completions',
+                                    json={'choices': [{'message': {'content': 'Fresh answer'}}]})
+    client.post('/save-config', json={'cache_responses': 'false', 'temperature': 0})
+    for _ in range(2):
+        assert 'cached' not in json.loads(client.post('/chat', json={'message': 'Surprise me'}).data)
+    assert completion.call_count == 2
+
+def test_sampled_chat_responses_are_cached_only_on_request(client, requests_mock):
+    """Test that answers at temperature > 0 are not reused unless caching is switched on"""
+    completion = requests_mock.post('http://127.0.0.1:1234/v1/chat/completions',
+                                    json={'choices': [{'message': {'content': 'Sampled answer'}}]})
+    client.post('/save-config', json={'temperature': 0.7})
+    for _ in range(2):
+        assert 'cached' not in json.loads(client.post('/chat', json={'message': 'Write a haiku'}).data)
+    assert completion.call_count == 2
+
+    client.post('/save-config', json={'cache_responses': 'true'})
+    client.post('/chat', json={'message': 'Write a haiku'})
+    assert json.loads(client.post('/chat', json={'message': 'Write a haiku'}).data)['cached'] is True
+    assert completion.call_count == 3
+
+def test_metrics_endpoint(client, requests_mock):
+    """Test that chat stage timings and request counts are exposed in the Prometheus format"""
+    from app import get_rag
+    get_rag().add_texts(['metrics are collected for every chat request'])
+    requests_mock.post('http://127.0.0.1:1234/v1/chat/completions',
+                       json={'choices': [{'message': {'content': 'Measured'}}]})
+    client.post('/chat', json={'message': 'Are metrics collected?'})
+    
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    for stage in ('query_embed', 'similarity_search', 'chunk_lookup', 'context_build',
+                  'llm_first_byte', 'llm_total', 'markdown_render', 'total'):
+        assert f'wst_stage_duration_seconds_count{{route="chat",stage="{stage}"}}' in text
+    assert 'wst_requests_total{method="POST",route="/chat",status="200"}' in text
+    assert 'wst_request_duration_seconds_bucket{method="POST",route="/chat",le="+Inf"}' in text
+    assert 'wst_cache_hit_ratio{cache="response"}' in text
+
+def test_collections_are_scoped_per_request_and_session(client, tmp_path, write_pdf):
+    """Test that uploads to a named collection stay out of the default one and unknown ones 404"""
+    pdf_path = str(tmp_path / 'team.pdf')
+    write_pdf(pdf_path, ['notes that only team a can search ' * 20])
+    with open(pdf_path, 'rb') as f:
+        data = json.loads(client.post('/upload', data={'file': (f, 'team.pdf'), 'collection': 'team-a'}).data)
+    job = wait_for_job(client, data['job_id'])
+    assert job['status'] == 'completed' and job['collection'] == 'team-a'
+    
+    default_files = json.loads(client.get('/processed-files').data)
+    team_files = json.loads(client.get('/processed-files?collection=team-a').data)
+    assert 'team.pdf' not in [file['filename'] for file in default_files]
+    assert [file['filename'] for file in team_files] == ['team.pdf']
+    
+    client.post('/save-config', json={'collection': 'team-a'})
+    collections = json.loads(client.get('/collections').data)
+    assert collections['current'] == 'team-a'
+    assert 'team-a' in collections['available']
+    assert collections['collections']['team-a']['chunks'] > 0
+    
+    assert client.post('/chat', json={'message': 'Hi', 'collection': 'missing'}).status_code == 404
+    assert client.post('/save-config', json={'collection': '../escape'}).status_code == 400
+
+def test_search_returns_ranked_chunks_without_the_llm(client, requests_mock):
+    """Test that /search ranks chunks for one or many queries and never calls LM Studio"""
+    from app import get_rag
+    get_rag().add_texts(['Fault ERR-4021 means the seal is worn.', 'Uploads run in the background.'])
+    llm = requests_mock.post('http://127.0.0.1:1234/v1/chat/completions', json={})
+    
+    response = client.post('/search', json={'query': 'what is ERR-4021', 'k': 1, 'mode': 'keyword'})
+    assert response.status_code == 200
+    results = json.loads(response.data)['results']
+    assert [result['content'] for result in results] == ['Fault ERR-4021 means the seal is worn.']
+    
+    batch = json.loads(client.post('/search', json={'queries': ['ERR-4021', 'uploads'], 'k': 2}).data)['results']
+    assert len(batch) == 2 and all(len(results) == 2 for results in batch)
+    assert not llm.called
+    
+    assert client.post('/search', json={}).status_code == 400
+    assert client.post('/search', json={'query': 'x', 'k': 0}).status_code == 400
+    assert client.post('/search', json={'query': 'x', 'mode': 'fuzzy'}).status_code == 400
+    assert client.post('/search', json={'query': 'x', 'collection': 'missing'}).status_code == 404
 
 def test_rate_limiting(client):
     """Test rate limiting"""
@@ -118,3 +263,96 @@ def test_rate_limiting(client):
     data = json.loads(response.data)
     assert 'error' in data
     assert data['error'] == 'Rate limit exceeded'
+
+def test_chat_stream(client, requests_mock):
+    """Test that the streaming chat endpoint forwards tokens as server-sent events"""
+    chunks = [
+        {'choices': [{'delta': {'role': 'assistant'}}]},
+        {'choices': [{'delta': {'content': 'Hello'}}]},
+        {'choices': [{'delta': {'content': ' **world**'}}]},
+    ]
+    body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+    requests_mock.post('http://127.0.0.1:1234/v1/chat/completions', text=body)
+    
+    response = client.post('/chat/stream', json={'message': 'Hello'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert requests_mock.last_request.json()['stream'] is True
+    
+    frames = response.get_data(as_text=True).strip().split("\n\n")
+    assert frames[0] == 'data: {"token": "Hello"}'
+    assert frames[1] == 'data: {"token": " **world**"}'
+    assert frames[2].startswith('event: done\n')
+    assert '<strong>world</strong>' in json.loads(frames[2].split('data: ', 1)[1])['response']
+
+def test_upload_same_pdf_twice_is_skipped(client):
+    """Test that re-uploading identical content reports it instead of re-embedding"""
+    pdf_content = b'''%PDF-1.4
+1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj
+2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj
+3 0 obj<</Type/Page/MediaBox[0 0 595 842]/Parent 2 0 R>>endobj
+xref
+0 4
+0000000000 65535 f
+0000000009 00000 n
+0000000052 00000 n
+0000000101 00000 n
+trailer<</Size 4/Root 1 0 R>>
+startxref
+167
+%%EOF'''
+    
+    results = []
+    for _ in range(2):
+        data = json.loads(client.post('/upload', data={'file': (BytesIO(pdf_content), 'dedupe.pdf')}).data)
+        results.append(wait_for_job(client, data['job_id'])['result'])
+    assert results[0]['status'] == 'added'
+    assert results[1]['status'] == 'unchanged'
+    assert results[1]['embedded'] == 0
+
+def test_unknown_job(client):
+    """Test job status for an unknown job id"""
+    response = client.get('/jobs/does-not-exist')
+    assert response.status_code == 404
+
+def test_stats(client):
+    """Test that cache statistics are reported"""
+    response = client.get('/stats')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert 'hit_rate' in data['query_embedding_cache']
+
+def test_import_does_not_load_the_model(tmp_path):
+    """Test that importing the app and listing files does not import torch or load model weights"""
+    script = (
+        "import sys, app\n"
+        "assert app.app.test_client().get('/processed-files').status_code == 200\n"
+        "print('torch' in sys.modules, 'transformers' in sys.modules, app.get_rag().model_loaded)\n"
+    )
+    env = dict(os.environ, RAG_STORAGE_DIR=str(tmp_path / 'store'), PYTHONPATH=ROOT_DIR)
+    result = subprocess.run([sys.executable, '-c', script], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ['False', 'False', 'False']
+
+def test_get_rag_creates_one_engine(app):
+    """Test that concurrent first calls share a single engine"""
+    from app import get_rag
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        engines = list(pool.map(lambda _: get_rag(), range(8)))
+    assert all(engine is engines[0] for engine in engines)
+
+def test_delete_processed_file(client, tmp_path, write_pdf):
+    """Test that a processed file can be deleted once, then reports not found"""
+    pdf_path = str(tmp_path / 'delete_me.pdf')
+    write_pdf(pdf_path, ['a file that will be deleted ' * 20])
+    with open(pdf_path, 'rb') as f:
+        data = json.loads(client.post('/upload', data={'file': (f, 'delete_me.pdf')}).data)
+    assert wait_for_job(client, data['job_id'])['status'] == 'completed'
+
+    response = client.delete('/processed-files/delete_me.pdf')
+    assert response.status_code == 200
+    assert json.loads(response.data)['filename'] == 'delete_me.pdf'
+    files = json.loads(client.get('/processed-files').data)
+    assert 'delete_me.pdf' not in [file['filename'] for file in files]
+    assert client.delete('/processed-files/delete_me.pdf').status_code == 404
@@ -0,0 +1,139 @@
+import json
+import time
+import asyncio
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('a2wsgi')
+httpx = pytest.importorskip('httpx')
+from starlette.testclient import TestClient
+import asgi_app
+
+
+@pytest.fixture
+def lm_studio(app, monkeypatch):
+    """Route the async LM Studio client to a scripted in-process handler"""
+    requests_seen = []
+    replies = {}
+
+    def handler(request):
+        requests_seen.append(json.loads(request.content))
+        return replies['chat']
+
+    client = asgi_app.AsyncLLMClient(asgi_app.llm, transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(asgi_app, 'llm_async', client)
+    return requests_seen, replies
+
+
+@pytest.fixture
+def asgi_client(app):
+    return TestClient(asgi_app.app)
+
+
+def test_async_chat(asgi_client, lm_studio):
+    """Test that the async chat route returns rendered Markdown and context usage"""
+    requests_seen, replies = lm_studio
+    replies['chat'] = httpx.Response(200, json={'choices': [{'message': {'content': '**Hi**'}}]})
+
+    response = asgi_client.post('/chat', json={'message': 'Hello'})
+    assert response.status_code == 200
+    data = response.json()
+    assert '<strong>Hi</strong>' in data['response']
+    assert 'context_tokens' in data['usage']
+    assert requests_seen[0]['messages'][1] == {'role': 'user', 'content': 'Hello'}
+
+
+def test_async_chat_uses_response_cache(asgi_client, lm_studio):
+    """Test that the async routes share the Flask app's response cache"""
+    requests_seen, replies = lm_studio
+    replies['chat'] = httpx.Response(200, json={'choices': [{'message': {'content': 'Once'}}]})
+    asgi_client.post('/save-config', json={'temperature': 0})
+
+    asgi_client.post('/chat', json={'message': 'Cache me'})
+    frames = asgi_client.post('/chat/stream', json={'message': 'Cache me'}).text.strip().split("\n\n")
+    assert len(requests_seen) == 1
+    assert frames[0].startswith('event: done\n')
+    assert json.loads(frames[0].split('data: ', 1)[1])['cached'] is True
+
+
+def test_async_chat_stream(asgi_client, lm_studio):
+    """Test that the async streaming route emits the same frames as the Flask route"""
+    _, replies = lm_studio
+    body = "".join(f"data: {json.dumps({'choices': [{'delta': {'content': token}}]})}\n\n"
+                   for token in ['Hello', ' world']) + "data: [DONE]\n\n"
+    replies['chat'] = httpx.Response(200, text=body)
+
+    response = asgi_client.post('/chat/stream', json={'message': 'Hello'})
+    frames = response.text.strip().split("\n\n")
+    assert frames[0] == 'data: {"token": "Hello"}'
+    assert frames[1] == 'data: {"token": " world"}'
+    assert frames[2].startswith('event: done\n')
+
+
+def test_async_chat_reports_llm_failure(asgi_client, lm_studio):
+    """Test that an LM Studio error maps to 503 like the Flask route"""
+    _, replies = lm_studio
+    replies['chat'] = httpx.Response(500)
+    response = asgi_client.post('/chat', json={'message': 'Hello'})
+    assert response.status_code == 503
+
+
+def test_async_routes_require_csrf_token(app, asgi_client):
+    """Test that the native routes enforce CSRF like the Flask app"""
+    app.config['WTF_CSRF_ENABLED'] = True
+    try:
+        response = asgi_client.post('/chat', json={'message': 'Hello'})
+    finally:
+        app.config['WTF_CSRF_ENABLED'] = False
+    assert response.status_code == 400
+
+
+def test_async_upload_and_flask_fallback(asgi_client, tmp_path, write_pdf):
+    """Test that uploads are queued natively and job polling falls through to Flask"""
+    path = tmp_path / 'async.pdf'
+    write_pdf(str(path), ['served through the asgi upload route'])
+    with open(path, 'rb') as f:
+        response = asgi_client.post('/upload', files={'file': ('async.pdf', f, 'application/pdf')})
+    assert response.status_code == 202
+    job_id = response.json()['job_id']
+
+    exported = asgi_client.get('/metrics').text
+    assert 'wst_stage_duration_seconds_count{route="upload",stage="save"}' in exported
+    assert 'wst_stage_duration_seconds_count{route="upload",stage="total"}' in exported
+    assert 'wst_requests_total{method="POST",route="/upload",status="202"}' in exported
+    assert 'wst_request_duration_seconds_count{method="POST",route="/upload"}' in exported
+
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        job = asgi_client.get(f'/jobs/{job_id}').json()
+        if job['status'] not in ('queued', 'running'):
+            break
+        time.sleep(0.05)
+    assert job['status'] == 'completed'
+
+
+def test_cancelled_requests_do_not_trip_the_breaker(app):
+    """Test that clients disconnecting mid-request neither count as failures nor hold the trial slot"""
+    async def hang(request):
+        await asyncio.sleep(10)
+
+    async def cancel_requests(client, n):
+        for _ in range(n):
+            task = asyncio.ensure_future(client.post('http://lm-studio/v1/chat/completions', json={}))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        await client.aclose()
+
+    breaker = asgi_app.llm.breaker
+    client = asgi_app.AsyncLLMClient(asgi_app.llm, transport=httpx.MockTransport(hang))
+    asyncio.run(cancel_requests(client, breaker.failure_threshold + 1))
+    assert breaker.state == 'closed' and breaker.failures == 0
+
+    # A cancelled half-open trial lets the next call through
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout
+    client = asgi_app.AsyncLLMClient(asgi_app.llm, transport=httpx.MockTransport(hang))
+    asyncio.run(cancel_requests(client, 1))
+    assert breaker.allow()
+    breaker.record_success()
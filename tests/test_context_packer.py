@@ -0,0 +1,43 @@
+import numpy as np
+from context_packer import ContextPacker, mmr_order
+
+
+def count_words(texts):
+    return [len(text.split()) for text in texts]
+
+
+def test_mmr_drops_near_duplicates():
+    """Test that near-duplicate candidates are dropped and diverse ones kept"""
+    query = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+    vectors = np.array([
+        [0.9, 0.436, 0.0],
+        [0.9, 0.436, 0.0],    # Same as the first
+        [0.8, 0.0, 0.6],
+    ], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    assert mmr_order(query, vectors) == [0, 2]
+
+
+def test_pack_respects_budget_and_trims_at_sentence_boundary():
+    """Test that chunks are added whole while they fit and the next one is cut after a sentence"""
+    packer = ContextPacker(count_words, min_trim_tokens=5)
+    results = [
+        {'content': 'one two three four five six', 'file': 'a.pdf', 'page': 1},
+        {'content': 'First sentence here. Second sentence is much longer than the budget allows.',
+         'file': 'b.pdf', 'page': None},
+    ]
+    packed = packer.pack(results, budget=20, max_chunks=3)
+    assert packed['chunks'] == 2
+    assert packed['tokens'] <= 20
+    assert packed['tokens'] == sum(count_words([packed['context']]))
+    assert packed['context'].endswith('First sentence here.')
+    assert '[From a.pdf, page 1] Document 1:' in packed['context']
+
+
+def test_pack_stops_at_max_chunks():
+    """Test that no more than max_chunks are packed even with budget to spare"""
+    packer = ContextPacker(count_words)
+    results = [{'content': f'chunk {i}', 'file': 'a.pdf', 'page': i + 1} for i in range(5)]
+    packed = packer.pack(results, budget=1000, max_chunks=2)
+    assert packed['chunks'] == 2
+    assert 'chunk 2' not in packed['context']
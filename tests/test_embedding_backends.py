@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from rag_engine import RAGEngine
+
+TEXTS = [
+    'The vector store keeps embeddings in a memory-mapped file.',
+    'Uploads are processed by a background worker pool.',
+    'short',
+    'A much longer passage about caching, batching and quantization ' * 8,
+]
+
+
+@pytest.fixture(scope='module')
+def reference():
+    return RAGEngine()._get_embeddings(TEXTS, batch_size=2)
+
+
+@pytest.mark.parametrize('backend, min_cosine', [
+    ('torch-int8', 0.99),
+    ('onnx', 0.9999),
+    ('onnx-int8', 0.99),
+])
+def test_backend_agrees_with_fp32(backend, min_cosine, reference, tmp_path):
+    """Test that each backend produces embeddings with high cosine agreement with fp32 torch"""
+    if backend.startswith('onnx'):
+        pytest.importorskip('onnxruntime')
+        pytest.importorskip('onnxscript')
+    engine = RAGEngine(embedding_backend=backend, embedding_backend_options=(
+        {'export_dir': str(tmp_path)} if backend.startswith('onnx') else None))
+    embeddings = engine._get_embeddings(TEXTS, batch_size=2)
+    assert embeddings.shape == reference.shape
+    cosines = np.sum(embeddings * reference, axis=1)
+    assert cosines.min() >= min_cosine
+
+
+def test_unknown_backend():
+    """Test that an unknown backend name is rejected"""
+    with pytest.raises(ValueError):
+        RAGEngine(embedding_backend='tensorrt')
@@ -0,0 +1,43 @@
+import numpy as np
+from embedding_buffer import EmbeddingBuffer
+
+
+def test_append_grows_capacity_geometrically():
+    """Test that appends keep every row in one contiguous view while capacity doubles"""
+    buffer = EmbeddingBuffer(capacity=4)
+    rows = np.arange(30, dtype=np.float32).reshape(10, 3)
+    capacities = set()
+    for row in rows:
+        buffer.append(row[None])
+        capacities.add(buffer.capacity)
+    assert capacities == {4, 8, 16}
+    assert len(buffer) == 10
+    assert np.array_equal(buffer.data, rows)
+    assert buffer.data.flags['C_CONTIGUOUS']
+
+
+def test_earlier_views_are_unchanged():
+    """Test that a view taken before appends and compaction keeps its contents"""
+    buffer = EmbeddingBuffer(capacity=2)
+    buffer.append(np.ones((2, 2)))
+    view = buffer.data
+    buffer.append(np.full((3, 2), 2.0))
+    buffer.delete([0])
+    buffer.compact()
+    assert np.array_equal(view, np.ones((2, 2)))
+
+
+def test_delete_and_compact():
+    """Test that tombstoned rows stay until compaction, which renumbers the live rows"""
+    buffer = EmbeddingBuffer()
+    buffer.append(np.arange(8, dtype=np.float32).reshape(4, 2))
+    buffer.delete([1])
+    assert len(buffer) == 4 and buffer.n_deleted == 1
+    assert list(buffer.deleted) == [False, True, False, False]
+    buffer.delete([2])
+    assert buffer.n_deleted == 2
+
+    remap = buffer.compact()
+    assert list(remap) == [0, -1, -1, 1]
+    assert np.array_equal(buffer.data, [[0, 1], [6, 7]])
+    assert buffer.n_deleted == 0 and not buffer.deleted.any()
@@ -0,0 +1,61 @@
+import threading
+import numpy as np
+import pytest
+from embedding_service import EmbeddingService
+
+
+def fake_embed(batches):
+    def embed(texts):
+        batches.append(list(texts))
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+    return embed
+
+
+def test_concurrent_requests_share_a_batch():
+    """Test that requests arriving within the wait window are embedded in one call"""
+    batches = []
+    service = EmbeddingService(fake_embed(batches), max_batch_size=8, max_wait=0.2)
+    barrier = threading.Barrier(4)
+    results = {}
+
+    def worker(text):
+        barrier.wait()
+        results[text] = service.embed(text, timeout=5)
+
+    threads = [threading.Thread(target=worker, args=(text,)) for text in ['a', 'bb', 'ccc', 'bb']]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    service.stop()
+
+    assert len(batches) == 1
+    assert sorted(batches[0]) == ['a', 'bb', 'ccc']  # Duplicates are embedded once
+    assert results['ccc'][0] == 3
+    stats = service.stats()
+    assert stats['requests'] == 4
+    assert stats['batches'] == 1
+    assert stats['batch_fill'] == 0.5
+
+
+def test_batches_are_capped_at_max_batch_size():
+    """Test that a backlog is split into batches of at most max_batch_size"""
+    batches = []
+    service = EmbeddingService(fake_embed(batches), max_batch_size=2, max_wait=0.05)
+    futures = [service.submit(str(i)) for i in range(5)]
+    assert [future.result(timeout=5)[0] for future in futures] == [1] * 5
+    service.stop()
+    assert all(len(batch) <= 2 for batch in batches)
+
+
+def test_errors_propagate_to_every_caller():
+    """Test that a failed forward pass fails all futures in the batch"""
+    def broken(texts):
+        raise RuntimeError("model unavailable")
+
+    service = EmbeddingService(broken, max_wait=0.05)
+    futures = [service.submit('a'), service.submit('b')]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+    service.stop()
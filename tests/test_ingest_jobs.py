@@ -0,0 +1,86 @@
+import threading
+import time
+import pytest
+from ingest_jobs import IngestJobManager, JobQueueFull
+
+
+class BlockingRag:
+    """Stand-in engine whose add_pdf reports progress until released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def add_pdf(self, pdf_path, progress=None):
+        for page in range(1, 1000):
+            progress('pages', page, 1000)
+            if self.release.wait(0.01):
+                return {'filename': pdf_path}
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "Timed out"
+        time.sleep(0.01)
+
+
+def test_queue_backpressure_and_cancellation():
+    """Test that a full queue rejects jobs and that queued and running jobs can be cancelled"""
+    rag = BlockingRag()
+    manager = IngestJobManager(rag, max_workers=1, max_queue=1)
+    try:
+        running = manager.submit('a.pdf')
+        wait_for(lambda: running.status == 'running')
+        queued = manager.submit('b.pdf')
+        with pytest.raises(JobQueueFull):
+            manager.submit('c.pdf')
+
+        manager.cancel(queued.id)
+        assert queued.status == 'cancelled'
+
+        wait_for(lambda: running.pages_parsed > 0)
+        manager.cancel(running.id)
+        wait_for(lambda: running.finished)
+        assert running.status == 'cancelled'
+        assert running.to_dict()['pages_per_second'] > 0
+    finally:
+        rag.release.set()
+        manager.shutdown()
+
+
+def test_completed_job_reports_result():
+    """Test that a finished job exposes the add_pdf result and is passed to on_finish"""
+    rag = BlockingRag()
+    rag.release.set()
+    finished = []
+    manager = IngestJobManager(rag, on_finish=finished.append)
+    job = manager.submit('a.pdf')
+    wait_for(lambda: finished)
+    assert job.status == 'completed'
+    assert manager.get(job.id).result == {'filename': 'a.pdf'}
+    assert finished == [job]
+    manager.shutdown()
+
+
+def test_job_holds_the_engine_lease_until_it_finishes():
+    """Test that a callable rag is entered with the job's collection and exited when the job ends"""
+    from contextlib import contextmanager
+    rag = BlockingRag()
+    leases = []
+
+    @contextmanager
+    def lease(collection='default'):
+        leases.append(['held', collection])
+        try:
+            yield rag
+        finally:
+            leases[-1][0] = 'released'
+
+    manager = IngestJobManager(lease)
+    job = manager.submit('a.pdf', collection='team-a')
+    wait_for(lambda: job.status == 'running' and leases)
+    assert leases == [['held', 'team-a']]
+    rag.release.set()
+    wait_for(lambda: job.finished)
+    assert job.status == 'completed' and leases == [['released', 'team-a']]
+    manager.shutdown()
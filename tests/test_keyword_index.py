@@ -0,0 +1,53 @@
+import numpy as np
+from keyword_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    """Test that codes like ERR-4021 match both as a whole and by their parts"""
+    assert tokenize('Error ERR-4021 in v2.1.') == ['error', 'err-4021', 'err', '4021', 'in', 'v2.1', 'v2', '1']
+
+
+def test_bm25_ranks_rare_terms_first():
+    """Test that a rare identifier outranks common words and unmatched rows are not returned"""
+    index = BM25Index()
+    index.add(['the pump failed with code X-17', 'the pump is running', 'the valve is open', 'nothing here'])
+    ids, scores = index.search('pump code x-17', 10)
+    assert list(ids) == [0, 1]
+    assert scores[0] > scores[1] > 0
+    assert len(index.search('unknown words', 5)[0]) == 0
+
+
+def test_remove_and_compact():
+    """Test that removed rows are never returned and compaction renumbers the rest"""
+    index = BM25Index()
+    index.add(['alpha beta', 'beta gamma', 'gamma delta'])
+    index.remove([0])
+    assert list(index.search('beta', 5)[0]) == [1]
+
+    remap = index.compact()
+    assert list(remap) == [-1, 0, 1]
+    assert len(index) == 2
+    assert len(index.search('alpha', 5)[0]) == 0
+    assert list(index.search('gamma delta', 5)[0]) == [1, 0]
+
+
+def test_arrays_round_trip():
+    """Test that an index rebuilt from its arrays scores like the original and keeps growing"""
+    index = BM25Index()
+    index.add(['ERR-4021 broke the build', 'the build is green', 'release notes for v2.1.3'])
+    index.remove([1])
+    index.compact()
+    restored = BM25Index.from_arrays(index.arrays())
+    for query in ('build', 'err-4021', 'v2.1.3 notes'):
+        assert [a.tolist() for a in restored.search(query, 5)] == [a.tolist() for a in index.search(query, 5)]
+
+    restored.add(['a second build log'])
+    assert restored.search('log', 5)[0].tolist() == [2]
+    assert len(BM25Index.from_arrays(BM25Index().arrays())) == 0
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    """Test that ids ranked by both lists beat ids ranked first by only one"""
+    ids, scores = reciprocal_rank_fusion([np.array([5, 7, 9]), np.array([8, 7, 9])], k=2)
+    assert list(ids) == [7, 9]
+    assert np.isclose(scores[0], 2 / 62)
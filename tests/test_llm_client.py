@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from llm_client import LLMClient, CircuitOpenError
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Local stand-in for LM Studio that replays a scripted list of responses"""
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+
+    def do_GET(self):
+        self.handle_scripted()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.handle_scripted()
+
+    def handle_scripted(self):
+        server = self.server
+        server.requests += 1
+        status, delay = server.script.pop(0) if server.script else (200, 0)
+        time.sleep(delay)
+        if status is None:
+            # Drop the connection after reading the request, like a server that crashed mid-completion
+            self.close_connection = True
+            return
+        body = json.dumps({'status': status}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.script, server.requests, server.connections = [], 0, 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}/v1/models"
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_reused(stub_server):
+    """Test that sequential calls share one keep-alive connection"""
+    server, url = stub_server
+    client = LLMClient()
+    for _ in range(5):
+        assert client.get(url).status_code == 200
+    assert server.requests == 5
+    assert server.connections == 1
+
+
+def test_retries_transient_errors(stub_server):
+    """Test that retryable statuses are retried until the server recovers"""
+    server, url = stub_server
+    server.script = [(503, 0), (502, 0)]
+    client = LLMClient(max_retries=2, backoff=0.01)
+    assert client.post(url, json={}).status_code == 200
+    assert server.requests == 3
+
+
+def test_post_read_timeout_is_not_retried(stub_server):
+    """Test that a slow completion is not generated twice"""
+    server, url = stub_server
+    server.script = [(200, 0.5)]
+    client = LLMClient(read_timeout=0.1, max_retries=2, backoff=0.01)
+    with pytest.raises(requests.ReadTimeout):
+        client.post(url, json={})
+    assert server.requests == 1
+
+
+def test_post_is_not_retried_after_the_connection_drops(stub_server):
+    """Test that a POST whose body reached the server is not sent again when the connection is aborted"""
+    server, url = stub_server
+    server.script = [(None, 0)]
+    client = LLMClient(max_retries=2, backoff=0.01)
+    with pytest.raises(requests.ConnectionError):
+        client.post(url, json={})
+    assert server.requests == 1
+
+
+def test_post_is_retried_when_the_connection_is_refused(stub_server, monkeypatch):
+    """Test that a POST that never reached the server is retried"""
+    server, url = stub_server
+    client = LLMClient(max_retries=1, backoff=0.01)
+    original = client.session.request
+    calls = []
+
+    def refuse_first(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            return original('POST', 'http://127.0.0.1:1/v1/models', timeout=1)  # Nothing listens on port 1
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(client.session, 'request', refuse_first)
+    assert client.post(url, json={}).status_code == 200
+    assert len(calls) == 2 and server.requests == 1
+
+
+def test_server_errors_count_as_breaker_failures(stub_server):
+    """Test that a 500 (not retried) still counts towards opening the circuit"""
+    server, url = stub_server
+    server.script = [(500, 0)]
+    client = LLMClient(max_retries=2, failure_threshold=1)
+    assert client.post(url, json={}).status_code == 500
+    assert server.requests == 1
+    assert client.breaker.state == 'open'
+
+
+def test_circuit_breaker_fails_fast_then_recovers(stub_server):
+    """Test that repeated failures open the circuit and a later success closes it"""
+    server, url = stub_server
+    server.script = [(503, 0), (503, 0)]
+    client = LLMClient(max_retries=0, failure_threshold=2, reset_timeout=0.2)
+    client.get(url)
+    client.get(url)
+    assert client.breaker.state == 'open'
+
+    with pytest.raises(CircuitOpenError):
+        client.get(url)
+    assert server.requests == 2
+
+    time.sleep(0.25)
+    assert client.get(url).status_code == 200
+    assert client.breaker.state == 'closed'
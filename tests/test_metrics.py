@@ -0,0 +1,32 @@
+from metrics import Histogram, Metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    """Test that observations land in the first bucket whose bound is not below them"""
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [(0.1, 2), (1.0, 3), (float('inf'), 4)]
+    assert histogram.count == 4
+    assert abs(histogram.sum - 2.65) < 1e-9
+
+
+def test_render_prometheus_text():
+    """Test the exposition format of counters, gauges and labelled histograms"""
+    metrics = Metrics(prefix='app', buckets=(0.5,))
+    metrics.describe('stage_duration_seconds', 'Stage latency')
+    metrics.observe('stage_duration_seconds', 0.2, route='chat', stage='query_embed')
+    metrics.increment('requests_total', status=200)
+    metrics.increment('requests_total', status=200)
+    metrics.set_gauge('cache_hit_ratio', 0.5, cache='response')
+
+    lines = metrics.render().splitlines()
+    assert '# TYPE app_requests_total counter' in lines
+    assert 'app_requests_total{status="200"} 2' in lines
+    assert 'app_cache_hit_ratio{cache="response"} 0.5' in lines
+    assert '# HELP app_stage_duration_seconds Stage latency' in lines
+    assert '# TYPE app_stage_duration_seconds histogram' in lines
+    assert 'app_stage_duration_seconds_bucket{route="chat",stage="query_embed",le="0.5"} 1' in lines
+    assert 'app_stage_duration_seconds_bucket{route="chat",stage="query_embed",le="+Inf"} 1' in lines
+    assert 'app_stage_duration_seconds_count{route="chat",stage="query_embed"} 1' in lines
+
@@ -0,0 +1,30 @@
+import time
+from model_info import ModelInfoCache
+
+
+def test_background_refresh_picks_up_model_change():
+    """Test that the refresher replaces the entry when LM Studio loads another model"""
+    models = ['model-a']
+    cache = ModelInfoCache(lambda: {'model_name': models[0]}, ttl=60, refresh_interval=0.05)
+    try:
+        assert cache.get()['model_name'] == 'model-a'
+        models[0] = 'model-b'
+        deadline = time.time() + 2
+        while cache.get()['model_name'] != 'model-b':
+            assert time.time() < deadline, "Model change was not picked up"
+            time.sleep(0.02)
+        assert cache.stats()['model_changes'] == 1
+    finally:
+        cache.stop()
+
+
+def test_expired_entry_is_refetched():
+    """Test that an entry older than the ttl is fetched again on access"""
+    calls = []
+    cache = ModelInfoCache(lambda: calls.append(1) or {'model_name': 'm'}, ttl=0.05, refresh_interval=0)
+    cache.get()
+    cache.get()
+    time.sleep(0.1)
+    cache.get()
+    assert len(calls) == 2
+    assert cache.stats()['hits'] == 1
@@ -0,0 +1,12 @@
+from pdf_extract import extract_pages
+
+
+def test_sharded_extraction_preserves_page_order(tmp_path, write_pdf):
+    """Test that process-pool extraction yields the same pages as serial extraction"""
+    pdf_path = str(tmp_path / 'doc.pdf')
+    write_pdf(pdf_path, [f"page number {i} text" for i in range(7)])
+
+    count, serial = extract_pages(pdf_path, workers=1)
+    sharded_count, sharded = extract_pages(pdf_path, workers=2, pages_per_shard=2)
+    assert count == sharded_count == 7
+    assert list(serial) == list(sharded)
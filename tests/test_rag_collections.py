@@ -0,0 +1,73 @@
+import pytest
+from rag_collections import CollectionManager, CollectionNotFound, InvalidCollectionName, DEFAULT_COLLECTION
+
+
+class StubEngine:
+    """Stand-in RAGEngine that records how it was created"""
+
+    def __init__(self, storage_dir, encoder=None):
+        self.storage_dir = storage_dir
+        self.encoder = encoder
+        self.busy = False
+
+    def memory_usage(self):
+        return {'chunks': 0}
+
+
+def test_collections_share_the_default_encoder(tmp_path):
+    """Test that named collections get their own directory and the default engine as encoder"""
+    manager = CollectionManager(StubEngine, str(tmp_path))
+    default = manager.get()
+    team = manager.get('team-a', create=True)
+    assert default.storage_dir == str(tmp_path)
+    assert team.storage_dir == str(tmp_path / 'collections' / 'team-a')
+    assert team.encoder is default
+    assert manager.get('team-a') is team
+    assert manager.names() == [DEFAULT_COLLECTION, 'team-a']
+
+
+def test_unknown_and_invalid_collections(tmp_path):
+    """Test that reads of missing collections fail and names cannot escape the storage directory"""
+    manager = CollectionManager(StubEngine, str(tmp_path))
+    with pytest.raises(CollectionNotFound):
+        manager.get('missing')
+    for name in ('../etc', '', 'a/b', '.hidden'):
+        with pytest.raises(InvalidCollectionName):
+            manager.get(name, create=True)
+
+
+def test_least_recently_used_collections_are_unloaded(tmp_path):
+    """Test that loaded collections are bounded and busy or default ones are kept"""
+    manager = CollectionManager(StubEngine, str(tmp_path), max_loaded=3)
+    (tmp_path / 'collections' / 'b').mkdir(parents=True)
+    a = manager.get('a', create=True)
+    a.busy = True
+    manager.get('b')
+    manager.get('c', create=True)
+    assert manager.is_loaded(DEFAULT_COLLECTION) and manager.is_loaded('a')
+    assert not manager.is_loaded('b') and manager.is_loaded('c')
+
+    # Unloaded collections reload from disk on the next request
+    reloaded = manager.get('b')
+    assert manager.is_loaded('b') and not manager.is_loaded('c')
+    assert reloaded.storage_dir.endswith('b')
+    assert manager.stats()['unloads'] == 2
+
+
+def test_idle_collections_are_unloaded(tmp_path):
+    """Test that collections unused for idle_unload seconds are dropped"""
+    manager = CollectionManager(StubEngine, str(tmp_path), idle_unload=0)
+    manager.get('a', create=True)
+    manager.get('b', create=True)
+    assert not manager.is_loaded('a')
+    assert set(manager.stats()['collections']) == {DEFAULT_COLLECTION}
+
+
+def test_leased_collections_are_not_unloaded(tmp_path):
+    """Test that a collection stays loaded while a writer holds a lease on it"""
+    manager = CollectionManager(StubEngine, str(tmp_path), max_loaded=1)
+    with manager.lease('a', create=True) as a:
+        manager.get('b', create=True)
+        assert not manager.unload('a')
+        assert manager.get('a') is a
+    assert manager.unload('a')
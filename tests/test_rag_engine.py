@@ -0,0 +1,312 @@
+import pytest
+import numpy as np
+
+
+def test_batched_embeddings_match_single(rag):
+    """Test that batched embedding returns the same vectors in input order"""
+    texts = ['short text', 'a much longer piece of text ' * 20, 'medium length text here']
+    batched = rag._get_embeddings(texts, batch_size=2)
+    single = np.vstack([rag._get_embedding(text) for text in texts])
+    assert batched.shape == single.shape
+    assert np.allclose(batched, single, atol=1e-5)
+
+
+def test_persistent_store_reloads_without_reembedding(tmp_path):
+    """Test that a new engine loads embeddings and texts from the storage directory"""
+    from rag_engine import RAGEngine
+
+    engine = RAGEngine(storage_dir=str(tmp_path))
+    engine.add_texts(['first chunk of text', 'second chunk of text'])
+    engine.add_texts(['third chunk of text'])
+
+    reloaded = RAGEngine(storage_dir=str(tmp_path))
+    reloaded._get_embeddings = None  # Loading must not embed anything
+    assert reloaded.documents == engine.documents
+    assert np.allclose(reloaded.embeddings, engine.embeddings)
+    assert isinstance(reloaded.embeddings, np.memmap)
+    assert reloaded.generation == engine.generation == 2  # Caches keyed on it stay valid across reloads
+
+
+def test_keyword_index_is_reloaded_without_tokenizing_saved_chunks(tmp_path, monkeypatch):
+    """Test that a reload restores the saved BM25 postings and only tokenizes chunks added since"""
+    import keyword_index
+    from rag_engine import RAGEngine
+    engine = RAGEngine(storage_dir=str(tmp_path))
+    engine.add_texts(['invoice ERR-1001 was paid', 'invoice ERR-2002 is overdue'])
+    engine.add_texts(['refund ERR-3003 was issued'])  # Under twice the saved rows: not saved again
+
+    tokenized = []
+    tokenize = keyword_index.tokenize
+    monkeypatch.setattr(keyword_index, 'tokenize', lambda text: tokenized.append(text) or tokenize(text))
+    reloaded = RAGEngine(storage_dir=str(tmp_path))
+    assert tokenized == ['refund ERR-3003 was issued']
+    for query in ('ERR-2002', 'invoice', 'refund'):
+        assert [r['content'] for r in reloaded.query(query, k=3, mode='keyword')] == \
+            [r['content'] for r in engine.query(query, k=3, mode='keyword')]
+
+
+def test_add_texts_reuses_embeddings_for_known_chunks(rag):
+    """Test that chunks already in the knowledge base are not embedded again"""
+    assert rag.add_texts(['alpha text', 'beta text']) == {'embedded': 2, 'reused': 0}
+    assert rag.add_texts(['beta text', 'gamma text']) == {'embedded': 1, 'reused': 1}
+    assert np.allclose(rag.embeddings[1], rag.embeddings[2])
+
+
+def test_retired_chunks_are_excluded_from_queries(rag):
+    """Test that retired chunk ranges never appear in query results"""
+    rag.add_texts(['old version of the text', 'unrelated content'])
+    rag._retire(0, 1)
+    results = rag.query('old version of the text', k=5)
+    assert [result['content'] for result in results] == ['unrelated content']
+
+
+def test_compaction_copies_the_store_outside_the_lock(tmp_path):
+    """Test that chunks added or retired while compaction copies the store survive or are redone"""
+    from rag_engine import RAGEngine
+    engine = RAGEngine(storage_dir=str(tmp_path))
+    engine.add_texts(['retired alpha chunk', 'kept bravo chunk', 'retired charlie chunk'])
+    engine._retire(0, 1)
+    begin_compaction = engine.store.begin_compaction
+    during_copy = [lambda: engine._retire(2, 3), lambda: engine.add_texts(['added delta chunk'])]
+
+    def copy_while_writing(keep):
+        copy = begin_compaction(keep)
+        if during_copy:
+            during_copy.pop(0)()
+        return copy
+
+    engine.store.begin_compaction = copy_while_writing
+    assert engine.compact() == 2  # The first copy is redone, as a chunk was retired during it
+    assert engine.documents == ['kept bravo chunk', 'added delta chunk']
+    assert engine.retired_ranges == []
+    assert engine.query('added delta chunk', k=1)[0]['content'] == 'added delta chunk'
+
+    reloaded = RAGEngine(storage_dir=str(tmp_path))
+    assert reloaded.documents == engine.documents
+    assert np.allclose(reloaded.embeddings, engine.embeddings)
+
+
+def test_deleted_file_is_excluded_then_compacted(tmp_path, write_pdf):
+    """Test that deleting a file hides its chunks at once and compaction keeps files consistent"""
+    from rag_engine import RAGEngine
+
+    engine = RAGEngine(storage_dir=str(tmp_path / 'store'))
+    for name, text in (('old.pdf', 'obsolete manual '), ('keep.pdf', 'current guide ')):
+        write_pdf(str(tmp_path / name), [text * 60])
+        engine.add_pdf(str(tmp_path / name), chunk_size=20)
+    old_chunks = engine.processed_files['old.pdf']['chunks']
+
+    assert engine.delete_file('missing.pdf') is None
+    assert engine.delete_file('old.pdf')['chunks'] == old_chunks
+    assert {result['file'] for result in engine.query('obsolete manual', k=10)} == {'keep.pdf'}
+
+    engine._compaction.join()
+    assert engine.retired_ranges == []
+    assert engine.processed_files['keep.pdf']['start_index'] == 0
+    assert len(engine.documents) == len(engine.embeddings) == len(engine.index)
+    assert {engine.file_names[file_id] for file_id in engine.chunk_file_ids} == {'keep.pdf'}
+    assert engine.query('current guide', k=1)[0]['file'] == 'keep.pdf'
+
+    reloaded = RAGEngine(storage_dir=str(tmp_path / 'store'))
+    assert reloaded.documents == engine.documents
+    assert np.allclose(reloaded.embeddings, engine.embeddings)
+    assert reloaded.processed_files == engine.processed_files
+    assert reloaded.generation == engine.generation
+
+
+def test_compact_in_memory_embeddings(rag):
+    """Test that compaction without a store drops retired rows and keeps embedding reuse working"""
+    rag.add_texts(['first text', 'second text', 'third text'])
+    third = rag.embeddings[2].copy()
+    rag._retire(0, 2)
+    assert rag.compact() == 2
+    assert rag.documents == ['third text']
+    assert np.allclose(rag.embeddings, [third])
+    assert rag.add_texts(['third text']) == {'embedded': 0, 'reused': 1}
+
+
+def test_keyword_and_hybrid_search_find_identifiers(tmp_path):
+    """Test that keyword search finds exact codes without loading the model, and hybrid ranks them first"""
+    from rag_engine import RAGEngine
+
+    texts = ['General maintenance guide for the pump.', 'Fault ERR-4021 means the seal is worn.',
+             'Fault ERR-4022 means low pressure.', 'Safety notes for operators.']
+    RAGEngine(storage_dir=str(tmp_path)).add_texts(texts)
+
+    engine = RAGEngine(storage_dir=str(tmp_path))
+    results = engine.query('what does ERR-4021 mean', k=2, mode='keyword')
+    assert results[0]['content'] == texts[1]
+    assert results[0]['similarity'] is None
+    assert not engine.model_loaded
+
+    hybrid = engine.query('what does ERR-4021 mean', k=2)
+    assert hybrid[0]['content'] == texts[1]
+    assert -1.0 <= hybrid[0]['similarity'] <= 1.0
+    with pytest.raises(ValueError):
+        engine.query('anything', mode='fuzzy')
+
+
+def test_repeated_queries_hit_the_embedding_cache(rag):
+    """Test that equivalent queries reuse the cached query embedding"""
+    rag.add_texts(['some document text'])
+    rag.query('What is  this?')
+    rag.query('what is this? ')
+    assert rag.query_cache.stats()['hits'] == 1
+    assert rag.query_cache.stats()['misses'] == 1
+
+
+def test_query_batch_matches_query(rag):
+    """Test that a batch of queries returns what query() returns for each, embedding repeats once"""
+    rag.add_texts(['Fault ERR-4021 means the seal is worn.', 'Uploads are processed in the background.',
+                   'The cache expires entries after an hour.', 'Safety notes for operators.'])
+    queries = ['what does ERR-4021 mean', 'how long are cache entries kept', 'What does  ERR-4021 mean']
+    for mode in ('dense', 'keyword', 'hybrid'):
+        batch = rag.query_batch(queries, k=4, mode=mode)
+        assert len(batch) == len(queries)
+        for query, results in zip(queries, batch):
+            expected = rag.query(query, k=4, mode=mode)
+            assert {r['content'] for r in results} == {r['content'] for r in expected}
+            assert np.allclose(sorted(r['score'] for r in results), sorted(r['score'] for r in expected), atol=1e-5)
+    # Two distinct normalized queries were embedded for the first batch; everything after hit the cache
+    assert rag.query_cache.stats()['misses'] == 2
+    assert rag.query_batch([], k=4) == []
+
+
+def test_embeddings_are_unit_length(rag):
+    """Test that stored embeddings are pre-normalized for dot-product search"""
+    rag.add_texts(['first text', 'second longer text'])
+    assert np.allclose(np.linalg.norm(rag.embeddings, axis=1), 1.0, atol=1e-5)
+
+
+def test_each_new_version_reuses_the_unchanged_chunks(rag, tmp_path, write_pdf):
+    """Test that chunks carried over to a new version stay reusable for the version after it"""
+    pdf_path = str(tmp_path / 'manual.pdf')
+    pages = ['installation steps for the server ' * 10, 'configuration options and defaults ' * 10]
+    results = []
+    for version in ('first', 'second', 'third'):
+        write_pdf(pdf_path, pages + [f'release notes of the {version} edition ' * 10])
+        results.append(rag.add_pdf(pdf_path, chunk_size=40))
+    assert [result['status'] for result in results] == ['added', 'updated', 'updated']
+    assert results[1]['reused'] > 0
+    assert results[2]['reused'] == results[1]['reused']
+    assert results[2]['embedded'] == results[1]['embedded']
+
+
+def test_content_of_another_file_replaces_a_known_name(rag, tmp_path, write_pdf):
+    """Test that uploading another file's content under a known name retires that name's old version"""
+    write_pdf(str(tmp_path / 'a.pdf'), ['old alpha handbook ' * 20])
+    write_pdf(str(tmp_path / 'b.pdf'), ['current bravo handbook ' * 20])
+    rag.add_pdf(str(tmp_path / 'a.pdf'))
+    rag.add_pdf(str(tmp_path / 'b.pdf'))
+    write_pdf(str(tmp_path / 'c.pdf'), ['current bravo handbook ' * 20])
+    assert rag.add_pdf(str(tmp_path / 'c.pdf'))['status'] == 'duplicate'
+
+    (tmp_path / 'a.pdf').write_bytes((tmp_path / 'b.pdf').read_bytes())
+    result = rag.add_pdf(str(tmp_path / 'a.pdf'))
+    assert result['status'] == 'updated' and result['embedded'] == 0
+    assert 'old alpha' not in ' '.join(r['content'] for r in rag.query('old alpha handbook', k=10))
+    assert {r['file'] for r in rag.query('bravo handbook', k=10)} == {'a.pdf', 'b.pdf'}
+
+
+def test_smallest_accepted_chunk_size_can_be_chunked(rag, tmp_path, write_pdf):
+    """Test that every chunk size the check accepts also passes chunking"""
+    pdf_path = str(tmp_path / 'tiny.pdf')
+    write_pdf(pdf_path, ['short words only'])
+    with pytest.raises(ValueError, match='chunk_size'):
+        rag.add_pdf(pdf_path, chunk_size=1)
+    result = rag.add_pdf(pdf_path, chunk_size=2)
+    assert result['chunks'] > 1 and result['chunk_tokens']['max'] <= 2
+
+
+def test_query_results_cite_file_and_page(rag, tmp_path, write_pdf):
+    """Test that query results carry the source file, page and character offset"""
+    pdf_path = str(tmp_path / 'manual.pdf')
+    write_pdf(pdf_path, ['intro ' * 50, 'error code 42 ' * 40])
+    result = rag.add_pdf(pdf_path, chunk_size=50)
+    stats = result['chunk_tokens']
+    assert 0 < stats['p50'] <= stats['max'] <= 50
+    assert set(result['timings']) == {'hash', 'parse', 'embed', 'store'}
+    rag.add_texts(['loose text without a file'])
+
+    results = rag.query('error code 42', k=10)
+    by_content = {result['content']: result for result in results}
+    assert by_content['loose text without a file']['file'] is None
+    assert {result['page'] for result in results if result['file'] == 'manual.pdf'} == {1, 2}
+    page_two = sorted((r for r in results if r['page'] == 2), key=lambda r: r['offset'])
+    assert page_two[0]['offset'] == 0
+    assert page_two[0]['content'].startswith('error code 42')
+    assert page_two[1]['offset'] > 0
+
+
+def test_packed_context_fits_budget_without_duplicates(rag):
+    """Test that packed context stays within the token budget and skips repeated chunks"""
+    # The same passage appearing in two files, plus one different chunk
+    rag.add_texts(['The cache stores query embeddings. It expires entries after an hour.',
+                   'Uploads are processed by a background worker pool.'])
+    rag.add_texts(['The cache stores query embeddings. It expires entries after an hour.'])
+    packed = rag.get_packed_context('How does the cache work?', budget=200, k=3, duplicate_threshold=0.999)
+    assert packed['chunks'] == 2
+    assert 0 < packed['tokens'] <= 200
+    assert packed['tokens'] == rag.count_tokens([packed['context']])[0]
+
+    small = rag.get_packed_context('How does the cache work?', budget=10, k=3)
+    assert small['tokens'] <= 10
+
+
+def test_query_embeddings_go_through_the_embedding_service(rag):
+    """Test that query embeddings are batched by the service and match direct embedding"""
+    embedding = rag._get_query_embedding('what does the service batch?')
+    assert embedding.shape == (1, rag.model.config.hidden_size)
+    assert np.allclose(embedding, rag._get_embedding('what does the service batch?'), atol=1e-5)
+    assert rag.embedding_service.stats()['requests'] == 1
+
+
+def test_model_is_loaded_on_first_use(tmp_path):
+    """Test that the knowledge base is usable before the model is loaded"""
+    from rag_engine import RAGEngine
+    engine = RAGEngine(storage_dir=str(tmp_path))
+    assert not engine.model_loaded
+    assert engine.get_processed_files() == []
+    engine.warm_up()
+    assert engine.model_loaded
+
+
+def test_int8_index_rescores_from_stored_rows(tmp_path):
+    """Test that an engine with an int8 index returns full-precision similarities"""
+    from rag_engine import RAGEngine
+    engine = RAGEngine(storage_dir=str(tmp_path), index_options={'precision': 'int8'})
+    engine.add_texts(['The cache stores query embeddings. It expires entries after an hour.',
+                      'Uploads are processed by a background worker pool.'])
+    results = engine.query('Uploads are processed by a background worker pool.', k=1)
+    assert results[0]['content'] == 'Uploads are processed by a background worker pool.'
+    assert results[0]['similarity'] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_float16_index_without_a_store_keeps_no_float32_rows(rag):
+    """Test that a storeless engine with a float16 index holds its rows only in the index"""
+    from rag_engine import RAGEngine
+    engine = RAGEngine(encoder=rag, index_options={'precision': 'float16'})
+    engine.add_texts(['The cache stores query embeddings. It expires entries after an hour.',
+                      'Uploads are processed by a background worker pool.'])
+    engine.add_texts(['Uploads are processed by a background worker pool.'])  # Reused row
+    results = engine.query('Uploads are processed by a background worker pool.', k=1, mode='hybrid')
+    assert results[0]['content'] == 'Uploads are processed by a background worker pool.'
+    assert results[0]['similarity'] == pytest.approx(1.0, abs=1e-3)
+    assert engine.get_packed_context('worker pool', budget=200)['chunks'] >= 1
+    assert engine.embeddings is None and engine.memory_usage()['embeddings'] == 0
+
+
+def test_engines_sharing_an_encoder_search_only_their_own_chunks(rag, tmp_path):
+    """Test that a collection engine reuses another engine's model but keeps a separate corpus"""
+    from rag_engine import RAGEngine
+    rag.add_texts(['invoice ERR-1001 belongs to the first collection'])
+    other = RAGEngine(storage_dir=str(tmp_path), encoder=rag)
+    other.add_texts(['invoice ERR-2002 belongs to the second collection'])
+
+    assert other.model is rag.model
+    assert other.embedding_service is rag.embedding_service
+    assert [r['content'] for r in other.query('invoice', k=5)] == ['invoice ERR-2002 belongs to the second collection']
+    assert [r['content'] for r in rag.query('invoice', k=5)] == ['invoice ERR-1001 belongs to the first collection']
+    usage = other.memory_usage()
+    assert usage['chunks'] == 1 and usage['mapped'] > 0 and usage['embeddings'] == 0
+    assert not other.busy
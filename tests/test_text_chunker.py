@@ -0,0 +1,51 @@
+import re
+import pytest
+from text_chunker import ChunkLengthStats, chunk_tokens
+
+
+def word_offsets(text):
+    """Stand-in tokenizer: one token per word or punctuation mark"""
+    return [match.span() for match in re.finditer(r'\w+|[^\w\s]', text)]
+
+
+def sentence(i):
+    return f"Sentence {i} has exactly seven tokens."
+
+
+def test_chunks_fit_and_end_at_sentences():
+    """Test that chunks stay within the token limit and end at sentence boundaries"""
+    text = " ".join(sentence(i) for i in range(20))
+    chunks = list(chunk_tokens([text], word_offsets, chunk_size=16, overlap=0))
+    assert all(chunk.tokens == len(word_offsets(chunk.text)) <= 16 for chunk in chunks)
+    assert all(chunk.text.endswith('.') for chunk in chunks)
+    assert " ".join(chunk.text for chunk in chunks) == text
+    assert chunks[1].offset == len(sentence(0)) + len(sentence(1)) + 2
+
+
+def test_overlap_repeats_whole_sentences_within_a_paragraph():
+    """Test that overlap starts at a sentence and never crosses a paragraph or page break"""
+    first = " ".join(sentence(i) for i in range(6))
+    second = " ".join(sentence(i) for i in range(6, 12))
+    chunks = list(chunk_tokens([first + "\n\n" + second, "Next page text."], word_offsets,
+                               chunk_size=24, overlap=7))
+    texts = [chunk.text for chunk in chunks]
+    assert texts[0] == " ".join(sentence(i) for i in range(3))
+    assert texts[1].startswith(sentence(2))  # Overlap: the previous chunk's last sentence
+    assert any(text.startswith(sentence(6)) for text in texts)  # A new paragraph starts a chunk
+    assert not any(sentence(5) in text and sentence(6) in text for text in texts)
+    # No cut is needed at the page break, so the last chunk continues onto page 2
+    assert chunks[-1].page == 1 and texts[-1].endswith(sentence(11) + " Next page text.")
+
+
+def test_overlap_must_be_smaller_than_half_a_chunk():
+    """Test that an overlap that could stall chunking is rejected"""
+    with pytest.raises(ValueError):
+        list(chunk_tokens(["text"], word_offsets, chunk_size=10, overlap=5))
+
+
+def test_chunk_length_stats():
+    """Test the chunk token count summary"""
+    stats = ChunkLengthStats(max_tokens=100)
+    stats.add([10, 20, 30, 40, 500])
+    assert stats.stats() == {'chunks': 5, 'mean': 40.0, 'p50': 30, 'p95': 100, 'max': 100}
+    assert ChunkLengthStats().stats()['chunks'] == 0
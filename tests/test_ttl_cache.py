@@ -0,0 +1,23 @@
+import time
+from ttl_cache import TTLCache
+
+
+def test_lru_eviction_and_stats():
+    """Test that the least recently used entry is evicted and lookups are counted"""
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    assert cache.stats() == {'size': 2, 'maxsize': 2, 'hits': 2, 'misses': 1, 'hit_rate': 0.6667}
+
+
+def test_entries_expire_after_ttl():
+    """Test that entries older than the ttl are treated as misses"""
+    cache = TTLCache(maxsize=10, ttl=0.05)
+    cache.set('a', 1)
+    time.sleep(0.1)
+    assert cache.get('a') is None
+    assert len(cache) == 0
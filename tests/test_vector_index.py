@@ -0,0 +1,144 @@
+import numpy as np
+from vector_index import ExactIndex, IVFIndex, create_index, normalize_rows
+
+
+def clustered_vectors(n, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return normalize_rows(centers[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, dim)))
+
+
+def test_exact_index_matches_brute_force():
+    """Test that the exact backend returns the true top-k by cosine similarity"""
+    vectors = clustered_vectors(500)
+    index = ExactIndex()
+    index.add(vectors[:300])
+    index.add(vectors[300:])
+
+    query = normalize_rows(vectors[7] + 0.1)
+    ids, scores = index.search(query, 5)
+
+    expected = vectors @ query
+    assert list(ids) == list(np.argsort(expected)[::-1][:5])
+    assert np.allclose(scores, expected[ids], atol=1e-5)
+
+
+def test_ivf_index_recall_with_incremental_inserts():
+    """Test that the IVF backend keeps high recall as rows are added after training"""
+    vectors = clustered_vectors(3000)
+    exact = ExactIndex()
+    ivf = IVFIndex(n_lists=16, n_probe=8, min_train_size=1000)
+    for start in range(0, len(vectors), 500):
+        exact.add(vectors[start:start + 500])
+        ivf.add(vectors[start:start + 500])
+
+    assert ivf.is_trained
+    assert len(ivf) == len(vectors)
+
+    hits = 0
+    for query in clustered_vectors(50, seed=1):
+        expected = set(exact.search(query, 10)[0])
+        hits += len(expected & set(ivf.search(query, 10)[0]))
+    assert hits / 500 >= 0.9
+
+
+def test_create_index_rejects_unknown_backend():
+    """Test that an unknown backend name raises an error"""
+    try:
+        create_index('annoy')
+    except ValueError as e:
+        assert 'annoy' in str(e)
+    else:
+        assert False, "Expected ValueError"
+
+
+def test_compact_precisions_keep_recall_and_save_memory():
+    """Test that float16 and int8 rows keep recall high at a fraction of the memory"""
+    vectors = clustered_vectors(2000, dim=64)
+    queries = clustered_vectors(50, dim=64, seed=1)
+    exact = ExactIndex()
+    exact.add(vectors)
+    truth = [set(exact.search(query, 10)[0]) for query in queries]
+
+    for precision, max_ratio, min_recall in [('float16', 0.55, 0.99), ('int8', 0.35, 0.9)]:
+        index = ExactIndex(precision=precision)
+        index.add(vectors[:1000])
+        index.add(vectors[1000:])
+        assert index.memory_bytes() < max_ratio * exact.memory_bytes()
+        recall = np.mean([len(t & set(index.search(query, 10)[0])) / 10 for t, query in zip(truth, queries)])
+        assert recall >= min_recall
+
+
+def test_int8_rescoring_restores_exact_results():
+    """Test that re-scoring int8 candidates at float32 returns the exact top-k and scores"""
+    vectors = clustered_vectors(1000, dim=64)
+    exact = ExactIndex()
+    exact.add(vectors)
+    for index in (ExactIndex(precision='int8', rescore_source=lambda ids: vectors[ids]),
+                  IVFIndex(n_lists=8, n_probe=8, min_train_size=500, precision='int8',
+                           rescore_source=lambda ids: vectors[ids])):
+        index.add(vectors)
+        index.remove(np.array([3]))
+        exact.remove(np.array([3]))
+        for query in clustered_vectors(20, dim=64, seed=2):
+            expected_ids, expected_scores = exact.search(query, 5)
+            ids, scores = index.search(query, 5)
+            assert list(ids) == list(expected_ids)
+            assert np.allclose(scores, expected_scores, atol=1e-5)
+
+
+def test_compact_renumbers_rows():
+    """Test that compaction drops removed rows and search returns the renumbered ids"""
+    vectors = clustered_vectors(1000, dim=64)
+    removed = np.arange(0, 1000, 3)
+    for index in (ExactIndex(), ExactIndex(precision='int8'),
+                  IVFIndex(n_lists=8, n_probe=8, min_train_size=500)):
+        index.add(vectors)
+        index.remove(removed)
+        before = [index.search(query, 5) for query in clustered_vectors(10, dim=64, seed=3)]
+        remap = index.compact()
+        assert len(index) == 1000 - len(removed)
+        assert (remap[removed] == -1).all()
+        for query, (ids, scores) in zip(clustered_vectors(10, dim=64, seed=3), before):
+            new_ids, new_scores = index.search(query, 5)
+            assert list(new_ids) == list(remap[ids])
+            assert np.allclose(new_scores, scores)
+
+
+def test_search_batch_matches_search():
+    """Test that batched search returns the same hits as one search per query"""
+    vectors = clustered_vectors(1500, dim=64)
+    queries = clustered_vectors(40, dim=64, seed=4)
+    for index in (ExactIndex(), ExactIndex(precision='float16'),
+                  ExactIndex(precision='int8', rescore_source=lambda ids: vectors[ids]),
+                  IVFIndex(n_lists=8, n_probe=4, min_train_size=500)):
+        index.add(vectors)
+        index.remove(np.arange(0, 1500, 7))
+        index.MAX_BATCH_SCORES = 1500 * 16  # Several query blocks
+        batch = index.search_batch(queries, 5)
+        assert len(batch) == len(queries)
+        for query, (ids, scores) in zip(queries, batch):
+            expected_ids, expected_scores = index.search(query, 5)
+            assert list(ids) == list(expected_ids)
+            assert np.allclose(scores, expected_scores, atol=1e-5)
+
+
+def test_row_source_index_scores_rows_it_does_not_own():
+    """Test that a float32 index over an external matrix matches an owning index and copies no rows"""
+    vectors = clustered_vectors(1000, dim=64)
+    rows = {'matrix': None}
+    owning, external = ExactIndex(), ExactIndex(row_source=lambda: rows['matrix'])
+    for batch in (vectors[:600], vectors[600:]):
+        rows['matrix'] = vectors[:len(owning) + len(batch)]
+        owning.add(batch)
+        external.add(batch)
+    owning.remove(np.array([5]))
+    external.remove(np.array([5]))
+    assert external.memory_bytes() < owning.memory_bytes() / 100
+
+    for query in clustered_vectors(10, dim=64, seed=5):
+        assert list(external.search(query, 5)[0]) == list(owning.search(query, 5)[0])
+    # float16 rows (e.g. a half-precision store) are upcast block by block
+    rows['matrix'] = vectors.astype(np.float16)
+    ids, scores = external.search(vectors[7], 1)
+    assert ids[0] == 7 and abs(scores[0] - 1) < 1e-2
@@ -0,0 +1,95 @@
+import os
+import json
+import numpy as np
+from vector_store import VectorStore
+from vector_index import normalize_rows
+
+
+def test_uncommitted_rows_are_discarded(tmp_path):
+    """Test that rows appended after the last commit are truncated on load"""
+    store = VectorStore(str(tmp_path))
+    store.append(np.ones((2, 4), dtype=np.float32), [{'text': 'a'}, {'text': 'b'}])
+    store.commit({'processed_files': {'doc.pdf': {'chunks': 2}}})
+    store.append(np.zeros((1, 4), dtype=np.float32), [{'text': 'torn write'}])
+
+    embeddings, chunks, metadata = VectorStore(str(tmp_path)).load()
+    assert embeddings.shape == (2, 4)
+    assert chunks == [{'text': 'a'}, {'text': 'b'}]
+    assert metadata == {'processed_files': {'doc.pdf': {'chunks': 2}}}
+
+
+def test_float16_storage(tmp_path):
+    """Test that embeddings can be stored in half precision"""
+    store = VectorStore(str(tmp_path), dtype='float16')
+    store.append(np.full((3, 4), 0.5, dtype=np.float32), [{'text': t} for t in 'abc'])
+    store.commit({})
+
+    embeddings, _, _ = VectorStore(str(tmp_path)).load()
+    assert embeddings.dtype == np.float16
+    assert np.allclose(embeddings, 0.5)
+
+
+def test_compact_keeps_only_live_rows(tmp_path):
+    """Test that compaction rewrites the live rows to new files that reload correctly"""
+    store = VectorStore(str(tmp_path))
+    store.append(np.arange(12, dtype=np.float32).reshape(3, 4), [{'text': t} for t in 'abc'])
+    store.commit({'retired_ranges': [[1, 2]]})
+    store.compact(np.array([True, False, True]), {'retired_ranges': []})
+
+    assert sorted(os.listdir(tmp_path)) == ['chunks.1.jsonl', 'embeddings.1.bin', 'manifest.json']
+    embeddings, chunks, metadata = VectorStore(str(tmp_path)).load()
+    assert np.allclose(embeddings, normalize_rows(np.array([[0, 1, 2, 3], [8, 9, 10, 11]])))
+    assert chunks == [{'text': 'a'}, {'text': 'c'}]
+    assert metadata == {'retired_ranges': []}
+
+
+def test_rows_appended_during_a_compaction_copy_are_carried_over(tmp_path):
+    """Test that a split compaction keeps rows appended between its copy and its commit"""
+    store = VectorStore(str(tmp_path))
+    store.append(np.eye(4, dtype=np.float32)[:3], [{'text': t} for t in 'abc'])
+    store.commit({})
+    copy = store.begin_compaction(np.array([False, True, True]))
+    store.append(np.eye(4, dtype=np.float32)[3:], [{'text': 'd'}])
+    store.commit({})
+    store.finish_compaction(copy, {'retired_ranges': []})
+
+    embeddings, chunks, _ = VectorStore(str(tmp_path)).load()
+    assert np.array_equal(embeddings, np.eye(4)[1:])
+    assert chunks == [{'text': 'b'}, {'text': 'c'}, {'text': 'd'}]
+
+    aborted = store.begin_compaction(np.array([True, False, True]))
+    store.abort_compaction(aborted)
+    assert sorted(os.listdir(tmp_path)) == ['chunks.1.jsonl', 'embeddings.1.bin', 'manifest.json']
+
+
+def test_rows_appended_before_the_first_commit_are_discarded(tmp_path):
+    """Test that a crash between the first append and its commit leaves no stale rows behind"""
+    VectorStore(str(tmp_path)).append(np.ones((2, 4), dtype=np.float32), [{'text': 'a'}, {'text': 'b'}])
+
+    store = VectorStore(str(tmp_path))
+    assert store.load() == (None, [], {})
+    store.append(np.zeros((1, 4), dtype=np.float32), [{'text': 'c'}])
+    store.commit({})
+    embeddings, chunks, _ = VectorStore(str(tmp_path)).load()
+    assert np.array_equal(embeddings, np.zeros((1, 4)))
+    assert chunks == [{'text': 'c'}]
+
+
+def test_rows_are_stored_unit_length(tmp_path):
+    """Test that appended rows are normalized and that stores written without normalizing are fixed on load"""
+    store = VectorStore(str(tmp_path))
+    store.append(np.full((2, 4), 3.0, dtype=np.float32), [{'text': 'a'}, {'text': 'b'}])
+    store.commit({})
+    embeddings, _, _ = VectorStore(str(tmp_path)).load()
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0)
+
+    legacy = tmp_path / 'legacy'
+    store = VectorStore(str(legacy))
+    store.append(np.ones((1, 4), dtype=np.float32), [{'text': 'a'}])
+    store.commit({})
+    np.full(4, 2.0, dtype=np.float32).tofile(str(legacy / 'embeddings.bin'))
+    manifest = json.loads((legacy / 'manifest.json').read_text())
+    del manifest['normalized']
+    (legacy / 'manifest.json').write_text(json.dumps(manifest))
+    embeddings, chunks, _ = VectorStore(str(legacy)).load()
+    assert np.allclose(embeddings, 0.5) and chunks == [{'text': 'a'}]
@@ -0,0 +1,120 @@
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Tuple
+import numpy as np
+
+# Boundary before a token, from weakest to strongest
+INSIDE_WORD, WORD, SENTENCE, PARAGRAPH = range(4)
+
+
+class Chunk(NamedTuple):
+    text: str
+    page: int  # 1-based page number where the chunk starts
+    offset: int  # Character offset of the chunk's first word within that page
+    tokens: int = 0  # Token count (chunk_tokens only)
+
+
+def chunk_tokens(pages: Iterable[str], token_offsets: Callable[[str], List[Tuple[int, int]]],
+                 chunk_size: int = 256, overlap: int = 32) -> Iterator[Chunk]:
+    """Split a stream of page texts into chunks of at most chunk_size tokens.
+
+    token_offsets maps a text to the character span of each of its tokens,
+    e.g. a fast tokenizer's offset mapping. Each chunk ends at the
+    strongest boundary in the second half of its window: a paragraph or page
+    break, else a sentence end, else a word boundary. When a chunk ends inside
+    a paragraph, the next one repeats up to overlap tokens of its tail,
+    starting at a sentence or word boundary. Whitespace in chunk texts is
+    collapsed.
+    """
+    if not 0 <= overlap < chunk_size // 2:
+        raise ValueError("overlap must be less than half of chunk_size")
+
+    texts: Dict[int, str] = {}
+    token_pages: List[int] = []
+    starts: List[int] = []
+    ends: List[int] = []
+    levels: List[int] = []  # Boundary strength before each token
+
+    def make_chunk(stop: int) -> Chunk:
+        parts = []
+        first = 0
+        for i in range(1, stop + 1):
+            if i == stop or token_pages[i] != token_pages[first]:
+                parts.append(texts[token_pages[first]][starts[first]:ends[i - 1]])
+                first = i
+        return Chunk(" ".join(" ".join(parts).split()), token_pages[0], starts[0], stop)
+
+    def next_start(cut: int) -> int:
+        if overlap == 0 or levels[cut] == PARAGRAPH:
+            return cut
+        window = range(cut - overlap, cut)
+        # Never reach back into the previous paragraph
+        paragraphs = [i for i in window if levels[i] == PARAGRAPH]
+        if paragraphs:
+            return paragraphs[-1]
+        for level in (SENTENCE, WORD):
+            for i in window:
+                if levels[i] >= level:
+                    return i
+        return cut
+
+    for page_number, text in enumerate(pages, 1):
+        if not text.strip():
+            continue
+        texts[page_number] = text
+        for start, end in token_offsets(text):
+            if end <= start:
+                continue
+            if not starts or token_pages[-1] != page_number:
+                level = PARAGRAPH  # Page breaks count as paragraph breaks
+            else:
+                gap = text[ends[-1]:start]
+                if not gap:
+                    level = INSIDE_WORD
+                elif gap.count('\n') >= 2:
+                    level = PARAGRAPH
+                elif text[ends[-1] - 1] in '.!?':
+                    level = SENTENCE
+                else:
+                    level = WORD
+            token_pages.append(page_number)
+            starts.append(start)
+            ends.append(end)
+            levels.append(level)
+
+        # The boundary after a full window is known once the token after it has arrived
+        while len(starts) > chunk_size:
+            window = levels[chunk_size // 2:chunk_size + 1]
+            strongest = max(window)
+            cut = chunk_size if strongest == INSIDE_WORD else \
+                chunk_size // 2 + len(window) - 1 - window[::-1].index(strongest)
+            yield make_chunk(cut)
+            keep = next_start(cut)
+            for values in (token_pages, starts, ends, levels):
+                del values[:keep]
+            for page in [page for page in texts if page < token_pages[0]]:
+                del texts[page]
+    if starts:
+        yield make_chunk(len(starts))
+
+
+class ChunkLengthStats:
+    """Histogram of chunk token counts, for sizing embedding batches"""
+
+    def __init__(self, max_tokens: int = 512):
+        self.counts = np.zeros(max_tokens + 1, dtype=np.int64)
+
+    def add(self, lengths: Iterable[int]) -> None:
+        lengths = np.minimum(np.fromiter(lengths, dtype=np.int64), len(self.counts) - 1)
+        np.add.at(self.counts, lengths, 1)
+
+    def stats(self) -> dict:
+        total = int(self.counts.sum())
+        if not total:
+            return {'chunks': 0, 'mean': 0.0, 'p50': 0, 'p95': 0, 'max': 0}
+        cumulative = np.cumsum(self.counts)
+        return {
+            'chunks': total,
+            'mean': round(float(self.counts @ np.arange(len(self.counts)) / total), 1),
+            'p50': int(np.searchsorted(cumulative, 0.5 * total)),
+            'p95': int(np.searchsorted(cumulative, 0.95 * total)),
+            'max': int(np.flatnonzero(self.counts)[-1])
+        }
@@ -0,0 +1,399 @@
+from typing import Callable, List, Tuple, Optional
+import warnings
+import numpy as np
+from embedding_buffer import EmbeddingBuffer
+
+PRECISIONS = ('float32', 'float16', 'int8')
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Return float32 copies of the vectors scaled to unit length"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without a full sort"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(scores, -k)[-k:]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(scores[candidates])[::-1]]
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Column indices and values of the k highest scores in every row, best first"""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((len(scores), 0), dtype=np.int64), np.empty((len(scores), 0), dtype=scores.dtype)
+    candidates = np.argpartition(scores, -k, axis=1)[:, -k:] if k < scores.shape[1] else \
+        np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+
+def upcast_into(out: np.ndarray, block: np.ndarray) -> None:
+    """Copy a block of float16 or int8 rows into a float32 buffer of the same shape.
+
+    numpy converts float16 element by element, several times slower than the
+    matrix product that follows; torch's conversion is vectorized, so float16
+    goes through it when torch is installed.
+    """
+    if block.dtype == np.float16:
+        try:
+            import torch
+        except ImportError:
+            pass
+        else:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')  # Read-only memmap rows are only read from
+                torch.from_numpy(out).copy_(torch.from_numpy(block))
+            return
+    out[...] = block
+
+
+class VectorIndex:
+    """Interface for cosine-similarity search over chunk embeddings.
+
+    Vectors passed to add() and search() must already be unit length, so the
+    cosine similarity is a plain dot product (see normalize_rows).
+
+    Row ids are assigned in insertion order, so id i always refers to the
+    i-th vector passed to add() and lines up with RAGEngine.documents.
+    """
+
+    def add(self, vectors: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def remove(self, ids: np.ndarray) -> None:
+        """Tombstone rows so they are never returned again (ids are not reused)"""
+        raise NotImplementedError
+
+    def compact(self) -> np.ndarray:
+        """Drop removed rows and renumber the rest, returning old id -> new id (-1 if removed)"""
+        raise NotImplementedError
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (ids, cosine similarities) of the k nearest live rows, best first"""
+        raise NotImplementedError
+
+    def search_batch(self, queries: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """search() for every row of queries; backends may score them all at once"""
+        return [self.search(query, k) for query in np.asarray(queries, dtype=np.float32)]
+
+    def vectors(self, ids: np.ndarray) -> np.ndarray:
+        """float32 vectors of the given rows, as held by the index"""
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the index"""
+        raise NotImplementedError
+
+
+class ExactIndex(VectorIndex):
+    """Brute-force search: one matrix-vector product plus argpartition.
+
+    precision sets how vectors are held in memory: 'float32', 'float16'
+    (half the memory) or 'int8' (a quarter, one float32 scale per row).
+    Compact rows are upcast block by block while scoring, so no full float32
+    copy is ever made. When rescore_source is given (ids -> float32 vectors,
+    e.g. rows of the on-disk store), the top k * rescore_factor compact
+    candidates are re-scored at full precision before the final top k.
+
+    A float32 index can instead score rows it does not own: row_source returns
+    the current matrix of all added rows (e.g. the store's memory map, already
+    unit length), and the index keeps only the tombstones. add() then just
+    counts the new rows, which must already be in that matrix.
+    """
+
+    SCORE_BLOCK_ROWS = 1024
+
+    def __init__(self, precision: str = 'float32',
+                 rescore_source: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+                 rescore_factor: int = 4, row_source: Optional[Callable[[], Optional[np.ndarray]]] = None):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unsupported index precision: {precision}")
+        if row_source is not None and precision != 'float32':
+            raise ValueError("row_source can only back a float32 index")
+        self.precision = precision
+        self.rescore_source = rescore_source
+        self.rescore_factor = rescore_factor
+        self.row_source = row_source
+        # Rows grow in place (capacity doubling) instead of being copied on every add;
+        # with a row_source this only holds one tombstone flag per row
+        self._rows = EmbeddingBuffer(dtype=precision if row_source is None else bool)
+        self._row_scales = EmbeddingBuffer()  # Per-row dequantization scale (int8 only)
+
+    @property
+    def _vectors(self) -> Optional[np.ndarray]:
+        if self.row_source is not None:
+            return self.row_source() if len(self._rows) else None
+        return self._rows.data
+
+    @property
+    def _scales(self) -> Optional[np.ndarray]:
+        return self._row_scales.data
+
+    @property
+    def _deleted(self) -> np.ndarray:
+        return self._rows.deleted
+
+    @property
+    def _n_deleted(self) -> int:
+        return self._rows.n_deleted
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.precision == 'int8':
+            # Symmetric per-row quantization: the largest component maps to +-127
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+            codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+            return codes, scales.astype(np.float32)
+        return vectors.astype(self.precision, copy=False), None
+
+    def _decode(self, rows) -> np.ndarray:
+        """float32 vectors for a slice or array of row ids"""
+        vectors = self._vectors[rows].astype(np.float32)
+        if self._scales is not None:
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    def vectors(self, ids: np.ndarray) -> np.ndarray:
+        return self._decode(ids)
+
+    def _score(self, query: np.ndarray, rows=None) -> np.ndarray:
+        """Dot products of the query with the given rows (all rows when None).
+
+        query may also be a (dim, n_queries) matrix, giving one column of scores per query.
+        """
+        vectors = self._vectors
+        if rows is not None:
+            if vectors.dtype == np.float32:
+                return vectors[rows] @ query
+            return self._decode(rows) @ query
+        if vectors.dtype == np.float32:
+            return vectors @ query
+        # Small blocks upcast into one reused buffer stay in cache, which keeps int8 and float16
+        # close to float32 speed
+        scores = np.empty((len(vectors),) + query.shape[1:], dtype=np.float32)
+        buffer = np.empty((self.SCORE_BLOCK_ROWS, vectors.shape[1]), dtype=np.float32)
+        for start in range(0, len(scores), self.SCORE_BLOCK_ROWS):
+            block = vectors[start:start + self.SCORE_BLOCK_ROWS]
+            upcast = buffer[:len(block)]
+            upcast_into(upcast, block)
+            scores[start:start + len(block)] = upcast @ query
+        if self._scales is not None:
+            scores *= self._scales.reshape((-1,) + (1,) * (query.ndim - 1))
+        return scores
+
+    def add(self, vectors: np.ndarray) -> None:
+        if self.row_source is not None:
+            self._rows.append(np.zeros(len(vectors), dtype=bool))
+            return
+        codes, scales = self._encode(np.asarray(vectors, dtype=np.float32))
+        self._rows.append(codes)
+        if scales is not None:
+            self._row_scales.append(scales)
+
+    def remove(self, ids: np.ndarray) -> None:
+        self._rows.delete(ids)
+        if len(self._row_scales):
+            self._row_scales.delete(ids)
+
+    def compact(self) -> np.ndarray:
+        self._row_scales.compact()
+        return self._rows.compact()
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self._vectors is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32).ravel()
+        rescore = self.precision != 'float32' and self.rescore_source is not None
+        ids, scores = self._candidates(query, k * self.rescore_factor if rescore else k)
+        if rescore and len(ids):
+            scores = normalize_rows(self.rescore_source(ids)) @ query
+            best = top_k(scores, k)
+            ids, scores = ids[best], scores[best]
+        return ids, scores
+
+    def _candidates(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self._score(query)
+        if self._n_deleted:
+            scores[self._deleted] = -np.inf
+            k = min(k, len(scores) - self._n_deleted)
+        ids = top_k(scores, k)
+        return ids, scores[ids]
+
+    # Upper bound on the (rows x queries) score matrix of one search_batch block
+    MAX_BATCH_SCORES = 1 << 24
+
+    def search_batch(self, queries: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Score a block of queries with one matrix-matrix product and a row-wise top k"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(len(queries), -1)
+        if self._vectors is None:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+        rescore = self.precision != 'float32' and self.rescore_source is not None
+        fetch = min(k * self.rescore_factor if rescore else k, len(self._vectors) - self._n_deleted)
+
+        results = []
+        block = max(1, self.MAX_BATCH_SCORES // len(self._vectors))
+        for start in range(0, len(queries), block):
+            block_queries = queries[start:start + block]
+            scores = self._score(block_queries.T).T  # (queries, rows)
+            if self._n_deleted:
+                scores[:, self._deleted] = -np.inf
+            ids, scores = top_k_rows(scores, fetch)
+            if rescore and ids.size:
+                vectors = normalize_rows(self.rescore_source(ids.ravel())).reshape(ids.shape + (-1,))
+                scores = np.einsum('qkd,qd->qk', vectors, block_queries)
+                best, scores = top_k_rows(scores, k)
+                ids = np.take_along_axis(ids, best, axis=1)
+            results.extend(zip(ids, scores))
+        return results
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def memory_bytes(self) -> int:
+        return self._rows.nbytes + self._row_scales.nbytes
+
+
+class IVFIndex(ExactIndex):
+    """Inverted-file index: rows are bucketed by their nearest k-means centroid.
+
+    A query only scores the rows in its n_probe closest buckets. Raise n_probe
+    (or lower n_lists) for better recall, lower it for faster queries.
+
+    Until min_train_size rows exist the index answers exactly. Once trained,
+    new rows are assigned to the existing centroids incrementally, and the
+    centroids are retrained when the index has grown by retrain_factor.
+    """
+
+    def __init__(self, n_lists: Optional[int] = None, n_probe: int = 8,
+                 min_train_size: int = 4096, retrain_factor: float = 4.0,
+                 kmeans_iterations: int = 10, seed: int = 0, **options):
+        super().__init__(**options)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.min_train_size = min_train_size
+        self.retrain_factor = retrain_factor
+        self.kmeans_iterations = kmeans_iterations
+        self._rng = np.random.default_rng(seed)
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        self._list_sizes: Optional[np.ndarray] = None
+        self._trained_size = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    def add(self, vectors: np.ndarray) -> None:
+        start = len(self)
+        super().add(vectors)
+
+        if not self.is_trained:
+            if len(self) >= self.min_train_size:
+                self.train()
+        elif len(self) >= self._trained_size * self.retrain_factor:
+            self.train()
+        else:
+            self._assign(start)
+
+    def train(self) -> None:
+        """Fit centroids with spherical k-means and rebuild every inverted list"""
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(self))))
+        n_lists = min(n_lists, len(self))
+
+        # Train on a bounded sample so the cost stays flat as the corpus grows
+        sample_size = min(len(self), n_lists * 64)
+        sample = self._decode(self._rng.choice(len(self), sample_size, replace=False))
+        centroids = sample[self._rng.choice(sample_size, n_lists, replace=False)]
+        for _ in range(self.kmeans_iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = normalize_rows(sums)
+
+        self._centroids = centroids
+        self._lists = [np.empty(16, dtype=np.int64) for _ in range(n_lists)]
+        self._list_sizes = np.zeros(n_lists, dtype=np.int64)
+        self._trained_size = len(self)
+        self._assign(0)
+
+    def _assign(self, start: int, batch_size: int = 65536) -> None:
+        for batch_start in range(start, len(self), batch_size):
+            batch = self._decode(slice(batch_start, batch_start + batch_size))
+            assignments = np.argmax(batch @ self._centroids.T, axis=1)
+            order = np.argsort(assignments, kind='stable')
+            lists, starts = np.unique(assignments[order], return_index=True)
+            for list_id, members in zip(lists, np.split(order + batch_start, starts[1:])):
+                self._append_to_list(list_id, members)
+
+    def _append_to_list(self, list_id: int, ids: np.ndarray) -> None:
+        size = self._list_sizes[list_id]
+        needed = size + len(ids)
+        if needed > len(self._lists[list_id]):
+            # Grow geometrically so inserts stay amortized O(1)
+            grown = np.empty(max(needed, 2 * len(self._lists[list_id])), dtype=np.int64)
+            grown[:size] = self._lists[list_id][:size]
+            self._lists[list_id] = grown
+        self._lists[list_id][size:needed] = ids
+        self._list_sizes[list_id] = needed
+
+    def compact(self) -> np.ndarray:
+        remap = super().compact()
+        if self.is_trained:
+            # Renumber list members in place; removed rows were already skipped by queries
+            for list_id, ids in enumerate(self._lists):
+                members = remap[ids[:self._list_sizes[list_id]]]
+                members = members[members >= 0]
+                ids[:len(members)] = members
+                self._list_sizes[list_id] = len(members)
+            self._trained_size = min(self._trained_size, len(self))
+        return remap
+
+    def search_batch(self, queries: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if not self.is_trained:
+            return super().search_batch(queries, k)
+        # Every query probes different lists, so there is no shared matrix to score
+        return VectorIndex.search_batch(self, queries, k)
+
+    def _candidates(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if not self.is_trained:
+            return super()._candidates(query, k)
+
+        probes = top_k(self._centroids @ query, self.n_probe)
+        candidates = np.concatenate([self._lists[i][:self._list_sizes[i]] for i in probes])
+        if self._n_deleted:
+            candidates = candidates[~self._deleted[candidates]]
+        scores = self._score(query, candidates)
+        best = top_k(scores, k)
+        return candidates[best], scores[best]
+
+    def memory_bytes(self) -> int:
+        lists = sum(ids.nbytes for ids in self._lists)
+        centroids = self._centroids.nbytes if self._centroids is not None else 0
+        return super().memory_bytes() + lists + centroids
+
+
+INDEX_BACKENDS = {
+    'exact': ExactIndex,
+    'ivf': IVFIndex,
+}
+
+
+def create_index(backend: str = 'exact', **options) -> VectorIndex:
+    """Build an index backend by name ('exact' or 'ivf')"""
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown index backend: {backend}")
+    return INDEX_BACKENDS[backend](**options)
@@ -0,0 +1,232 @@
+import os
+import json
+import contextlib
+from typing import List, NamedTuple, Optional, Tuple
+import numpy as np
+from vector_index import normalize_rows
+
+
+class CompactionCopy(NamedTuple):
+    """Next-generation data files written by VectorStore.begin_compaction()"""
+    generation: int
+    rows: int  # Rows of the current generation the copy covers (len(keep))
+    source_chunks_size: int  # Bytes of their chunk records in the current generation
+    count: int  # Rows copied
+    chunks_size: int  # Bytes of chunk records copied
+
+
+class VectorStore:
+    """Append-only on-disk storage for chunk embeddings, chunk records and engine metadata.
+
+    Layout of the storage directory:
+      embeddings.bin  raw row-major matrix, opened with np.memmap
+      chunks.jsonl    one JSON record per chunk (text, hash, ...), line i belongs to row i
+      manifest.json   row count, byte sizes and engine metadata (processed files, tombstones)
+
+    Rows are stored unit length, so they can be searched in place as cosine
+    similarities without a normalized in-memory copy.
+
+    The manifest is rewritten atomically after every append and acts as the
+    commit point: rows written after the last manifest (e.g. a crash mid-write)
+    are truncated away on the next load. compact() writes the live rows to a
+    new generation of data files (embeddings.1.bin, chunks.1.jsonl, ...) and
+    switches to them with the same manifest commit. It can be split into
+    begin_compaction(), which copies while appends continue, and
+    finish_compaction(), which carries over the rows appended since and commits.
+    """
+
+    EMBEDDINGS_FILE = 'embeddings.bin'
+    CHUNKS_FILE = 'chunks.jsonl'
+    MANIFEST_FILE = 'manifest.json'
+
+    def __init__(self, directory: str, dtype: str = 'float32'):
+        if dtype not in ('float32', 'float16'):
+            raise ValueError(f"Unsupported storage dtype: {dtype}")
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self.count = 0
+        self.chunks_size = 0
+        self.generation = 0  # Bumped by compact(), which writes new data files
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _data_path(self, name: str, generation: Optional[int] = None) -> str:
+        """Path of a data file; generation 0 uses the plain name, later ones e.g. embeddings.2.bin"""
+        generation = self.generation if generation is None else generation
+        if generation:
+            stem, extension = os.path.splitext(name)
+            name = f"{stem}.{generation}{extension}"
+        return self._path(name)
+
+    def load(self) -> Tuple[Optional[np.memmap], List[dict], dict]:
+        """Load the committed state: embeddings memmap, chunk records and engine metadata"""
+        manifest_path = self._path(self.MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            # Nothing was ever committed: drop rows from a first append that crashed before its commit
+            for name in (self.EMBEDDINGS_FILE, self.CHUNKS_FILE):
+                if os.path.exists(self._data_path(name)):
+                    self._truncate(name, 0)
+            return None, [], {}
+
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        self.dtype = np.dtype(manifest['dtype'])
+        self.dim = manifest['dim']
+        self.count = manifest['count']
+        self.chunks_size = manifest['chunks_size']
+        self.generation = manifest.get('generation', 0)
+
+        # Drop anything written after the last commit, and files a compaction could not remove
+        self._truncate(self.EMBEDDINGS_FILE, self.count * (self.dim or 0) * self.dtype.itemsize)
+        self._truncate(self.CHUNKS_FILE, self.chunks_size)
+        if self.generation:
+            self._remove_generation(self.generation - 1)
+        if self.count and not manifest.get('normalized'):
+            # Written before rows were normalized on append: rewrite them once
+            self.compact(np.ones(self.count, dtype=bool), manifest['metadata'])
+
+        with open(self._data_path(self.CHUNKS_FILE), 'r', encoding='utf-8') as f:
+            chunks = [json.loads(line) for line in f]
+
+        return self.open_embeddings(), chunks, manifest['metadata']
+
+    def _truncate(self, name: str, size: int) -> None:
+        path = self._data_path(name)
+        if not os.path.exists(path):
+            open(path, 'wb').close()
+        if os.path.getsize(path) != size:
+            with open(path, 'r+b') as f:
+                f.truncate(size)
+
+    def open_embeddings(self) -> Optional[np.memmap]:
+        """Open the committed embedding rows as a read-only memory map"""
+        if not self.count:
+            return None
+        return np.memmap(self._data_path(self.EMBEDDINGS_FILE), dtype=self.dtype, mode='r',
+                         shape=(self.count, self.dim))
+
+    def append(self, embeddings: np.ndarray, chunks: List[dict]) -> None:
+        """Append new rows and their chunk records (call commit() to make them durable)"""
+        if len(embeddings) != len(chunks):
+            raise ValueError("Number of embeddings and chunks must match")
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match store dimension {self.dim}")
+
+        with open(self._data_path(self.EMBEDDINGS_FILE), 'ab') as f:
+            f.write(normalize_rows(embeddings).astype(self.dtype).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        data = "".join(json.dumps(chunk) + "\n" for chunk in chunks).encode('utf-8')
+        with open(self._data_path(self.CHUNKS_FILE), 'ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.count += len(chunks)
+        self.chunks_size += len(data)
+
+    def commit(self, metadata: dict) -> None:
+        """Atomically write the manifest describing all appended rows"""
+        manifest = {
+            'dtype': self.dtype.name,
+            'dim': self.dim,
+            'count': self.count,
+            'chunks_size': self.chunks_size,
+            'generation': self.generation,
+            'normalized': True,
+            'metadata': metadata
+        }
+        tmp_path = self._path(self.MANIFEST_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path(self.MANIFEST_FILE))
+
+    def compact(self, keep: np.ndarray, metadata: dict, block_rows: int = 65536) -> None:
+        """Rewrite the store with only the rows where keep is True, and commit.
+
+        Rows are copied block by block into the next generation of data files,
+        so memory use stays flat; the previous files are removed after the commit.
+        """
+        self.finish_compaction(self.begin_compaction(keep, block_rows), metadata)
+
+    def begin_compaction(self, keep: np.ndarray, block_rows: int = 65536) -> CompactionCopy:
+        """Copy the committed rows where keep is True into the next generation's data files.
+
+        Only the first len(keep) rows are read, so append() and commit() may run
+        meanwhile; finish_compaction() then carries over the rows appended since
+        and switches to the new files. Nothing is committed until then.
+        """
+        generation = self.generation + 1
+        rows = len(keep)
+        embeddings = np.memmap(self._data_path(self.EMBEDDINGS_FILE), dtype=self.dtype, mode='r',
+                               shape=(rows, self.dim)) if rows else np.empty((0, self.dim or 0), self.dtype)
+        with open(self._data_path(self.EMBEDDINGS_FILE, generation), 'wb') as f:
+            for start in range(0, rows, block_rows):
+                block = embeddings[start:start + block_rows][keep[start:start + block_rows]]
+                f.write(normalize_rows(block).astype(self.dtype).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        del embeddings
+
+        source_chunks_size, chunks_size = 0, 0
+        with open(self._data_path(self.CHUNKS_FILE), 'rb') as src, \
+                open(self._data_path(self.CHUNKS_FILE, generation), 'wb') as dst:
+            for kept in keep:
+                line = src.readline()
+                source_chunks_size += len(line)
+                if kept:
+                    dst.write(line)
+                    chunks_size += len(line)
+            dst.flush()
+            os.fsync(dst.fileno())
+        return CompactionCopy(generation, rows, source_chunks_size, int(np.count_nonzero(keep)), chunks_size)
+
+    def finish_compaction(self, copy: CompactionCopy, metadata: dict) -> None:
+        """Append the rows committed after copy was taken, commit the new generation and drop the old one"""
+        if copy.generation != self.generation + 1:
+            raise RuntimeError("The store was compacted since this copy was taken")
+        row_bytes = (self.dim or 0) * self.dtype.itemsize
+        # Rows appended since are already unit length, so their bytes are copied as they are
+        self._copy_tail(self.EMBEDDINGS_FILE, copy.generation, copy.rows * row_bytes, self.count * row_bytes)
+        tail_chunks = self._copy_tail(self.CHUNKS_FILE, copy.generation, copy.source_chunks_size,
+                                      self.chunks_size)
+
+        self.generation = copy.generation
+        self.count = copy.count + self.count - copy.rows
+        self.chunks_size = copy.chunks_size + tail_chunks
+        self.commit(metadata)
+        self._remove_generation(copy.generation - 1)
+
+    def abort_compaction(self, copy: CompactionCopy) -> None:
+        """Remove the files of a copy that will not be finished"""
+        self._remove_generation(copy.generation)
+
+    def _copy_tail(self, name: str, generation: int, start: int, end: int, block_size: int = 1 << 20) -> int:
+        """Append bytes [start, end) of the current data file to the same file of another generation"""
+        with open(self._data_path(name), 'rb') as src, open(self._data_path(name, generation), 'ab') as dst:
+            src.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                block = src.read(min(block_size, remaining))
+                if not block:
+                    raise IOError(f"{name} is shorter than its committed size")
+                dst.write(block)
+                remaining -= len(block)
+            dst.flush()
+            os.fsync(dst.fileno())
+        return end - start
+
+    def _remove_generation(self, generation: int) -> None:
+        # Fails on platforms that cannot delete a file still memory-mapped; load() retries
+        for name in (self.EMBEDDINGS_FILE, self.CHUNKS_FILE):
+            with contextlib.suppress(OSError):
+                os.remove(self._data_path(name, generation))